@@ -0,0 +1,93 @@
+"""
+Бенчмарк соединений с PostgreSQL: запросов в секунду без постоянных соединений (DB_CONN_MAX_AGE=0), с постоянными
+соединениями и с пулом psycopg 3 (DB_POOL=True).
+
+Каждый "запрос" повторяет жизненный цикл соединения в Django: сигнал request_started, один короткий SQL-запрос и
+сигнал request_finished, после которого Django закрывает соединение или возвращает его в пул. Запросы выполняются
+в нескольких потоках, как в воркере gunicorn с gthread. Каждый режим запускается в отдельном процессе, потому что
+настройки БД читаются при старте Django.
+
+Запуск (нужна локальная PostgreSQL, параметры - из переменных DB_* в .env):
+    DJANGO_SECRET_KEY=x python benchmarks/db_connections.py [--requests 2000] [--threads 4]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MODES = {
+    "без постоянных соединений": {"DB_CONN_MAX_AGE": "0", "DB_POOL": "False"},
+    "постоянные соединения": {"DB_CONN_MAX_AGE": "60", "DB_POOL": "False"},
+    "пул psycopg": {"DB_POOL": "True"},
+}
+
+
+def run_worker(requests_count, threads):
+    """
+    Выполняет запросы в текущем процессе и печатает количество запросов в секунду.
+    :param requests_count: Количество запросов
+    :param threads: Количество потоков
+    :return: None
+    """
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+    import django
+
+    django.setup()
+
+    from django.core.signals import request_finished, request_started
+    from django.db import connection
+
+    def handle_request(_):
+        request_started.send(sender=None)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+        finally:
+            request_finished.send(sender=None)
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(handle_request, range(threads)))  # Прогрев: пул открывает min_size соединений
+        started = time.perf_counter()
+        list(executor.map(handle_request, range(requests_count)))
+        elapsed = time.perf_counter() - started
+    print(f"{requests_count / elapsed:.1f}")
+
+
+def main():
+    """
+    Запускает бенчмарк во всех режимах и печатает результат.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Количество запросов в каждом режиме")
+    parser.add_argument("--threads", type=int, default=4, help="Количество потоков")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.requests, args.threads)
+        return
+
+    print(f"{'Режим':<28}{'запросов/с':>12}")
+    for name, env in MODES.items():
+        result = subprocess.run(
+            [sys.executable, __file__, "--worker", "--requests", str(args.requests), "--threads", str(args.threads)],
+            env={**os.environ, **env},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        print(f"{name:<28}{result.stdout.strip():>12}")
+
+
+if __name__ == "__main__":
+    main()
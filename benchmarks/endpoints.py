@@ -0,0 +1,492 @@
+"""
+Бенчмарк маршрутов API: p50 и p99 времени ответа, количество запросов к БД и пиковая память на запрос для каждого
+маршрута materials.urls и users.urls на синтетических данных нескольких размеров (см. команду generate_dataset).
+
+Результаты сравниваются с базовыми значениями из benchmarks/baselines.json (отдельно для SQLite и PostgreSQL):
+если показатель вырос больше допустимого (см. THRESHOLDS), скрипт завершается с кодом 1. Запросы, изменяющие
+данные, выполняются в транзакции, которая откатывается, поэтому все повторы работают с одними и теми же данными.
+Внешние API (Stripe, ЦБ РФ) заменены заглушками, хеширование паролей - MD5, как в тестах: PBKDF2 занимает сотни
+миллисекунд и заслоняет изменения в коде. Время ответа зависит от машины: базовые значения записываются
+(--update-baselines) на той же машине, на которой потом выполняется проверка. Чтобы временная загрузка машины не
+считалась регрессией, между запросами выполняется эталонная нагрузка на CPU (см. calibrate), и базовое время ответа
+масштабируется по отношению её текущего и базового времени.
+
+Запуск (тестовая БД SQLite создаётся в памяти; без DB_ENGINE - PostgreSQL с параметрами DB_* из .env):
+    DB_ENGINE=sqlite DJANGO_SECRET_KEY=x python benchmarks/endpoints.py [--sizes small,medium] [--repeat 30]
+    DB_ENGINE=sqlite DJANGO_SECRET_KEY=x python benchmarks/endpoints.py --update-baselines
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+os.environ.setdefault("CACHE_URL", "locmem://")  # Без Redis, если CACHE_URL не задан явно
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")  # Задачи из представлений никуда не отправляются
+os.environ.setdefault("PERFORMANCE_SAMPLE_RATE", "0")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.cache import cache  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.db.models import Count  # noqa: E402
+from django.test.utils import override_settings, setup_test_environment  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+import materials.urls  # noqa: E402
+import users.urls  # noqa: E402
+from materials.models import Course  # noqa: E402
+from users.models import Payment, User  # noqa: E402
+
+BASELINES = ROOT / "benchmarks" / "baselines.json"
+PASSWORD = "password123"
+
+# Размеры данных (аргументы generate_dataset)
+SIZES = {
+    "small": {"users": 100, "courses": 10, "lessons": 100, "subscriptions": 500, "payments": 1000},
+    "medium": {"users": 1000, "courses": 100, "lessons": 1000, "subscriptions": 5000, "payments": 10000},
+    "large": {"users": 10000, "courses": 1000, "lessons": 10000, "subscriptions": 50000, "payments": 100000},
+}
+
+# Допустимый относительный рост показателей. p99 из нескольких десятков повторов - почти максимум, поэтому его порог
+# шире; количество запросов к БД от шума не зависит и расти не должно
+THRESHOLDS = {"p50_ms": 0.5, "p99_ms": 1.5, "queries": 0, "peak_kib": 0.25}
+MIN_LATENCY_DELTA_MS = 1.0  # Меньший рост времени ответа считается шумом
+
+# Эталонная нагрузка на CPU: выполняется между запросами сценария, и время ответа при сравнении масштабируется по её
+# времени. Так замедление всей машины (соседние процессы, частота CPU) не считается регрессией
+CALIBRATION_DATA = [{"id": number, "name": f"Курс {number}", "lessons": list(range(10))} for number in range(300)]
+
+
+@dataclass
+class Dataset:
+    """
+    Объекты, к которым обращаются сценарии.
+    Attributes:
+        owner (User): Владелец курса с наибольшим количеством уроков, от его имени выполняется большинство запросов
+        admin (User): Администратор (аналитика оплат)
+        course (Course): Курс владельца
+        lesson (Lesson): Урок курса
+        payment (Payment): Оплата владельца с сессией Stripe
+        course_ids (list): Id курсов
+    """
+
+    owner: object
+    admin: object
+    course: object
+    lesson: object
+    payment: object
+    course_ids: list
+
+
+@dataclass
+class Scenario:
+    """
+    Запрос к маршруту.
+    Attributes:
+        route (str): Имя маршрута с пространством имён
+        method (str): HTTP-метод
+        user (str): От чьего имени выполняется запрос (owner, admin или None - без авторизации)
+        kwargs (callable): Аргументы маршрута по данным
+        data (callable): Тело запроса по данным
+    """
+
+    route: str
+    method: str = "GET"
+    user: str = "owner"
+    kwargs: object = None
+    data: object = None
+
+    @property
+    def name(self):
+        """
+        Имя сценария в отчёте и в файле базовых значений.
+        :return: "Метод маршрут"
+        """
+        return f"{self.method} {self.route}"
+
+
+def course_pk(data):
+    """
+    Аргументы маршрута курса.
+    :param data: Dataset
+    :return: Словарь аргументов
+    """
+    return {"pk": data.course.pk}
+
+
+def lesson_pk(data):
+    """
+    Аргументы маршрута урока.
+    :param data: Dataset
+    :return: Словарь аргументов
+    """
+    return {"pk": data.lesson.pk}
+
+
+def payment_pk(data):
+    """
+    Аргументы маршрута оплаты.
+    :param data: Dataset
+    :return: Словарь аргументов
+    """
+    return {"pk": data.payment.pk}
+
+
+def credentials(data):
+    """
+    Тело запроса JWT-токена.
+    :param data: Dataset
+    :return: Email и пароль владельца
+    """
+    return {"email": data.owner.email, "password": PASSWORD}
+
+
+SCENARIOS = [
+    Scenario("materials:api-root"),
+    Scenario("materials:course-list"),
+    Scenario("materials:course-list", "POST", data=lambda data: {"name": "Новый курс", "description": "Описание"}),
+    Scenario("materials:course-detail", kwargs=course_pk),
+    Scenario(
+        "materials:course-detail", "PUT", kwargs=course_pk, data=lambda data: {"name": "Курс", "description": "-"}
+    ),
+    Scenario("materials:course-detail", "PATCH", kwargs=course_pk, data=lambda data: {"description": "Новое"}),
+    Scenario("materials:course-detail", "DELETE", kwargs=course_pk),
+    Scenario(
+        "materials:lesson-create",
+        "POST",
+        data=lambda data: {
+            "name": "Урок",
+            "description": "Описание",
+            "course": data.course.pk,
+            "owner": data.owner.pk,
+        },
+    ),
+    Scenario("materials:lesson-list"),
+    Scenario("materials:lesson-detail", kwargs=lesson_pk),
+    Scenario("materials:lesson-update", "PATCH", kwargs=lesson_pk, data=lambda data: {"description": "Новое"}),
+    Scenario("materials:lesson-delete", "DELETE", kwargs=lesson_pk),
+    Scenario("materials:changes"),
+    Scenario("users:api-root"),
+    Scenario("users:token_obtain_pair", "POST", user=None, data=credentials),
+    Scenario("users:token_refresh", "POST", user=None, data=credentials),
+    Scenario("users:subscription", "POST", data=lambda data: {"course_id": data.course.pk}),
+    Scenario("users:subscription", "PUT", data=lambda data: {"course_id": data.course.pk}),
+    Scenario("users:subscription", "DELETE", data=lambda data: {"course_id": data.course.pk}),
+    Scenario("users:subscription-bulk", "POST", data=lambda data: {"course_ids": data.course_ids[:50]}),
+    Scenario("users:payment-export"),
+    Scenario("users:user-list"),
+    Scenario(
+        "users:user-list",
+        "POST",
+        data=lambda data: {"username": "new_user", "email": "new_user@example.com", "password": PASSWORD},
+    ),
+    Scenario("users:user-detail", kwargs=lambda data: {"pk": data.owner.pk}),
+    Scenario(
+        "users:user-detail", "PATCH", kwargs=lambda data: {"pk": data.owner.pk}, data=lambda data: {"city": "Омск"}
+    ),
+    Scenario("users:user-detail", "DELETE", kwargs=lambda data: {"pk": data.owner.pk}),
+    Scenario("users:payment-list"),
+    Scenario(
+        "users:payment-list",
+        "POST",
+        data=lambda data: {
+            "user": data.owner.pk,
+            "amount": "1000.00",
+            "payment_method": "transfer",
+            "course": data.course.pk,
+        },
+    ),
+    Scenario("users:payment-analytics", user="admin"),
+    Scenario("users:payment-detail", kwargs=payment_pk),
+    Scenario("users:payment-detail", "PATCH", kwargs=payment_pk, data=lambda data: {"status": "paid"}),
+    Scenario("users:payment-detail", "DELETE", kwargs=payment_pk),
+    Scenario("users:payment-check-status", kwargs=payment_pk),
+]
+
+
+class BenchmarkError(Exception):
+    """
+    Сценарий не выполняется (ответ с ошибкой) или не покрывает маршрут.
+    """
+
+
+def check_coverage():
+    """
+    Проверяет, что для каждого маршрута materials.urls и users.urls есть сценарий.
+    :return: None
+    """
+    routes = {
+        f"{module.app_name}:{pattern.name}"
+        for module in (materials.urls, users.urls)
+        for pattern in module.urlpatterns
+    }
+    missing = routes - {scenario.route for scenario in SCENARIOS}
+    if missing:
+        raise BenchmarkError(f"Нет сценариев для маршрутов: {', '.join(sorted(missing))}")
+
+
+@contextmanager
+def offline_services():
+    """
+    Заменяет запросы к Stripe и ЦБ РФ заглушками.
+    :return: Контекстный менеджер
+    """
+    stripe_response = mock.Mock(status_code=200, json=lambda: {"payment_status": "paid"})
+    with (
+        mock.patch("users.views.convert_rub_to_usd", return_value=Decimal("10.00")),
+        mock.patch("users.views.create_price", return_value=mock.Mock(id="price_benchmark")),
+        mock.patch("users.views.create_checkout_session", return_value=("cs_benchmark", "https://example.com/pay")),
+        mock.patch("users.views.requests.get", return_value=stripe_response),
+    ):
+        yield
+
+
+def create_dataset(size, seed):
+    """
+    Создаёт синтетические данные и выбирает объекты для сценариев.
+    :param size: Размер данных (ключ SIZES)
+    :param seed: Начальное значение генератора случайных чисел
+    :return: Dataset
+    """
+    call_command("generate_dataset", prefix="bench", seed=seed, password=PASSWORD, stdout=io.StringIO(), **SIZES[size])
+    course = Course.objects.annotate(count=Count("lessons")).order_by("-count", "id").first()
+    payment = Payment.objects.filter(user=course.owner_id).order_by("id").first()
+    if payment is None:
+        payment = Payment.objects.create(user_id=course.owner_id, course=course, amount=1000, payment_method="cash")
+    payment.session_id = "cs_benchmark"
+    payment.save()
+    admin = User.objects.create_user(
+        username="bench_admin", email="bench_admin@example.com", password=PASSWORD, is_staff=True
+    )
+    return Dataset(
+        owner=course.owner,
+        admin=admin,
+        course=course,
+        lesson=course.lessons.order_by("id").first(),
+        payment=payment,
+        course_ids=list(Course.objects.order_by("id").values_list("id", flat=True)),
+    )
+
+
+def calibrate():
+    """
+    Выполняет эталонную нагрузку.
+    :return: Время, мс
+    """
+    started = time.perf_counter()
+    json.loads(json.dumps(CALIBRATION_DATA))
+    return (time.perf_counter() - started) * 1000
+
+
+def run_scenario(client, data, scenario, repeat):
+    """
+    Выполняет сценарий: прогрев, замер запросов к БД и пиковой памяти, затем repeat замеров времени.
+    :param client: Тестовый клиент
+    :param data: Dataset
+    :param scenario: Сценарий
+    :param repeat: Количество замеров времени
+    :return: Словарь показателей
+    """
+    client.force_authenticate(user=getattr(data, scenario.user) if scenario.user else None)
+    url = reverse(scenario.route, kwargs=scenario.kwargs(data) if scenario.kwargs else None)
+    body = scenario.data(data) if scenario.data else None
+    send = getattr(client, scenario.method.lower())
+
+    def request():
+        if scenario.method == "GET":
+            response = send(url)
+            if response.streaming:  # Выгрузка формируется при чтении ответа
+                b"".join(response.streaming_content)
+            return response
+        with transaction.atomic():
+            response = send(url, body, format="json")
+            transaction.set_rollback(True)
+        cache.clear()  # Кеш не должен хранить объекты из отменённой транзакции
+        return response
+
+    request()
+    queries = []
+    tracemalloc.start()
+    # connection.queries очищается сигналом request_started, поэтому запросы считает обёртка
+    with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+        response = request()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if response.status_code >= 400:
+        raise BenchmarkError(f"{scenario.name}: ответ {response.status_code} {response.content[:200]!r}")
+
+    timings, calibration = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        request()
+        timings.append((time.perf_counter() - started) * 1000)
+        calibration.append(calibrate())
+    percentiles = statistics.quantiles(timings, n=100, method="inclusive")
+    return {
+        "p50_ms": round(statistics.median(timings), 2),
+        "p99_ms": round(percentiles[98], 2),
+        "queries": len(queries),
+        "peak_kib": round(peak / 1024, 1),
+        "calibration_ms": round(statistics.median(calibration), 3),
+    }
+
+
+def run_size(size, seed, repeat, baselines):
+    """
+    Заполняет тестовую БД данными размера size и выполняет все сценарии. Сценарии, превысившие пороги, выполняются
+    повторно, и берётся замер с меньшим числом превышений: единичный выброс (сборка мусора, соседний процесс) не
+    должен считаться регрессией.
+    :param size: Размер данных
+    :param seed: Начальное значение генератора случайных чисел
+    :param repeat: Количество замеров времени
+    :param baselines: Базовые значения {сценарий: показатели}
+    :return: Словарь {сценарий: показатели}
+    """
+    call_command("flush", interactive=False, verbosity=0)  # Данные предыдущего размера
+    cache.clear()
+    data = create_dataset(size, seed)
+    client = APIClient()
+    results = {}
+    for scenario in SCENARIOS:
+        metrics = run_scenario(client, data, scenario, repeat)
+        base = baselines.get(scenario.name)
+        if base is not None and check_scenario(metrics, base):
+            retry = run_scenario(client, data, scenario, repeat)
+            metrics = min(retry, metrics, key=lambda item: len(check_scenario(item, base)))
+        results[scenario.name] = metrics
+    return results
+
+
+def get_speed(metrics, base):
+    """
+    Возвращает, во сколько раз машина сейчас медленнее, чем при записи базовых значений.
+    :param metrics: Показатели сценария
+    :param base: Базовые показатели сценария
+    :return: Отношение времени эталонной нагрузки
+    """
+    if not base.get("calibration_ms"):
+        return 1.0
+    return metrics["calibration_ms"] / base["calibration_ms"]
+
+
+def check_scenario(metrics, base):
+    """
+    Сравнивает показатели сценария с базовыми. Базовое время ответа масштабируется по времени эталонной нагрузки.
+    :param metrics: Показатели сценария
+    :param base: Базовые показатели сценария
+    :return: Список описаний превышенных порогов
+    """
+    speed = get_speed(metrics, base)
+    exceeded = []
+    for metric, threshold in THRESHOLDS.items():
+        expected = base[metric] * speed if metric.endswith("_ms") else base[metric]
+        limit = expected * (1 + threshold)
+        if metric.endswith("_ms"):
+            limit = max(limit, expected + MIN_LATENCY_DELTA_MS)
+        if metrics[metric] > limit:
+            exceeded.append(f"{metric} = {metrics[metric]}, база {base[metric]} (ожидалось {expected:.2f})")
+    return exceeded
+
+
+def compare(results, baselines):
+    """
+    Сравнивает показатели с базовыми значениями.
+    :param results: Показатели {размер: {сценарий: показатели}}
+    :param baselines: Базовые значения в том же формате
+    :return: Список описаний регрессий
+    """
+    regressions = []
+    for size, scenarios in results.items():
+        for name, metrics in scenarios.items():
+            base = baselines.get(size, {}).get(name)
+            if base is not None:
+                regressions.extend(f"{size} {name}: {item}" for item in check_scenario(metrics, base))
+    return regressions
+
+
+def print_results(size, results, baselines):
+    """
+    Печатает показатели размера size и их изменение относительно базовых значений.
+    :param size: Размер данных
+    :param results: Показатели {сценарий: показатели}
+    :param baselines: Базовые значения {сценарий: показатели}
+    :return: None
+    """
+    print(f"\n{size}: {SIZES[size]}")
+    print(f"{'Сценарий':<44}{'p50, мс':>10}{'p99, мс':>10}{'запросов':>10}{'память, КиБ':>13}{'p50 к базе':>12}")
+    for name, metrics in results.items():
+        base = baselines.get(name)
+        change = "-"
+        if base and base["p50_ms"]:
+            change = f"{(metrics['p50_ms'] / (base['p50_ms'] * get_speed(metrics, base)) - 1) * 100:+.0f} %"
+        print(
+            f"{name:<44}{metrics['p50_ms']:>10.2f}{metrics['p99_ms']:>10.2f}{metrics['queries']:>10}"
+            f"{metrics['peak_kib']:>13.1f}{change:>12}"
+        )
+
+
+def main():
+    """
+    Запускает бенчмарк, печатает результат и сравнивает его с базовыми значениями.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="small,medium", help=f"Размеры данных через запятую: {', '.join(SIZES)}")
+    parser.add_argument("--repeat", type=int, default=30, help="Количество замеров времени каждого сценария")
+    parser.add_argument("--seed", type=int, default=42, help="Начальное значение генератора данных")
+    parser.add_argument("--baselines", type=Path, default=BASELINES, help="Файл базовых значений")
+    parser.add_argument("--update-baselines", action="store_true", help="Записать результат как базовые значения")
+    args = parser.parse_args()
+
+    check_coverage()
+    setup_test_environment()
+    vendor = connection.vendor
+    all_baselines = json.loads(args.baselines.read_text(encoding="utf-8")) if args.baselines.exists() else {}
+    baselines = all_baselines.get(vendor, {})
+
+    results = {}
+    hashers = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        with override_settings(PASSWORD_HASHERS=hashers), offline_services():
+            for size in args.sizes.split(","):
+                results[size] = run_size(size, args.seed, args.repeat, baselines.get(size, {}))
+                print_results(size, results[size], baselines.get(size, {}))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    if args.update_baselines:
+        all_baselines[vendor] = {**baselines, **results}
+        args.baselines.write_text(json.dumps(all_baselines, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"\nБазовые значения для {vendor} записаны в {args.baselines}")
+        return
+
+    if not baselines:
+        print(f"\nНет базовых значений для {vendor}: запустите с --update-baselines")
+        return
+    regressions = compare(results, baselines)
+    if regressions:
+        print("\nРегрессии:\n" + "\n".join(regressions))
+        sys.exit(1)
+    print("\nРегрессий нет")
+
+
+if __name__ == "__main__":
+    main()
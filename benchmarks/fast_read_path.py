@@ -0,0 +1,111 @@
+"""
+Бенчмарк быстрого пути чтения списков (FAST_READ_PATH): время ответа на 1000 строк для GET /course/,
+/lesson/list/ и /users/user/ с обычной сериализацией DRF и с values_list() и orjson.
+
+Запуск (тестовая БД SQLite создаётся в памяти):
+    DB_ENGINE=sqlite DJANGO_SECRET_KEY=x python benchmarks/fast_read_path.py [--rows 1000] [--repeat 20]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+os.environ.setdefault("CACHE_URL", "locmem://")  # Без Redis, если CACHE_URL не задан явно
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings, setup_test_environment  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+ENDPOINTS = ["/course/", "/lesson/list/", "/users/user/"]
+
+
+def create_data(rows):
+    """
+    Создаёт пользователей, курсы и уроки для бенчмарка.
+    :param rows: Количество строк каждого вида
+    :return: Пользователь, от имени которого выполняются запросы
+    """
+    from materials.models import Course, Lesson
+    from users.models import Subscription, User
+
+    users = User.objects.bulk_create(
+        User(username=f"user{i}", email=f"user{i}@example.com", password="!") for i in range(rows)
+    )
+    courses = Course.objects.bulk_create(
+        Course(name=f"Курс {i}", description="Описание курса " * 20, image=f"courses/{i}.png", owner=users[i])
+        for i in range(rows)
+    )
+    Lesson.objects.bulk_create(
+        Lesson(
+            name=f"Урок {i}",
+            description="Описание урока " * 20,
+            course=courses[i],
+            video=f"lessons/{i}.mp4",
+            owner=users[i],
+        )
+        for i in range(rows)
+    )
+    Subscription.objects.bulk_create(Subscription(user=users[0], course=course) for course in courses[::3])
+    return users[0]
+
+
+def measure(client, url, rows, repeat, fast):
+    """
+    Измеряет медианное время ответа.
+    :param client: Тестовый клиент
+    :param url: URL списка
+    :param rows: Размер страницы
+    :param repeat: Количество повторов
+    :param fast: Включить быстрый путь
+    :return: Медианное время ответа, сек., и тело ответа
+    """
+    timings = []
+    with override_settings(FAST_READ_PATH=fast):
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.get(url, {"page_size": rows})
+            timings.append(time.perf_counter() - started)
+    return statistics.median(timings), response.content
+
+
+def main():
+    """
+    Запускает бенчмарк и печатает результат.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="Количество строк в ответе")
+    parser.add_argument("--repeat", type=int, default=20, help="Количество повторов каждого запроса")
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        # Пагинация курсов и уроков ограничена 10 строками на страницу - снимаем ограничение для бенчмарка
+        from materials.paginators import CoursePagination, LessonPagination
+
+        CoursePagination.max_page_size = LessonPagination.max_page_size = args.rows
+        client = APIClient()
+        client.force_authenticate(user=create_data(args.rows))
+
+        print(f"{'URL':<16}{'DRF, мс':>12}{'быстрый, мс':>14}{'ускорение':>12}")
+        for url in ENDPOINTS:
+            slow, expected = measure(client, url, args.rows, args.repeat, fast=False)
+            fast, actual = measure(client, url, args.rows, args.repeat, fast=True)
+            assert actual == expected, f"Ответы {url} отличаются"
+            print(f"{url:<16}{slow * 1000:>12.1f}{fast * 1000:>14.1f}{slow / fast:>11.1f}x")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
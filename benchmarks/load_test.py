@@ -0,0 +1,186 @@
+"""
+Нагрузочный тест gunicorn: пропускная способность и задержки с прежним запуском (один sync-воркер, настройки по
+умолчанию), с gunicorn.conf.py (воркеры gthread) и с gunicorn.conf.py при ASYNC_VIEWS=True (воркеры uvicorn).
+
+Скрипт применяет миграции, создаёт пользователя с курсами и оплатой и JWT-токен, по очереди запускает gunicorn во
+всех режимах и нагружает URL из нескольких потоков с постоянными HTTP-соединениями. Сценарии:
+    cpu - список курсов /course/: запрос ограничен процессором и БД;
+    io - проверка статуса оплаты /users/payment/<id>/check_status/: запрос ждёт ответа Stripe. Скрипт запускает
+        заглушку Stripe (benchmarks/stubs.py) с задержкой ответа --latency-ms и направляет на неё gunicorn.
+
+Запуск (БД - из переменных DB_* в .env, или SQLite при DB_ENGINE=sqlite):
+    DB_ENGINE=sqlite DJANGO_SECRET_KEY=x python benchmarks/load_test.py [--scenario io] [--latency-ms 200]
+"""
+
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+os.environ.setdefault("CACHE_URL", "locmem://")  # Без Redis, если CACHE_URL не задан явно
+os.environ.setdefault("DJANGO_ALLOWED_HOSTS", "127.0.0.1")
+
+from benchmarks.stubs import start_stubs  # noqa: E402
+
+# Режим: приложение, параметры gunicorn и переменные окружения
+MODES = {
+    "по умолчанию (1 sync-воркер)": ("config.wsgi:application", ["-c", os.devnull], {}),
+    "gunicorn.conf.py (gthread)": ("config.wsgi:application", ["-c", str(ROOT / "gunicorn.conf.py")], {}),
+    "gunicorn.conf.py (ASGI)": (
+        "config.asgi:application",
+        ["-c", str(ROOT / "gunicorn.conf.py")],
+        {"ASYNC_VIEWS": "True"},
+    ),
+}
+
+
+def prepare_data():
+    """
+    Применяет миграции и создаёт данные для теста.
+    :return: Кортеж (JWT-токен пользователя, id оплаты с сессией Stripe)
+    """
+    import django
+
+    django.setup()
+
+    from django.core.management import call_command
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from materials.models import Course
+    from users.models import Payment, User
+
+    call_command("migrate", verbosity=0)
+    user, created = User.objects.get_or_create(email="loadtest@example.com", defaults={"username": "loadtest"})
+    if created:
+        Course.objects.bulk_create(
+            Course(name=f"Курс {i}", description="Описание курса", owner=user) for i in range(50)
+        )
+    payment, _ = Payment.objects.get_or_create(
+        user=user, session_id="cs_stub_loadtest", defaults={"amount": 100, "payment_method": "transfer"}
+    )
+    return str(RefreshToken.for_user(user).access_token), payment.pk
+
+
+def wait_for_server(port, timeout=30):
+    """
+    Ждёт, пока gunicorn начнёт принимать соединения.
+    :param port: Порт
+    :param timeout: Максимальное время ожидания, сек.
+    :return: None
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/")
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn не запустился")
+
+
+def run_load(port, url, token, concurrency, duration):
+    """
+    Нагружает сервер запросами из нескольких потоков.
+    :param port: Порт
+    :param url: URL
+    :param token: JWT-токен
+    :param concurrency: Количество потоков
+    :param duration: Длительность, сек.
+    :return: Количество успешных запросов в секунду, медиана и 95-й перцентиль задержки, мс, количество ошибок
+    """
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    headers = {"Authorization": f"Bearer {token}", "Connection": "keep-alive"}
+
+    def client():
+        local_latencies, local_errors = [], 0
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                connection.request("GET", url, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    local_errors += 1
+                    continue
+                local_latencies.append(time.perf_counter() - started)
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        with lock:
+            latencies.extend(local_latencies)
+            errors.append(local_errors)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    quantiles = statistics.quantiles(latencies, n=20) if len(latencies) > 1 else [0] * 19
+    return len(latencies) / duration, quantiles[9] * 1000, quantiles[18] * 1000, sum(errors)
+
+
+def main():
+    """
+    Запускает нагрузочный тест во всех режимах и печатает результат.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=["cpu", "io"], default="cpu", help="Сценарий нагрузки")
+    parser.add_argument("--url", help="Нагружаемый URL (по умолчанию - URL сценария)")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Задержка ответа заглушки Stripe, мс")
+    parser.add_argument("--stubs-port", type=int, default=8090, help="Порт заглушки Stripe")
+    parser.add_argument("--concurrency", type=int, default=16, help="Количество одновременных клиентов")
+    parser.add_argument("--duration", type=int, default=10, help="Длительность каждого режима, сек.")
+    parser.add_argument("--port", type=int, default=8765, help="Порт gunicorn")
+    args = parser.parse_args()
+
+    stubs = None
+    if args.scenario == "io":
+        stubs = start_stubs(args.stubs_port, args.latency_ms)
+        os.environ.update(
+            STRIPE_API_BASE=f"http://127.0.0.1:{args.stubs_port}",
+            STRIPE_API_KEY="sk_test_stub",
+            STRIPE_SECRET_KEY="sk_test_stub",
+            CBR_DAILY_URL=f"http://127.0.0.1:{args.stubs_port}/scripts/XML_daily.asp",
+        )
+    token, payment_id = prepare_data()
+    url = args.url or ("/course/" if args.scenario == "cpu" else f"/users/payment/{payment_id}/check_status/")
+
+    print(f"{'Режим':<30}{'запросов/с':>12}{'p50, мс':>10}{'p95, мс':>10}{'ошибок':>8}")
+    try:
+        for name, (application, options, env) in MODES.items():
+            server = subprocess.Popen(
+                [sys.executable, "-m", "gunicorn", application, *options, "--bind", f"127.0.0.1:{args.port}"],
+                cwd=ROOT,
+                env={**os.environ, "GUNICORN_ACCESSLOG": "", **env},
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            try:
+                wait_for_server(args.port)
+                rps, p50, p95, errors = run_load(args.port, url, token, args.concurrency, args.duration)
+            finally:
+                server.terminate()
+                server.wait()
+            print(f"{name:<30}{rps:>12.1f}{p50:>10.1f}{p95:>10.1f}{errors:>8}")
+    finally:
+        if stubs is not None:
+            stubs.shutdown()
+
+
+if __name__ == "__main__":
+    main()
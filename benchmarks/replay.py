@@ -0,0 +1,417 @@
+"""
+Воспроизведение записанного трафика на локальном стенде.
+
+Источники: лог config.traffic (config/logs/traffic.log и его архивы .gz, см. config.traffic) и JSON-лог доступа
+nginx (/var/log/nginx/replay.json, формат replay в nginx/nginx.conf). Записанный Django запрос есть и в логе nginx,
+поэтому за один запуск воспроизводится один вид логов. Запросы отправляются в том же порядке и с теми
+же интервалами, что и в записи, ускоренными в --speed раз (1 - реальный темп, 50 - в 50 раз быстрее). В конце
+печатается распределение времени ответа по маршрутам и отставание от расписания: если оно растёт, стенд (или сам
+скрипт, см. --concurrency) не успевает за заданным темпом.
+
+Запись ссылается на объекты и пользователей боевой БД, поэтому перед отправкой запрос переносится на данные стенда
+(например, созданные командой generate_dataset): id в адресе и в полях тела (course, lesson, user, ...) заменяются
+на id существующих объектов той же модели, псевдоним пользователя - на пользователя стенда (сотрудник - на
+сотрудника), скрытые при записи почта и пароль - на новую почту и --password. Запросы из лога nginx не содержат
+пользователя и тела: они выполняются от пользователей стенда по очереди, а запросы с телом пропускаются.
+
+Скрипт читает БД стенда (id объектов, пользователи для JWT-токенов), поэтому запускается с теми же переменными
+DB_* (или DB_ENGINE=sqlite), что и стенд. Stripe и ЦБ РФ на стенде заменяются заглушками (см. benchmarks/stubs.py):
+--stubs-port запускает их вместе с воспроизведением, а стенд запускается с переменными
+    STRIPE_API_KEY=sk_test_stub STRIPE_API_BASE=http://127.0.0.1:8090
+    CBR_DAILY_URL=http://127.0.0.1:8090/scripts/XML_daily.asp
+
+Запуск:
+    DB_ENGINE=sqlite DJANGO_SECRET_KEY=x python benchmarks/replay.py config/logs/traffic.log \\
+        --target http://127.0.0.1:8000 --speed 10 --stubs-port 8090
+"""
+
+import argparse
+import gzip
+import http.client
+import itertools
+import json
+import os
+import queue
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+os.environ.setdefault("CACHE_URL", "locmem://")  # Скрипту кеш не нужен, Redis не требуется
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.urls import Resolver404, resolve, reverse  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+
+from benchmarks.stubs import start_stubs  # noqa: E402
+from config.traffic import MASK  # noqa: E402
+from materials.models import Course, Lesson  # noqa: E402
+from users.models import Payment  # noqa: E402
+
+User = get_user_model()
+
+SKIPPED_PREFIXES = ("/admin/", "/metrics", "/static/", "/media/")  # Не API
+TOKEN_ROUTES = ("users:token_obtain_pair", "users:token_refresh")  # Оба маршрута принимают почту и пароль
+ANONYMOUS_ROUTES = TOKEN_ROUTES + ("schema-swagger-ui", "schema-redoc")
+BODY_ID_FIELDS = {  # Поля тела запроса с id объектов
+    "course": Course,
+    "course_id": Course,
+    "course_ids": Course,
+    "lesson": Lesson,
+    "user": User,
+    "owner": User,
+    "payment": Payment,
+}
+TOKEN_LIFETIME = 20 * 60  # Токен выпускается заново, если он старше, сек. (время жизни токена - 30 минут)
+
+
+@dataclass
+class Request:
+    """
+    Запрос для воспроизведения.
+    Attributes:
+        offset (float): Время от начала записи, сек.
+        label (str): Метод и маршрут для отчёта
+        method (str): HTTP-метод
+        url (str): Адрес с параметрами
+        body (bytes): Тело запроса
+        user (User): Пользователь или None для анонимного запроса
+    """
+
+    offset: float
+    label: str
+    method: str
+    url: str
+    body: bytes = None
+    user: object = None
+
+
+def read_records(paths):
+    """
+    Читает записи трафика из логов Django и nginx.
+    :param paths: Пути к файлам (.gz читаются как архивы)
+    :return: Список записей, отсортированный по времени
+    """
+    records = []
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("event") == "traffic" or "request_time" in record:
+                    record["time"] = datetime.fromisoformat(record["time"])
+                    records.append(record)
+    records.sort(key=lambda record: record["time"])
+    return records
+
+
+class Mapper:
+    """
+    Переносит записанные запросы на данные стенда.
+    """
+
+    def __init__(self, password):
+        self.password = password
+        self.pools = {}
+        self.users = list(User.objects.filter(is_active=True, is_staff=False).order_by("pk"))
+        self.staff = list(User.objects.filter(is_active=True, is_staff=True).order_by("pk")) or self.users
+        if not self.users:
+            raise SystemExit("В БД стенда нет пользователей: создайте данные командой generate_dataset")
+        self.round_robin = itertools.cycle(self.users)
+        self.emails = itertools.count(1)
+
+    def get_pool(self, model):
+        """
+        Возвращает id объектов модели в БД стенда.
+        :param model: Модель
+        :return: Список id
+        """
+        if model not in self.pools:
+            self.pools[model] = list(model.objects.order_by("pk").values_list("pk", flat=True))
+        return self.pools[model]
+
+    def map_id(self, model, value):
+        """
+        Заменяет записанный id на id существующего объекта: один и тот же id всегда переходит в один и тот же.
+        :param model: Модель
+        :param value: Записанный id
+        :return: Id объекта стенда (или value, если объектов модели нет)
+        """
+        pool = self.get_pool(model)
+        if not pool or not str(value).isdigit():
+            return value
+        return pool[int(value) % len(pool)]
+
+    def map_user(self, record):
+        """
+        Возвращает пользователя стенда для записи.
+        :param record: Запись трафика
+        :return: Пользователь или None для анонимного запроса
+        """
+        if record.get("event") != "traffic":
+            return next(self.round_robin)  # В логе nginx пользователя нет
+        if record.get("user") is None:
+            return None
+        pool = self.staff if record.get("staff") else self.users
+        return pool[int(record["user"], 16) % len(pool)]
+
+    def map_body(self, body, user):
+        """
+        Переносит тело запроса на данные стенда.
+        :param body: Записанное тело
+        :param user: Пользователь запроса
+        :return: Тело запроса
+        """
+        if isinstance(body, list):
+            return [self.map_body(item, user) for item in body]
+        if not isinstance(body, dict):
+            return body
+        result = {}
+        for key, value in body.items():
+            if value == MASK:
+                if "email" in key:
+                    result[key] = f"replay_{next(self.emails)}_{time.time_ns()}@example.com"
+                elif "password" in key:
+                    result[key] = self.password
+                elif key == "username":
+                    result[key] = f"replay_{next(self.emails)}_{time.time_ns()}"
+                continue  # Прочие скрытые значения (токены, ссылки, имена) не восстановить
+            model = BODY_ID_FIELDS.get(key)
+            if model is not None and isinstance(value, list):
+                result[key] = [self.map_id(model, item) for item in value]
+            elif model is not None:
+                result[key] = self.map_id(model, value)
+            else:
+                result[key] = self.map_body(value, user)
+        return result
+
+    def map_record(self, record, started):
+        """
+        Составляет запрос к стенду по записи.
+        :param record: Запись трафика
+        :param started: Время первой записи
+        :return: Запрос или None, если запись не воспроизводится
+        """
+        path, method = record["path"], record["method"]
+        if path.startswith(SKIPPED_PREFIXES):
+            return None
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return None
+        body = record.get("body")
+        if record.get("event") != "traffic" and method not in ("GET", "HEAD", "DELETE"):
+            return None  # Тело запроса в лог nginx не пишется
+        if body == MASK:
+            return None  # Тело не было записано (не JSON или слишком большое)
+
+        view_class = getattr(match.func, "cls", None) or getattr(match.func, "view_class", None)
+        queryset = getattr(view_class, "queryset", None)
+        kwargs = dict(match.kwargs)
+        if queryset is not None and "pk" in kwargs:
+            kwargs["pk"] = self.map_id(queryset.model, kwargs["pk"])
+        url = reverse(match.view_name, kwargs=kwargs)
+        if record.get("query"):
+            url = f"{url}?{urlencode(record['query'], doseq=True)}"
+
+        user = None if match.view_name in ANONYMOUS_ROUTES else self.map_user(record)
+        if match.view_name in TOKEN_ROUTES:
+            account = next(self.round_robin)
+            body = {"email": account.email, "password": self.password}
+        elif body is not None:
+            body = self.map_body(body, user)
+        return Request(
+            offset=(record["time"] - started).total_seconds(),
+            label=f"{method} {match.view_name}",
+            method=method,
+            url=url,
+            body=None if body is None else json.dumps(body).encode(),
+            user=user,
+        )
+
+
+class TokenCache:
+    """
+    Выпускает JWT-токены пользователей стенда (потокобезопасно, с повторным выпуском устаревших токенов).
+    """
+
+    def __init__(self):
+        self.tokens = {}
+        self.lock = threading.Lock()
+
+    def get(self, user):
+        """
+        Возвращает токен пользователя.
+        :param user: Пользователь
+        :return: JWT-токен доступа
+        """
+        with self.lock:
+            token, issued = self.tokens.get(user.pk, (None, 0))
+            if token is None or time.monotonic() - issued > TOKEN_LIFETIME:
+                token, issued = str(AccessToken.for_user(user)), time.monotonic()
+                self.tokens[user.pk] = (token, issued)
+            return token
+
+
+def replay(requests, target, speed, concurrency):
+    """
+    Отправляет запросы по расписанию записи, ускоренному в speed раз.
+    :param requests: Список запросов
+    :param target: Адрес стенда
+    :param speed: Ускорение
+    :param concurrency: Количество одновременных соединений
+    :return: Кортеж (результаты {маршрут: [(время ответа, сек., статус)]}, отставания от расписания, сек.,
+        длительность, сек.)
+    """
+    address = urlsplit(target)
+    tokens = TokenCache()
+    pending = queue.Queue(maxsize=concurrency * 4)
+    results, lags = defaultdict(list), []
+    lock = threading.Lock()
+    start = time.perf_counter() + 0.5  # Время на запуск потоков
+
+    def produce():
+        for request in requests:
+            pending.put(request)
+        for _ in range(concurrency):
+            pending.put(None)
+
+    def connect():
+        return http.client.HTTPConnection(address.hostname, address.port or 80, timeout=60)
+
+    def worker():
+        local_results, local_lags = [], []
+        connection = connect()
+        while (request := pending.get()) is not None:
+            delay = start + request.offset / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            local_lags.append(max(-delay, 0.0))
+            headers = {"Connection": "keep-alive"}
+            if request.user is not None:
+                headers["Authorization"] = f"Bearer {tokens.get(request.user)}"
+            if request.body is not None:
+                headers["Content-Type"] = "application/json"
+            sent = time.perf_counter()
+            try:
+                connection.request(request.method, request.url, body=request.body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                status = 0  # Соединение разорвано или таймаут
+                connection.close()
+                connection = connect()
+            local_results.append((request.label, time.perf_counter() - sent, status))
+        with lock:
+            for label, latency, status in local_results:
+                results[label].append((latency, status))
+            lags.extend(local_lags)
+
+    threads = [threading.Thread(target=produce)] + [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, lags, time.perf_counter() - start
+
+
+def percentile(values, share):
+    """
+    Возвращает перцентиль.
+    :param values: Значения
+    :param share: Доля (0.99 - 99-й перцентиль)
+    :return: Значение перцентиля
+    """
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[round(share * 100) - 1]
+
+
+def print_report(results, lags, duration, planned):
+    """
+    Печатает распределение времени ответа по маршрутам.
+    :param results: Результаты {маршрут: [(время ответа, сек., статус)]}
+    :param lags: Отставания от расписания, сек.
+    :param duration: Длительность воспроизведения, сек.
+    :param planned: Длительность записи с учётом ускорения, сек.
+    :return: None
+    """
+    total = sum(len(items) for items in results.values())
+    print(f"{'Маршрут':<44}{'запросов':>10}{'p50, мс':>10}{'p90, мс':>10}{'p99, мс':>10}{'макс, мс':>10}{'ошибок':>8}")
+    for label, items in sorted(results.items(), key=lambda pair: len(pair[1]), reverse=True):
+        latencies = sorted(latency * 1000 for latency, _ in items)
+        errors = sum(1 for _, status in items if status == 0 or status >= 500)
+        print(
+            f"{label:<44}{len(items):>10}{percentile(latencies, 0.5):>10.1f}{percentile(latencies, 0.9):>10.1f}"
+            f"{percentile(latencies, 0.99):>10.1f}{latencies[-1]:>10.1f}{errors:>8}"
+        )
+    statuses = Counter(status for items in results.values() for _, status in items)
+    print(
+        f"\nЗапросов: {total} за {duration:.1f} с ({total / duration:.1f} в секунду), по расписанию - {planned:.1f} с"
+    )
+    print(
+        "Коды ответов: "
+        + ", ".join(f"{status or 'нет ответа'}: {count}" for status, count in sorted(statuses.items()))
+    )
+    lag_ms = sorted(lag * 1000 for lag in lags)
+    print(f"Отставание от расписания: p50 {percentile(lag_ms, 0.5):.1f} мс, p99 {percentile(lag_ms, 0.99):.1f} мс")
+
+
+def main():
+    """
+    Читает записи, переносит их на данные стенда, воспроизводит и печатает отчёт.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="Логи config.traffic и nginx (.gz читаются как архивы)")
+    parser.add_argument("--target", default="http://127.0.0.1:8000", help="Адрес стенда")
+    parser.add_argument("--speed", type=float, default=1.0, help="Ускорение относительно записи (1-50)")
+    parser.add_argument("--concurrency", type=int, default=64, help="Количество одновременных соединений")
+    parser.add_argument("--limit", type=int, help="Воспроизвести только первые N запросов")
+    parser.add_argument("--read-only", action="store_true", help="Пропускать запросы, изменяющие данные")
+    parser.add_argument("--password", default="password123", help="Пароль пользователей стенда (generate_dataset)")
+    parser.add_argument("--stubs-port", type=int, help="Запустить заглушки Stripe и ЦБ РФ на этом порту")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed должен быть больше нуля")
+
+    records = read_records(args.files)
+    if args.read_only:
+        records = [record for record in records if record["method"] in ("GET", "HEAD")]
+    records = records[: args.limit]
+    if not records:
+        raise SystemExit("Нет записей для воспроизведения")
+
+    mapper = Mapper(args.password)
+    requests = [request for record in records if (request := mapper.map_record(record, records[0]["time"]))]
+    print(f"Записей: {len(records)}, воспроизводится: {len(requests)}, ускорение: {args.speed:g}x")
+    if not requests:
+        raise SystemExit("Ни одна запись не воспроизводится на стенде")
+
+    stubs = start_stubs(args.stubs_port) if args.stubs_port else None
+    try:
+        results, lags, duration = replay(requests, args.target, args.speed, args.concurrency)
+    finally:
+        if stubs is not None:
+            stubs.shutdown()
+    print_report(results, lags, duration, requests[-1].offset / args.speed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Заглушки внешних API для нагрузочных тестов: Stripe (цены, сессии оплаты, статус сессии) и ежедневные курсы ЦБ РФ.
+
+Заглушка отвечает сразу или с задержкой --latency-ms, имитируя время ответа настоящего API. Чтобы локальный стенд
+обращался к заглушке, web и Celery запускаются с переменными окружения:
+    STRIPE_API_BASE=http://<хост>:8090
+    CBR_DAILY_URL=http://<хост>:8090/scripts/XML_daily.asp
+
+Запуск (или вместе с воспроизведением трафика: benchmarks/replay.py --stubs-port 8090):
+    python benchmarks/stubs.py [--port 8090] [--latency-ms 0]
+"""
+
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CBR_DAILY_XML = """<?xml version="1.0" encoding="windows-1251"?>
+<ValCurs Date="01.01.2025" name="Foreign Currency Market">
+<Valute ID="R01235"><NumCode>840</NumCode><CharCode>USD</CharCode><Nominal>1</Nominal><Name>Доллар США</Name>
+<Value>90,0000</Value><VunitRate>90</VunitRate></Valute>
+</ValCurs>
+""".encode(
+    "windows-1251"
+)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Отвечает на запросы к Stripe и ЦБ РФ.
+    """
+
+    protocol_version = "HTTP/1.1"  # Постоянные соединения, как у настоящих API
+    latency = 0.0
+    counter = itertools.count(1)
+
+    def send(self, body, content_type="application/json", status=200):
+        """
+        Отправляет ответ после задержки latency.
+        :param body: Тело ответа (словарь для JSON или байты)
+        :param content_type: Тип содержимого
+        :param status: HTTP-статус
+        :return: None
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(body, dict):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        """
+        Возвращает статус сессии оплаты Stripe или курсы ЦБ РФ.
+        :return: None
+        """
+        if self.path.startswith("/v1/checkout/sessions/"):
+            session_id = self.path.rsplit("/", 1)[-1]
+            self.send({"id": session_id, "object": "checkout.session", "payment_status": "paid"})
+        elif self.path.startswith("/v1/"):
+            self.send({"error": {"message": "Неизвестный адрес заглушки"}}, status=404)
+        else:
+            self.send(CBR_DAILY_XML, "application/xml; charset=windows-1251")
+
+    def do_POST(self):
+        """
+        Создаёт цену или сессию оплаты Stripe.
+        :return: None
+        """
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        number = next(self.counter)
+        if self.path == "/v1/prices":
+            self.send({"id": f"price_stub_{number}", "object": "price", "currency": "usd"})
+        elif self.path == "/v1/checkout/sessions":
+            session_id = f"cs_stub_{number}"
+            url = f"https://checkout.stripe.com/c/pay/{session_id}"
+            self.send({"id": session_id, "object": "checkout.session", "url": url, "payment_status": "unpaid"})
+        else:
+            self.send({"error": {"message": "Неизвестный адрес заглушки"}}, status=404)
+
+    def log_message(self, format, *args):
+        """
+        Не печатает каждый запрос.
+        :return: None
+        """
+
+
+def start_stubs(port, latency_ms=0.0):
+    """
+    Запускает заглушки в фоновом потоке.
+    :param port: Порт
+    :param latency_ms: Задержка ответа, мс
+    :return: Сервер (остановка - server.shutdown())
+    """
+    handler = type("Handler", (StubHandler,), {"latency": latency_ms / 1000})
+    server = ThreadingHTTPServer(("0.0.0.0", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    """
+    Запускает заглушки и ждёт завершения по Ctrl+C.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8090, help="Порт")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Задержка ответа, мс")
+    args = parser.parse_args()
+
+    server = start_stubs(args.port, args.latency_ms)
+    print(f"Заглушки Stripe и ЦБ РФ слушают порт {args.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Общие настройки админки для больших таблиц (курсы, уроки, оплаты, пользователи).
+
+Стандартная страница списка в админке считает точное количество строк (и ещё раз - без фильтров), выводит в боковой
+панели все значения фильтра по связанной модели и читает полные строки связанных объектов по одному запросу на
+строку. LargeTableAdminMixin заменяет подсчёт оценкой (EstimatedCountPaginator), отключает второй подсчёт и счётчики
+у значений фильтров, а поля из list_defer (длинные тексты) не читает из БД на странице списка. AutocompleteFilter -
+фильтр по связанному объекту с поиском через автодополнение админки вместо списка всех объектов.
+"""
+
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.admin.widgets import AutocompleteSelect
+
+from materials.paginators import EstimatedCountPaginator
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """
+    Фильтр списка по внешнему ключу с выбором объекта через автодополнение (admin:autocomplete). Подключается как
+    ("user", AutocompleteFilter); у админки связанной модели должны быть заданы search_fields.
+    """
+
+    template = "admin/autocomplete_filter.html"
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f"{field_path}__{field.target_field.attname}__exact"
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.model_admin = model_admin
+
+    def expected_parameters(self):
+        """
+        Возвращает параметры адреса, которые использует фильтр.
+        :return: Список параметров
+        """
+        return [self.lookup_kwarg]
+
+    def has_output(self):
+        """
+        Фильтр выводится всегда: значения выбираются через автодополнение, а не из списка.
+        :return: True
+        """
+        return True
+
+    def get_facet_counts(self, pk_attname, filtered_qs):
+        """
+        Счётчики у значений не выводятся: значений в боковой панели нет.
+        :return: Пустой словарь
+        """
+        return {}
+
+    def choices(self, changelist):
+        """
+        Возвращает единственный вариант - адрес списка без этого фильтра (для сброса и для JavaScript фильтра).
+        :param changelist: Страница списка
+        :return: Генератор вариантов
+        """
+        yield {
+            "selected": self.lookup_kwarg not in self.used_parameters,
+            "query_string": changelist.get_query_string(remove=[self.lookup_kwarg]),
+            "display": "Все",
+        }
+
+    def render_widget(self):
+        """
+        Выводит поле выбора с автодополнением. Выбранный объект читается одним запросом.
+        :return: HTML поля
+        """
+        widget = AutocompleteSelect(self.field, self.model_admin.admin_site, attrs={"style": "width: 100%"})
+        queryset = self.field.related_model._default_manager.all()
+        field = forms.ModelChoiceField(queryset, widget=widget, required=False)
+        return field.widget.render(self.lookup_kwarg, self.used_parameters.get(self.lookup_kwarg))
+
+
+class LargeTableChangeList(ChangeList):
+    """
+    Страница списка, которая не читает поля list_defer админки.
+    """
+
+    def get_queryset(self, request, exclude_parameters=None):
+        """
+        Возвращает объекты списка без полей list_defer.
+        :param request: Запрос
+        :param exclude_parameters: Параметры фильтров, которые не применяются
+        :return: QuerySet
+        """
+        queryset = super().get_queryset(request, exclude_parameters)
+        return queryset.defer(*self.model_admin.list_defer) if self.model_admin.list_defer else queryset
+
+
+class LargeTableAdminMixin:
+    """
+    Настройки админки для таблиц с миллионами строк (см. config.admin_mixins).
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False  # Без второго COUNT(*) по всей таблице
+    show_facets = admin.ShowFacets.NEVER  # Счётчики у значений фильтров - по COUNT на значение
+    list_defer = ()  # Поля, которые не читаются на странице списка
+
+    def get_changelist(self, request, **kwargs):
+        """
+        Возвращает класс страницы списка.
+        :param request: Запрос
+        :param kwargs: Список именованных аргументов
+        :return: LargeTableChangeList
+        """
+        return LargeTableChangeList
+
+    @property
+    def media(self):
+        """
+        Добавляет скрипты автодополнения, если в списке есть фильтры AutocompleteFilter.
+        :return: Media
+        """
+        media = super().media
+        fields = [item[0] for item in self.list_filter if isinstance(item, tuple) and item[1] is AutocompleteFilter]
+        if fields:
+            widget = AutocompleteSelect(self.model._meta.get_field(fields[0]), self.admin_site)
+            media += widget.media + forms.Media(js=["admin/js/autocomplete_filter.js"])
+        return media
@@ -0,0 +1,158 @@
+"""
+Асинхронные представления DRF для ASGI-сервера.
+
+DRF выполняет представления синхронно, поэтому при ASYNC_VIEWS=True AsyncViewMixin делает представление
+асинхронным: аутентификация, проверка прав и троттлинг выполняются в потоке (sync_to_async), после чего вызывается
+асинхронный обработчик действия - метод с префиксом "a" (acreate для create, acheck_status для check_status), а
+если его нет, синхронный обработчик в потоке. Пока асинхронный обработчик ждёт ответ внешнего API, цикл событий
+воркера uvicorn обслуживает другие запросы. При ASYNC_VIEWS=False (WSGI) представления работают как обычно.
+
+Под ASGI Django отдаёт потоковый ответ с синхронным итератором, только прочитав его целиком в память, поэтому
+асинхронные обработчики потоковых ответов передают в StreamingHttpResponse итератор aiterate_in_chunks().
+"""
+
+from functools import wraps
+from inspect import iscoroutinefunction
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.decorators import classonlymethod
+from django.utils.functional import classproperty
+from rest_framework import status
+from rest_framework.response import Response
+
+
+class AsyncViewMixin:
+    """
+    Выполняет представление асинхронно при ASYNC_VIEWS=True (см. config.async_views).
+    Attributes:
+        run_async (bool): Экземпляр создан асинхронным представлением (задаётся в as_view())
+    """
+
+    run_async = False
+
+    @classproperty
+    def view_is_async(cls):
+        """
+        Сообщает Django, что представление асинхронное.
+        :return: True, если включены асинхронные представления
+        """
+        return settings.ASYNC_VIEWS
+
+    @classonlymethod
+    def as_view(cls, *args, **initkwargs):
+        """
+        Создаёт асинхронную функцию представления при ASYNC_VIEWS=True.
+        :param args: Список позиционных документов (действия вьюсета)
+        :param initkwargs: Список именованных аргументов
+        :return: Функция представления
+        """
+        if not settings.ASYNC_VIEWS:
+            return super().as_view(*args, **initkwargs)
+        view = super().as_view(*args, run_async=True, **initkwargs)
+        if iscoroutinefunction(view):  # APIView: Django уже сделал функцию асинхронной по view_is_async
+            return view
+
+        # Функция вьюсета синхронная, но dispatch() возвращает корутину
+        @wraps(view)
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+
+        return async_view
+
+    def dispatch(self, request, *args, **kwargs):
+        """
+        Выбирает синхронную или асинхронную обработку запроса.
+        :param request: Запрос
+        :param args: Список позиционных документов
+        :param kwargs: Список именованных аргументов
+        :return: Ответ или корутина, возвращающая ответ
+        """
+        if self.run_async:
+            return self.async_dispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
+    async def async_dispatch(self, request, *args, **kwargs):
+        """
+        Асинхронный вариант APIView.dispatch().
+        :param request: Запрос
+        :param args: Список позиционных документов
+        :param kwargs: Список именованных аргументов
+        :return: Ответ
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            response = await self.get_async_handler(request)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    def get_async_handler(self, request):
+        """
+        Возвращает асинхронный обработчик запроса.
+        :param request: Запрос
+        :return: Асинхронный метод действия или синхронный обработчик, обёрнутый в sync_to_async
+        """
+        method = request.method.lower()
+        if method in self.http_method_names:
+            handler = getattr(self, method, self.http_method_not_allowed)
+        else:
+            handler = self.http_method_not_allowed
+        if handler != self.http_method_not_allowed:
+            async_handler = getattr(self, f"a{getattr(self, 'action', None) or method}", None)
+            if iscoroutinefunction(async_handler):
+                return async_handler
+        return sync_to_async(handler)
+
+
+async def aiterate_in_chunks(iterable, chunk_size):
+    """
+    Асинхронно перебирает синхронный итератор (например, строки из серверного курсора), читая его в потоке порциями.
+    Все порции читаются в одном потоке (sync_to_async с thread_sensitive), поэтому курсор остаётся в своём соединении
+    с БД, а в памяти одновременно находится только одна порция.
+    :param iterable: Синхронный итератор строк
+    :param chunk_size: Количество элементов в порции
+    :return: Асинхронный генератор порций, склеенных в одну строку
+    """
+    iterator = iter(iterable)
+    read_chunk = sync_to_async(lambda: list(islice(iterator, chunk_size)))
+    while chunk := await read_chunk():
+        yield "".join(chunk)
+
+
+class AsyncCreateModelMixin:
+    """
+    Асинхронный вариант CreateModelMixin: создание объекта в aperform_create() может ждать внешние API, не занимая
+    поток.
+    """
+
+    async def acreate(self, request, *args, **kwargs):
+        """
+        Создаёт объект.
+        :param request: Запрос
+        :param args: Список позиционных документов
+        :param kwargs: Список именованных аргументов
+        :return: Ответ
+        """
+        serializer = self.get_serializer(data=request.data)
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        await self.aperform_create(serializer)
+        data = await sync_to_async(getattr)(serializer, "data")
+        return Response(data, status=status.HTTP_201_CREATED, headers=self.get_success_headers(data))
+
+    async def aperform_create(self, serializer):
+        """
+        Сохраняет объект.
+        :param serializer: Сериализатор
+        :return: None
+        """
+        await sync_to_async(serializer.save)()
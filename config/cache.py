@@ -0,0 +1,99 @@
+"""
+Бэкенды кеша, которые считают попадания и промахи для метрик запроса (см. config.middleware) и умеют удалять ключ,
+только если его значение не изменилось (delete_if_value(): снятие блокировки только её владельцем).
+"""
+
+import pickle
+
+from asgiref.sync import sync_to_async
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+from config.middleware import record_cache
+
+_missing = object()
+
+# Удаляет ключ, только если его значение не изменилось (одной командой Redis)
+DELETE_IF_VALUE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+
+class InstrumentedCacheMixin:
+    """
+    Считает попадания и промахи кеша при чтении.
+    """
+
+    def get(self, key, default=None, version=None):
+        """
+        Читает значение из кеша.
+        :param key: Ключ
+        :param default: Значение по умолчанию
+        :param version: Версия ключа
+        :return: Значение или default
+        """
+        value = super().get(key, _missing, version)
+        if value is _missing:
+            record_cache(0, 1)
+            return default
+        record_cache(1, 0)
+        return value
+
+    async def adelete_if_value(self, key, value, version=None):
+        """
+        Асинхронный вариант delete_if_value().
+        :param key: Ключ
+        :param value: Ожидаемое значение
+        :param version: Версия ключа
+        :return: True, если ключ удалён
+        """
+        return await sync_to_async(self.delete_if_value, thread_sensitive=False)(key, value, version)
+
+
+class InstrumentedRedisCache(InstrumentedCacheMixin, RedisCache):
+    """
+    Кеш в Redis с подсчётом попаданий и промахов.
+    """
+
+    def get_many(self, keys, version=None):
+        """
+        Читает несколько значений из кеша.
+        :param keys: Ключи
+        :param version: Версия ключей
+        :return: Словарь найденных значений
+        """
+        keys = list(keys)
+        values = super().get_many(keys, version)
+        record_cache(len(values), len(keys) - len(values))
+        return values
+
+    def delete_if_value(self, key, value, version=None):
+        """
+        Удаляет ключ, если в нём всё ещё записано value (например, снимает блокировку, только если её не взял
+        другой запрос после истечения срока).
+        :param key: Ключ
+        :param value: Ожидаемое значение
+        :param version: Версия ключа
+        :return: True, если ключ удалён
+        """
+        key = self.make_and_validate_key(key, version=version)
+        client = self._cache.get_client(key, write=True)
+        return bool(client.eval(DELETE_IF_VALUE_SCRIPT, 1, key, self._cache._serializer.dumps(value)))
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    """
+    Кеш в памяти процесса с подсчётом попаданий и промахов (get_many() читает ключи через get()).
+    """
+
+    def delete_if_value(self, key, value, version=None):
+        """
+        Удаляет ключ, если в нём всё ещё записано value.
+        :param key: Ключ
+        :param value: Ожидаемое значение
+        :param version: Версия ключа
+        :return: True, если ключ удалён
+        """
+        key = self.make_and_validate_key(key, version=version)
+        with self._lock:
+            if self._has_expired(key) or pickle.loads(self._cache[key]) != value:
+                return False
+            return self._delete(key)
@@ -1,6 +1,16 @@
 import os
+import time
+from datetime import datetime
+from time import perf_counter
 
 from celery import Celery
+from celery.signals import before_task_publish, task_failure, task_postrun, task_prerun, task_retry, worker_init
+from django.conf import settings
+from django.db import close_old_connections
+from prometheus_client import start_http_server
+
+from config.metrics import TASK_FAILURES, TASK_QUEUE_WAIT, TASK_RETRIES, TASK_RUNTIME, get_registry
+from config.slow_queries import set_query_origin
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
@@ -15,3 +25,123 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
+
+
+@task_prerun.connect
+@task_postrun.connect
+def close_old_db_connections(**kwargs):
+    """
+    Закрывает устаревшие и сломанные соединения с БД до и после задачи (или возвращает их в пул), как Django делает
+    это в начале и в конце HTTP-запроса. Без этого постоянные соединения воркера не проверяются и не обновляются.
+    :param kwargs: Аргументы сигнала
+    :return: None
+    """
+    close_old_connections()
+
+
+@task_prerun.connect
+def set_task_query_origin(task=None, **kwargs):
+    """
+    Запоминает задачу как источник запросов к БД для журнала медленных запросов (см. config.slow_queries).
+    :param task: Задача
+    :param kwargs: Аргументы сигнала
+    :return: None
+    """
+    set_query_origin(f"task {task.name}")
+
+
+@task_postrun.connect
+def reset_task_query_origin(**kwargs):
+    """
+    Сбрасывает источник запросов к БД после задачи.
+    :param kwargs: Аргументы сигнала
+    :return: None
+    """
+    set_query_origin(None)
+
+
+# Время начала выполняющихся задач по id (при пуле потоков задач в процессе несколько)
+_task_started = {}
+
+
+@before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    """
+    Записывает в заголовки сообщения время отправки задачи: по нему воркер считает время ожидания в очереди. При
+    повторе (retry) задача отправляется заново и время перезаписывается.
+    :param headers: Заголовки сообщения
+    :param kwargs: Аргументы сигнала
+    :return: None
+    """
+    if headers is not None:
+        headers["published_at"] = time.time()
+
+
+@task_prerun.connect
+def observe_task_started(task_id=None, task=None, **kwargs):
+    """
+    Запоминает время начала задачи и записывает время её ожидания в очереди (для отложенных задач - от ETA).
+    Время отправки берётся с часов отправителя (web или celery-beat), поэтому метрика точна с точностью до
+    расхождения часов между контейнерами.
+    :param task_id: Id задачи
+    :param task: Задача
+    :param kwargs: Аргументы сигнала
+    :return: None
+    """
+    _task_started[task_id] = perf_counter()
+    # Воркер переносит заголовки сообщения в атрибуты task.request, apply() оставляет их в task.request.headers
+    published_at = getattr(task.request, "published_at", None) or (task.request.headers or {}).get("published_at")
+    if published_at is None:
+        return
+    eta = getattr(task.request, "eta", None)
+    if eta:
+        eta = datetime.fromisoformat(eta) if isinstance(eta, str) else eta
+        published_at = max(published_at, eta.timestamp())
+    TASK_QUEUE_WAIT.labels(task.name).observe(max(time.time() - published_at, 0))
+
+
+@task_postrun.connect
+def observe_task_finished(task_id=None, task=None, **kwargs):
+    """
+    Записывает время выполнения задачи.
+    :param task_id: Id задачи
+    :param task: Задача
+    :param kwargs: Аргументы сигнала
+    :return: None
+    """
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_RUNTIME.labels(task.name).observe(perf_counter() - started)
+
+
+@task_retry.connect
+def count_task_retry(sender=None, **kwargs):
+    """
+    Считает повторы задачи.
+    :param sender: Задача
+    :param kwargs: Аргументы сигнала
+    :return: None
+    """
+    TASK_RETRIES.labels(sender.name).inc()
+
+
+@task_failure.connect
+def count_task_failure(sender=None, **kwargs):
+    """
+    Считает ошибки задачи.
+    :param sender: Задача
+    :param kwargs: Аргументы сигнала
+    :return: None
+    """
+    TASK_FAILURES.labels(sender.name).inc()
+
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    """
+    Запускает в главном процессе воркера HTTP-сервер метрик Prometheus. В многопроцессном режиме он отдаёт сумму
+    метрик всех процессов пула (см. config.metrics).
+    :param kwargs: Аргументы сигнала
+    :return: None
+    """
+    start_http_server(settings.CELERY_METRICS_PORT, registry=get_registry())
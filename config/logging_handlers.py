@@ -0,0 +1,241 @@
+"""
+Неблокирующая запись логов в файлы.
+
+QueueFileHandler только кладёт запись в очередь, а сериализация в JSON, запись на диск, ротация и сжатие старых
+файлов выполняются в фоновом потоке QueueListener. Поток запускается при первой записи в каждом процессе: после fork
+(воркеры gunicorn с preload_app, воркеры Celery) у дочернего процесса его нет, и он запускает свой.
+SamplingFilter пропускает только часть частых однотипных событий (например, запросов списков).
+"""
+
+import gzip
+import json
+import logging
+import os
+import queue
+import random
+import shutil
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Атрибуты LogRecord, которые не относятся к полям, переданным через extra
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Форматирует запись в одну строку JSON. Поля, переданные через extra, добавляются в запись как есть.
+    """
+
+    def format(self, record):
+        """
+        Форматирует запись.
+        :param record: Запись лога
+        :return: Строка JSON
+        """
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+        }
+        data.update({key: value for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES})
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc_info"] = record.exc_text
+        if record.stack_info:
+            data["stack_info"] = record.stack_info
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def gzip_rotator(source, dest):
+    """
+    Сжимает файл лога при ротации.
+    :param source: Текущий файл лога
+    :param dest: Имя архива
+    :return: None
+    """
+    with open(source, "rb") as source_file, gzip.open(dest, "wb") as dest_file:
+        shutil.copyfileobj(source_file, dest_file)
+    os.remove(source)
+
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    """
+    Ротирует файл лога по размеру и сжимает старые файлы в gzip (reports.log.1.gz, reports.log.2.gz, ...).
+    Если файл уже ротировал другой процесс, обработчик открывает новый файл вместо повторной ротации.
+    """
+
+    rotator = staticmethod(gzip_rotator)
+
+    @staticmethod
+    def namer(name):
+        """
+        Возвращает имя архива.
+        :param name: Имя файла после ротации
+        :return: Имя архива
+        """
+        return f"{name}.gz"
+
+    def doRollover(self):
+        """
+        Ротирует файл, если его не ротировал другой процесс.
+        :return: None
+        """
+        if self.stream is not None and self.is_rotated_elsewhere():
+            self.stream.close()
+            self.stream = self._open()
+            return
+        super().doRollover()
+
+    def is_rotated_elsewhere(self):
+        """
+        Проверяет, что открытый файл уже переименован другим процессом.
+        :return: True, если по пути файла лога находится другой файл или его нет
+        """
+        try:
+            return os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+
+class QueueFileHandler(QueueHandler):
+    """
+    Передаёт записи в фоновый поток, который пишет их в файл в формате JSON с ротацией и сжатием.
+    Если очередь переполнена, запись отбрасывается, а не задерживает запрос; когда очередь освобождается, в лог
+    пишется предупреждение с количеством отброшенных записей.
+    Attributes:
+        dropped (int): Количество отброшенных записей
+        reported_dropped (int): Количество отброшенных записей, о которых уже записано предупреждение
+    """
+
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, backup_count=5, queue_size=10000):
+        """
+        Создаёт обработчик.
+        :param filename: Файл лога
+        :param max_bytes: Размер файла, после которого выполняется ротация, байт
+        :param backup_count: Количество хранимых архивов
+        :param queue_size: Максимальное количество записей в очереди
+        """
+        super().__init__(queue.Queue(queue_size))
+        self.queue_size = queue_size
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.target = CompressingRotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+        )
+        self.target.setFormatter(JSONFormatter())
+        self.listener = None
+        self.listener_pid = None
+        self.dropped = 0
+        self.reported_dropped = 0
+
+    def ensure_listener(self):
+        """
+        Запускает фоновый поток в текущем процессе, если он ещё не запущен.
+        :return: None
+        """
+        if self.listener_pid == os.getpid():
+            return
+        with self.lock:
+            if self.listener_pid == os.getpid():
+                return
+            if self.listener_pid is not None:
+                # Процесс создан через fork: поток родителя не существует, а очередь могла остаться заблокированной
+                self.queue = queue.Queue(self.queue_size)
+            self.listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+            self.listener.start()
+            self.listener_pid = os.getpid()
+
+    def emit(self, record):
+        """
+        Ставит запись в очередь.
+        :param record: Запись лога
+        :return: None
+        """
+        self.ensure_listener()
+        super().emit(record)
+
+    def enqueue(self, record):
+        """
+        Добавляет запись в очередь без ожидания.
+        :param record: Запись лога
+        :return: None
+        """
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped > self.reported_dropped:  # Очередь освободилась - сообщаем о потерянных записях
+            warning = logging.makeLogRecord(
+                {
+                    "name": __name__,
+                    "levelno": logging.WARNING,
+                    "levelname": "WARNING",
+                    "msg": f"Очередь лога переполнена, отброшено записей: {self.dropped - self.reported_dropped}",
+                }
+            )
+            try:
+                self.queue.put_nowait(warning)
+                self.reported_dropped = self.dropped
+            except queue.Full:
+                pass
+
+    def prepare(self, record):
+        """
+        Подставляет аргументы в сообщение в потоке запроса (объекты аргументов могут измениться) и переводит
+        исключение в текст. Сериализация в JSON выполняется в фоновом потоке.
+        :param record: Запись лога
+        :return: Копия записи для очереди
+        """
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def close(self):
+        """
+        Дописывает записи из очереди и закрывает файл.
+        :return: None
+        """
+        with self.lock:
+            if self.listener is not None and self.listener_pid == os.getpid():
+                self.listener.stop()
+            self.listener = None
+            self.listener_pid = None
+        self.target.close()
+        super().close()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает только долю rate записей с событием event (поле extra={"event": ...}). Остальные записи проходят
+    всегда. В пропущенные записи добавляется поле sample_rate, чтобы по логам можно было оценить полное количество.
+    """
+
+    def __init__(self, event, rate=1.0):
+        """
+        Создаёт фильтр.
+        :param event: Событие, записи которого отбираются
+        :param rate: Доля пропускаемых записей от 0 до 1
+        """
+        super().__init__()
+        self.event = event
+        self.rate = float(rate)
+
+    def filter(self, record):
+        """
+        Решает, записывать ли запись.
+        :param record: Запись лога
+        :return: True, если запись нужно записать
+        """
+        if getattr(record, "event", None) != self.event or self.rate >= 1:
+            return True
+        if random.random() >= self.rate:
+            return False
+        record.sample_rate = self.rate
+        return True
@@ -0,0 +1,169 @@
+"""
+Метрики Prometheus.
+
+MetricsMiddleware для каждого запроса к web-процессу собирает время ответа и количество запросов к БД по маршрутам
+(представлениям, см. config.middleware.get_view_name), коды ответов и количество выполняющихся запросов. Задачи
+Celery (см. config.celery) отдают время выполнения, время ожидания в очереди, повторы и ошибки. Метрики отдаются
+в текстовом формате Prometheus: web - по адресу /metrics, воркер Celery - HTTP-сервером на порту CELERY_METRICS_PORT.
+
+Если задана переменная окружения PROMETHEUS_MULTIPROC_DIR (её задают entrypoint_web.sh и entrypoint_celery.sh),
+prometheus_client работает в многопроцессном режиме: каждый воркер gunicorn и процесс пула Celery пишет метрики в
+свои файлы в этом каталоге, а при чтении метрики всех процессов суммируются. Каталог очищается при старте
+контейнера, файлы завершившихся воркеров gunicorn помечаются в хуке child_exit (см. gunicorn.conf.py).
+"""
+
+import os
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from config.middleware import AsyncCapableMiddleware, add_query_observer, get_view_name
+
+_queries = ContextVar("metrics_queries", default=None)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Время обработки запроса, сек.",
+    ["route", "method"],
+)
+RESPONSES = Counter(
+    "http_responses_total",
+    "Количество ответов по кодам",
+    ["route", "method", "status"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Количество запросов к БД за один запрос",
+    ["route", "method"],
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100, float("inf")),
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Количество выполняющихся запросов",
+    multiprocess_mode="livesum",
+)
+
+TASK_RUNTIME = Histogram(
+    "celery_task_runtime_seconds",
+    "Время выполнения задачи Celery, сек.",
+    ["task"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, float("inf")),
+)
+TASK_QUEUE_WAIT = Histogram(
+    "celery_task_queue_wait_seconds",
+    "Время ожидания задачи Celery в очереди от отправки (или ETA) до начала выполнения, сек.",
+    ["task"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, float("inf")),
+)
+TASK_RETRIES = Counter("celery_task_retries_total", "Количество повторов задачи Celery", ["task"])
+TASK_FAILURES = Counter("celery_task_failures_total", "Количество ошибок задачи Celery", ["task"])
+
+
+def get_registry():
+    """
+    Возвращает реестр метрик для выдачи: в многопроцессном режиме - сумму метрик всех процессов.
+    :return: Реестр метрик
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """
+    Отдаёт метрики в текстовом формате Prometheus.
+    :param request: Запрос
+    :return: Ответ с метриками
+    """
+    return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+@add_query_observer
+def count_query(connection, sql, params, many, duration):
+    """
+    Считает запросы к БД текущего HTTP-запроса (обработчик config.middleware.query_observer).
+    :param connection: Соединение
+    :param sql: SQL
+    :param params: Параметры
+    :param many: executemany
+    :param duration: Время запроса, сек.
+    :return: None
+    """
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def get_route(request):
+    """
+    Возвращает маршрут запроса для меток метрик. Запросы, не попавшие ни в одно представление, объединяются, чтобы
+    произвольные адреса не порождали новые временные ряды.
+    :param request: Запрос
+    :return: Имя представления или "unmatched"
+    """
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return get_view_name(match.func, request.method) or "unmatched"
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    """
+    Собирает метрики Prometheus для каждого запроса (см. config.metrics).
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        counter = [0]
+        token = _queries.set(counter)
+        REQUESTS_IN_PROGRESS.inc()
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            _queries.reset(token)
+        self.observe(request, response, perf_counter() - started, counter[0])
+        return response
+
+    async def __acall__(self, request):
+        counter = [0]
+        token = _queries.set(counter)
+        REQUESTS_IN_PROGRESS.inc()
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            _queries.reset(token)
+        self.observe(request, response, perf_counter() - started, counter[0])
+        return response
+
+    @staticmethod
+    def observe(request, response, duration, db_queries):
+        """
+        Записывает метрики завершённого запроса.
+        :param request: Запрос
+        :param response: Ответ
+        :param duration: Время обработки запроса, сек.
+        :param db_queries: Количество запросов к БД
+        :return: None
+        """
+        route, method = get_route(request), request.method
+        REQUEST_LATENCY.labels(route, method).observe(duration)
+        REQUEST_DB_QUERIES.labels(route, method).observe(db_queries)
+        RESPONSES.labels(route, method, response.status_code).inc()
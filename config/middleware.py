@@ -0,0 +1,374 @@
+"""
+Измерение производительности запросов.
+
+PerformanceMiddleware для доли запросов PERFORMANCE_SAMPLE_RATE собирает общее время, количество и время запросов к
+БД, попадания и промахи кеша (см. config.cache), время сериализации и время запросов к внешним API. Результат
+отдаётся в заголовке Server-Timing и пишется в лог config.performance. Если представление задаёт бюджет запросов к
+БД (атрибут query_budget: число или словарь {действие вьюсета или HTTP-метод: число}) и запрос его превысил, в лог
+пишется предупреждение. Бюджеты всех маршрутов проверяются тестами (см. config.tests.QueryBudgetTestCase).
+В запросах вне выборки метрики не собираются: обёртка запросов к БД и счётчики кеша только читают ContextVar.
+"""
+
+import logging
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger("config.performance")
+
+_metrics = ContextVar("request_metrics", default=None)
+_serializing = ContextVar("serializing", default=False)
+_unobserved = ContextVar("unobserved_queries", default=False)
+_query_observers = []  # Обработчики запросов к БД (см. add_query_observer)
+
+
+@dataclass
+class RequestMetrics:
+    """
+    Метрики одного запроса.
+    Attributes:
+        db_queries (int): Количество запросов к БД
+        db_time (float): Время запросов к БД, сек.
+        cache_hits (int): Количество попаданий в кеш
+        cache_misses (int): Количество промахов кеша
+        timings (dict): Время по этапам (serializer, http), сек.
+    """
+
+    db_queries: int = 0
+    db_time: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    timings: dict = field(default_factory=dict)
+
+
+def add_timing(name, seconds):
+    """
+    Добавляет время этапа к метрикам текущего запроса.
+    :param name: Этап
+    :param seconds: Время, сек.
+    :return: None
+    """
+    metrics = _metrics.get()
+    if metrics is not None:
+        metrics.timings[name] = metrics.timings.get(name, 0.0) + seconds
+
+
+def record_cache(hits, misses):
+    """
+    Добавляет попадания и промахи кеша к метрикам текущего запроса.
+    :param hits: Количество попаданий
+    :param misses: Количество промахов
+    :return: None
+    """
+    metrics = _metrics.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+@contextmanager
+def measure(name):
+    """
+    Измеряет время блока кода как этап запроса.
+    :param name: Этап
+    :return: Контекстный менеджер
+    """
+    if _metrics.get() is None:
+        yield
+        return
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(name, perf_counter() - started)
+
+
+def timed(name):
+    """
+    Декоратор: измеряет время вызова функции (синхронной или асинхронной) как этап запроса.
+    :param name: Этап
+    :return: Декоратор
+    """
+
+    def decorator(func):
+        if iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with measure(name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with measure(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class TimedSerializerMixin:
+    """
+    Измеряет время сериализации объектов (этап serializer). Вложенные сериализаторы не учитываются повторно.
+    """
+
+    def to_representation(self, instance):
+        """
+        Сериализует объект с измерением времени.
+        :param instance: Объект
+        :return: Словарь данных
+        """
+        if _serializing.get() or _metrics.get() is None:
+            return super().to_representation(instance)
+        token = _serializing.set(True)
+        try:
+            with measure("serializer"):
+                return super().to_representation(instance)
+        finally:
+            _serializing.reset(token)
+
+
+def add_query_observer(observer):
+    """
+    Подключает обработчик запросов к БД к общей обёртке query_observer.
+    :param observer: Функция observer(connection, sql, params, many, duration), duration - время запроса, сек.
+    :return: Обработчик (функция используется как декоратор)
+    """
+    if observer not in _query_observers:
+        _query_observers.append(observer)
+    return observer
+
+
+@contextmanager
+def unobserved_queries():
+    """
+    Выполняет блок без обработчиков запросов к БД: служебные запросы (например, EXPLAIN журнала медленных запросов)
+    не считаются запросами приложения и не попадают в метрики и бюджеты.
+    :return: Контекстный менеджер
+    """
+    token = _unobserved.set(True)
+    try:
+        yield
+    finally:
+        _unobserved.reset(token)
+
+
+def query_observer(execute, sql, params, many, context):
+    """
+    Обёртка запросов к БД (connection.execute_wrapper): измеряет время запроса и передаёт его всем обработчикам
+    (метрики запроса, счётчик Prometheus в config.metrics, журнал медленных запросов в config.slow_queries). Одна
+    обёртка вместо отдельной на каждого потребителя: запрос проходит через один уровень вызова в Python.
+    :param execute: Выполнение запроса
+    :param sql: SQL
+    :param params: Параметры
+    :param many: executemany
+    :param context: Контекст
+    :return: Результат выполнения запроса
+    """
+    if _unobserved.get():
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = perf_counter() - started
+        for observer in _query_observers:
+            observer(context["connection"], sql, params, many, duration)
+
+
+def install_query_observer(sender=None, connection=None, **kwargs):
+    """
+    Подключает обёртку запросов к соединению с БД (обработчик сигнала connection_created).
+    :param sender: Класс соединения
+    :param connection: Соединение
+    :param kwargs: Список именованных аргументов
+    :return: None
+    """
+    if query_observer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_observer)
+
+
+# Модуль импортируется вместе с пакетом config (config.celery), то есть до открытия первого соединения: обёртка
+# подключается ко всем соединениям, в том числе открытым в потоках синхронного кода асинхронных представлений
+connection_created.connect(install_query_observer)
+
+
+@add_query_observer
+def record_query(connection, sql, params, many, duration):
+    """
+    Добавляет запрос к БД к метрикам текущего запроса.
+    :param connection: Соединение
+    :param sql: SQL
+    :param params: Параметры
+    :param many: executemany
+    :param duration: Время запроса, сек.
+    :return: None
+    """
+    metrics = _metrics.get()
+    if metrics is not None:
+        metrics.db_queries += 1
+        metrics.db_time += duration
+
+
+class AsyncCapableMiddleware:
+    """
+    Основа middleware, которые работают и в синхронной (WSGI), и в асинхронной (ASGI) цепочке. Под ASGI Django
+    вызывает такой middleware как корутину (__acall__()), а не в потоке через sync_to_async, поэтому асинхронные
+    представления не занимают поток на время запроса. Подкласс реализует __call__() и __acall__() и в начале
+    __call__() передаёт запрос в __acall__(), если async_mode.
+    Attributes:
+        async_mode (bool): Следующий обработчик цепочки - корутина
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+
+def get_view_name(view_func, method):
+    """
+    Возвращает имя представления для метрик и логов.
+    :param view_func: Функция представления
+    :param method: HTTP-метод запроса
+    :return: "Класс.действие" для вьюсетов, имя класса или функции для остальных представлений
+    """
+    view_class = getattr(view_func, "cls", None)
+    if view_class is None:
+        return getattr(view_func, "__qualname__", None)
+    action = getattr(view_func, "actions", {}).get(method.lower())
+    return f"{view_class.__name__}.{action}" if action else view_class.__name__
+
+
+def get_view_query_budget(view_func, method):
+    """
+    Возвращает бюджет запросов к БД представления.
+    :param view_func: Функция представления
+    :param method: HTTP-метод запроса
+    :return: Бюджет или None, если он не задан
+    """
+    budget = getattr(getattr(view_func, "cls", None), "query_budget", None)
+    if isinstance(budget, dict):
+        method = method.lower()
+        budget = budget.get(getattr(view_func, "actions", {}).get(method, method))
+    return budget
+
+
+def get_query_budget(request):
+    """
+    Возвращает бюджет запросов к БД представления, обработавшего запрос.
+    :param request: Запрос
+    :return: Кортеж (имя представления, бюджет или None)
+    """
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return None, None
+    return get_view_name(match.func, request.method), get_view_query_budget(match.func, request.method)
+
+
+def format_server_timing(metrics, total):
+    """
+    Формирует значение заголовка Server-Timing.
+    :param metrics: Метрики запроса
+    :param total: Общее время запроса, сек.
+    :return: Значение заголовка
+    """
+    parts = [f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.db_queries} queries"']
+    if metrics.cache_hits or metrics.cache_misses:
+        parts.append(f'cache;desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"')
+    parts.extend(f"{name};dur={seconds * 1000:.1f}" for name, seconds in sorted(metrics.timings.items()))
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class PerformanceMiddleware(AsyncCapableMiddleware):
+    """
+    Собирает метрики производительности для доли запросов PERFORMANCE_SAMPLE_RATE (см. config.middleware).
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if random.random() >= settings.PERFORMANCE_SAMPLE_RATE:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _metrics.set(metrics)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _metrics.reset(token)
+        self.report(request, response, metrics, perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= settings.PERFORMANCE_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _metrics.set(metrics)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _metrics.reset(token)
+        self.report(request, response, metrics, perf_counter() - started)
+        return response
+
+    @staticmethod
+    def report(request, response, metrics, total):
+        """
+        Добавляет заголовок Server-Timing и пишет метрики запроса в лог, а при превышении бюджета запросов к БД -
+        предупреждение.
+        :param request: Запрос
+        :param response: Ответ
+        :param metrics: Метрики запроса
+        :param total: Общее время запроса, сек.
+        :return: None
+        """
+        response["Server-Timing"] = format_server_timing(metrics, total)
+        view, budget = get_query_budget(request)
+        data = {
+            "event": "request_timing",
+            "method": request.method,
+            "path": request.path,
+            "view": view,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 1),
+            "db_queries": metrics.db_queries,
+            "db_ms": round(metrics.db_time * 1000, 1),
+            "cache_hits": metrics.cache_hits,
+            "cache_misses": metrics.cache_misses,
+            **{f"{name}_ms": round(seconds * 1000, 1) for name, seconds in metrics.timings.items()},
+        }
+        logger.info(
+            "%s %s: %.1f мс, запросов к БД: %s",
+            request.method,
+            request.path,
+            total * 1000,
+            metrics.db_queries,
+            extra=data,
+        )
+        if budget is not None and metrics.db_queries > budget:
+            logger.warning(
+                "Превышен бюджет запросов к БД в %s: %s из %s",
+                view,
+                metrics.db_queries,
+                budget,
+                extra={**data, "event": "query_budget_exceeded", "query_budget": budget},
+            )
@@ -0,0 +1,535 @@
+import hashlib
+import json
+import logging
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.db import IntegrityError
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from config.middleware import measure
+from config.renderers import ORJSONRenderer
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+FIELDS_PARAM = "fields"  # Параметр запроса со списком возвращаемых полей
+OMIT_PARAM = "omit"  # Параметр запроса со списком исключаемых полей
+IDS_PARAM = "ids"  # Параметр запроса со списком ID для получения нескольких объектов
+
+
+def get_idempotency_key_model():
+    """
+    Возвращает модель сохранённых ответов идемпотентного создания (IDEMPOTENCY_KEY_MODEL).
+    :return: Модель
+    """
+    return apps.get_model(settings.IDEMPOTENCY_KEY_MODEL)
+
+
+def parse_list_param(request, name):
+    """
+    Разбирает параметр запроса со значениями через запятую.
+    :param request: Запрос
+    :param name: Имя параметра
+    :return: Список значений или None, если параметр не передан
+    """
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+class IdempotentCreateMixin:
+    """
+    Делает создание объекта идемпотентным по заголовку Idempotency-Key.
+
+    Первый запрос с ключом выполняется как обычно, а его ответ сохраняется в Redis и в БД на время
+    IDEMPOTENCY_KEY_TTL. Повторные запросы с тем же ключом получают сохранённый ответ без повторного выполнения
+    create(). Одновременные запросы с одним ключом выполняются по очереди: блокировка ключа берётся в Redis на
+    IDEMPOTENCY_LOCK_TIMEOUT (дольше самого долгого создания оплаты) со случайным значением, и запрос снимает её,
+    только если она всё ещё его.
+    """
+
+    def create(self, request, *args, **kwargs):
+        """
+        Выполняет создание объекта не более одного раза для каждого ключа идемпотентности.
+        :param request: Запрос
+        :param args: Список позиционных документов
+        :param kwargs: Список именованных аргументов
+        :return: Ответ (новый или сохранённый ранее)
+        """
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return super().create(request, *args, **kwargs)
+        response, cache_key, request_hash, lock_token = self.reserve_key(request, key)
+        if response is not None:
+            return response
+
+        try:
+            response = super().create(request, *args, **kwargs)
+            if response.status_code < 500:
+                self.store_response(request.user, key, cache_key, request_hash, response)
+            return response
+        finally:
+            cache.delete_if_value(f"{cache_key}:lock", lock_token)
+
+    async def acreate(self, request, *args, **kwargs):
+        """
+        Асинхронный вариант create() для асинхронных представлений (см. config.async_views).
+        :param request: Запрос
+        :param args: Список позиционных документов
+        :param kwargs: Список именованных аргументов
+        :return: Ответ (новый или сохранённый ранее)
+        """
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return await super().acreate(request, *args, **kwargs)
+        response, cache_key, request_hash, lock_token = await sync_to_async(self.reserve_key)(request, key)
+        if response is not None:
+            return response
+
+        try:
+            response = await super().acreate(request, *args, **kwargs)
+            if response.status_code < 500:
+                await sync_to_async(self.store_response)(request.user, key, cache_key, request_hash, response)
+            return response
+        finally:
+            await cache.adelete_if_value(f"{cache_key}:lock", lock_token)
+
+    def reserve_key(self, request, key):
+        """
+        Проверяет ключ идемпотентности и блокирует его на время создания объекта.
+        Одновременные запросы с одним ключом ждут, пока первый из них сохранит ответ.
+        :param request: Запрос
+        :param key: Ключ идемпотентности
+        :return: Кортеж (ответ, ключ кеша, хеш запроса, значение блокировки). Ответ возвращается, если создавать объект
+        не нужно (ошибка или сохранённый ранее ответ), иначе он None, а ключ заблокирован до удаления блокировки
+        "<ключ кеша>:lock" с этим значением
+        """
+        if len(key) > 255:
+            response = Response(
+                {"error": "Ключ идемпотентности не может быть длиннее 255 символов."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+            return response, None, None, None
+
+        request_hash = self.get_request_hash(request)
+        cache_key = f"idempotency:{request.user.pk}:{key}"
+        lock_key = f"{cache_key}:lock"
+        lock_token = uuid.uuid4().hex
+
+        stored = self.get_stored_response(request.user, key, cache_key)
+        if stored is None and not cache.add(lock_key, lock_token, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+            # Запрос с этим ключом уже выполняется - ждём его ответ
+            stored = self.wait_for_stored_response(request.user, key, cache_key)
+            if stored is None:
+                response = Response(
+                    {"error": "Запрос с этим ключом идемпотентности ещё выполняется."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+                return response, cache_key, request_hash, None
+        if stored is not None:
+            return self.replay_response(stored, request_hash, key), cache_key, request_hash, None
+
+        try:
+            stored = self.get_stored_response(request.user, key, cache_key)  # Ответ мог появиться до блокировки
+        except Exception:
+            cache.delete_if_value(lock_key, lock_token)
+            raise
+        if stored is not None:
+            cache.delete_if_value(lock_key, lock_token)
+            return self.replay_response(stored, request_hash, key), cache_key, request_hash, None
+        return None, cache_key, request_hash, lock_token
+
+    @staticmethod
+    def get_request_hash(request):
+        """
+        Вычисляет хеш запроса для проверки, что ключ повторно используется с теми же данными.
+        :param request: Запрос
+        :return: Хеш SHA-256 метода, пути и тела запроса
+        """
+        data = request.data
+        if hasattr(data, "lists"):  # QueryDict из form-data
+            data = dict(data.lists())
+        payload = json.dumps([request.method, request.path, data], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def get_stored_response(user, key, cache_key):
+        """
+        Ищет сохранённый ответ сначала в Redis, затем в БД.
+        :param user: Пользователь
+        :param key: Ключ идемпотентности
+        :param cache_key: Ключ кеша
+        :return: Словарь с хешем запроса, статусом и телом ответа или None
+        """
+        stored = cache.get(cache_key)
+        if stored is not None:
+            return stored
+
+        record = get_idempotency_key_model().objects.filter(user=user, key=key, expires_at__gt=timezone.now()).first()
+        if record is None:
+            return None
+        stored = {
+            "request_hash": record.request_hash,
+            "status": record.response_status,
+            "body": record.response_body,
+        }
+        timeout = (record.expires_at - timezone.now()).total_seconds()
+        cache.set(cache_key, stored, max(int(timeout), 1))  # Возвращаем ответ в кеш
+        return stored
+
+    def wait_for_stored_response(self, user, key, cache_key):
+        """
+        Ждёт, пока параллельный запрос с тем же ключом сохранит свой ответ.
+        :param user: Пользователь
+        :param key: Ключ идемпотентности
+        :param cache_key: Ключ кеша
+        :return: Сохранённый ответ или None, если ожидание истекло
+        """
+        deadline = time.monotonic() + settings.IDEMPOTENCY_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return stored
+            if cache.get(f"{cache_key}:lock") is None:  # Первый запрос завершился, не сохранив ответ
+                return self.get_stored_response(user, key, cache_key)
+        return None
+
+    @staticmethod
+    def store_response(user, key, cache_key, request_hash, response):
+        """
+        Сохраняет ответ в Redis и в БД.
+        :param user: Пользователь
+        :param key: Ключ идемпотентности
+        :param cache_key: Ключ кеша
+        :param request_hash: Хеш запроса
+        :param response: Ответ
+        :return: None
+        """
+        ttl = settings.IDEMPOTENCY_KEY_TTL
+        stored = {
+            "request_hash": request_hash,
+            "status": response.status_code,
+            "body": json.loads(json.dumps(response.data, default=str)),
+        }
+        try:
+            get_idempotency_key_model().objects.update_or_create(
+                user=user,
+                key=key,
+                defaults={
+                    "request_hash": request_hash,
+                    "response_status": response.status_code,
+                    "response_body": stored["body"],
+                    "expires_at": timezone.now() + ttl,
+                },
+            )
+        except IntegrityError:
+            logger.warning("Ключ идемпотентности %s пользователя %s уже сохранён", key, user)
+        cache.set(cache_key, stored, int(ttl.total_seconds()))
+
+    @staticmethod
+    def replay_response(stored, request_hash, key):
+        """
+        Возвращает сохранённый ответ.
+        :param stored: Сохранённый ответ
+        :param request_hash: Хеш текущего запроса
+        :param key: Ключ идемпотентности
+        :return: Ответ
+        """
+        if stored["request_hash"] != request_hash:
+            return Response(
+                {"error": "Ключ идемпотентности уже использован с другими данными запроса."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        logger.info("Повторный запрос с ключом идемпотентности %s, возвращён сохранённый ответ", key)
+        return Response(stored["body"], status=stored["status"], headers={"Idempotent-Replayed": "true"})
+
+
+class CachedObjectMixin:
+    """
+    Запоминает объект, полученный get_object(), на время запроса.
+
+    Экземпляр представления создаётся на каждый запрос, поэтому повторные вызовы get_object() (из собственных
+    методов представления, из super().retrieve()/update()/destroy() и из get_serializer_class()) возвращают уже
+    загруженный объект, для которого права доступа проверены один раз.
+    """
+
+    def get_object(self):
+        """
+        Возвращает объект запроса, загружая его из БД только при первом вызове.
+        :return: Объект
+        """
+        if not hasattr(self, "_object"):
+            self._object = super().get_object()
+        return self._object
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Ограничивает поля сериализатора параметрами запроса ?fields=id,name и ?omit=description.
+
+    Поля отсекаются только для чтения (GET, HEAD, OPTIONS) и только у сериализатора верхнего уровня (в том числе
+    many=True), вложенные сериализаторы не затрагиваются. Невостребованные SerializerMethodField не вычисляются.
+    """
+
+    def get_fields(self):
+        """
+        Возвращает поля сериализатора с учётом параметров fields и omit.
+        :return: Словарь полей
+        """
+        fields = super().get_fields()
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS or not self.is_top_level():
+            return fields
+
+        for param in (FIELDS_PARAM, OMIT_PARAM):
+            names = parse_list_param(request, param)
+            if names is None:
+                continue
+            unknown = [name for name in names if name not in fields]
+            if unknown:
+                raise ValidationError(
+                    {param: "Неизвестные поля: %s. Допустимы: %s." % (", ".join(unknown), ", ".join(fields))}
+                )
+            if param == FIELDS_PARAM:
+                fields = {name: field for name, field in fields.items() if name in names}
+            else:
+                fields = {name: field for name, field in fields.items() if name not in names}
+        return fields
+
+    def is_top_level(self):
+        """
+        Проверяет, что сериализатор не вложен в другой сериализатор.
+        :return: True для сериализатора верхнего уровня, иначе False
+        """
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+
+class SparseFieldsMixin:
+    """
+    Загружает из БД только столбцы, нужные для полей, запрошенных через ?fields= или ?omit= в списке объектов.
+
+    Столбцы определяются по source полей сериализатора. Для SerializerMethodField загружается только первичный
+    ключ, поэтому методы должны обходиться им или связанными объектами. Если среди полей есть такое, для которого
+    столбец определить нельзя (свойство модели), queryset не ограничивается.
+    Attributes:
+        sparse_required_fields (tuple): Поля модели, которые загружаются всегда
+    """
+
+    sparse_required_fields = ()
+
+    def get_queryset(self):
+        """
+        Ограничивает загружаемые столбцы queryset списка объектов.
+        :return: QuerySet
+        """
+        queryset = super().get_queryset()
+        request = self.request
+        if getattr(self, "action", "list") != "list" or request.method not in SAFE_METHODS:
+            return queryset
+        if parse_list_param(request, FIELDS_PARAM) is None and parse_list_param(request, OMIT_PARAM) is None:
+            return queryset
+        columns = self.get_sparse_columns(queryset.model)
+        return queryset if columns is None else queryset.only(*columns)
+
+    def get_sparse_columns(self, model):
+        """
+        Определяет поля модели, нужные для запрошенных полей сериализатора.
+        :param model: Модель
+        :return: Множество имён полей модели или None, если их нельзя определить
+        """
+        columns = {model._meta.pk.name, *self.sparse_required_fields}
+        for field in self.get_serializer().fields.values():
+            if isinstance(field, serializers.SerializerMethodField):
+                continue
+            if field.source == "*":
+                return None
+            try:
+                model_field = model._meta.get_field(field.source.split(".")[0])
+            except FieldDoesNotExist:
+                return None
+            if model_field.concrete:
+                columns.add(model_field.name)
+        return columns
+
+
+class MultiGetMixin:
+    """
+    Возвращает несколько объектов по ?ids=1,2,3 одним запросом без пагинации.
+    Attributes:
+        max_ids (int): Максимальное количество ID в одном запросе
+    """
+
+    max_ids = 100
+
+    def get_requested_ids(self):
+        """
+        Разбирает список ID из параметра запроса.
+        :return: Список ID или None, если параметр не передан
+        """
+        if getattr(self, "action", "list") != "list":
+            return None
+        ids = parse_list_param(self.request, IDS_PARAM)
+        if ids is None:
+            return None
+        if not all(item.isdigit() for item in ids):
+            raise ValidationError({IDS_PARAM: "ID должны быть целыми числами через запятую."})
+        if len(ids) > self.max_ids:
+            raise ValidationError({IDS_PARAM: "Можно запросить не более %s объектов." % self.max_ids})
+        return [int(item) for item in ids]
+
+    def filter_queryset(self, queryset):
+        """
+        Оставляет в списке только объекты с запрошенными ID.
+        :param queryset: QuerySet
+        :return: Отфильтрованный QuerySet
+        """
+        queryset = super().filter_queryset(queryset)
+        ids = self.get_requested_ids()
+        return queryset if ids is None else queryset.filter(pk__in=ids)
+
+    def paginate_queryset(self, queryset):
+        """
+        Отключает пагинацию для запроса по списку ID.
+        :param queryset: QuerySet
+        :return: Страница объектов или None
+        """
+        if self.get_requested_ids() is not None:
+            return None
+        return super().paginate_queryset(queryset)
+
+
+class FastListMixin:
+    """
+    Быстрый путь чтения списка объектов: строки читаются через values_list() и преобразуются по заранее составленному
+    плану полей сериализатора без создания экземпляров моделей, ответ кодируется через orjson.
+
+    Включается настройкой FAST_READ_PATH. Результат совпадает с обычным list(): значения проходят через
+    to_representation() тех же полей сериализатора. SerializerMethodField поддерживаются, только если представление
+    вычисляет их аннотацией в get_fast_annotations(). Если для какого-то поля план составить нельзя (вложенный
+    сериализатор, source через точку, свойство модели), используется обычный list().
+    """
+
+    def get_fast_annotations(self):
+        """
+        Возвращает аннотации, которые заменяют SerializerMethodField на быстром пути.
+        :return: Словарь {имя поля: выражение}
+        """
+        return {}
+
+    def get_renderers(self):
+        """
+        Заменяет JSONRenderer на ORJSONRenderer, если включён быстрый путь.
+        :return: Список рендереров
+        """
+        renderers = super().get_renderers()
+        if not settings.FAST_READ_PATH:
+            return renderers
+        return [ORJSONRenderer() if type(renderer) is JSONRenderer else renderer for renderer in renderers]
+
+    def list(self, request, *args, **kwargs):
+        """
+        Возвращает список объектов по быстрому пути, если он включён и применим.
+        :param request: Запрос
+        :param args: Список позиционных документов
+        :param kwargs: Список именованных аргументов
+        :return: Ответ
+        """
+        if not settings.FAST_READ_PATH:
+            return super().list(request, *args, **kwargs)
+        plan = self.get_fast_plan(self.get_serializer())
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        names, columns, converters = plan
+        queryset = self.filter_queryset(self.get_queryset())
+        annotations = {
+            name: expression
+            for name, expression in self.get_fast_annotations().items()
+            if name in columns and name not in queryset.query.annotations  # Уже добавлены в get_queryset()
+        }
+        queryset = queryset.annotate(**annotations).values_list(*columns)
+        page = self.paginate_queryset(queryset)
+        rows = list(queryset) if page is None else page
+        with measure("serializer"):
+            data = [
+                dict(
+                    zip(names, [None if value is None else convert(value) for convert, value in zip(converters, row)])
+                )
+                for row in rows
+            ]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def get_fast_plan(self, serializer):
+        """
+        Составляет план преобразования строк values_list() в представление сериализатора.
+        :param serializer: Сериализатор списка
+        :return: Кортеж (имена полей, столбцы values_list(), функции преобразования) или None, если план составить
+            нельзя
+        """
+        model = serializer.Meta.model
+        annotations = self.get_fast_annotations()
+        names, columns, converters = [], [], []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                if name not in annotations:
+                    return None
+                names.append(name)
+                columns.append(name)
+                converters.append(identity)
+                continue
+            if field.source == "*" or "." in field.source:
+                return None
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                return None
+            if not model_field.concrete:
+                return None
+            names.append(name)
+            columns.append(model_field.attname if model_field.is_relation else model_field.name)
+            converters.append(self.get_fast_converter(field, model_field))
+        return names, columns, converters
+
+    @staticmethod
+    def get_fast_converter(field, model_field):
+        """
+        Возвращает функцию преобразования значения столбца в представление поля сериализатора.
+        :param field: Поле сериализатора
+        :param model_field: Поле модели
+        :return: Функция преобразования
+        """
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+            return identity  # values_list() уже возвращает ID связанного объекта
+        if isinstance(field, serializers.FileField):
+            return lambda name: field.to_representation(FieldFile(None, model_field, name))
+        return field.to_representation
+
+
+def identity(value):
+    """
+    Возвращает значение без изменений.
+    :param value: Значение
+    :return: Значение
+    """
+    return value
@@ -0,0 +1,138 @@
+"""
+Операции миграций, которые строят индексы без блокировки таблиц на PostgreSQL.
+
+На PostgreSQL индексы создаются через CREATE INDEX CONCURRENTLY, поэтому миграции с этими операциями должны быть
+объявлены с atomic = False. На остальных СУБД (SQLite в тестах) выполняются обычные операции Django.
+"""
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db.migrations.operations import AddConstraint, AddIndex, RemoveConstraint
+from django.db.migrations.operations.base import Operation
+
+
+def is_postgresql(schema_editor):
+    """
+    Проверяет, что миграция выполняется на PostgreSQL.
+    :param schema_editor: Редактор схемы
+    :return: True для PostgreSQL, иначе False
+    """
+    return schema_editor.connection.vendor == "postgresql"
+
+
+class AddIndexConcurrentlyIfSupported(AddIndexConcurrently):
+    """
+    Создаёт индекс конкурентно на PostgreSQL и обычным образом на остальных СУБД.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        """
+        Создаёт индекс.
+        """
+        if is_postgresql(schema_editor):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        """
+        Удаляет индекс.
+        """
+        if is_postgresql(schema_editor):
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class AddUniqueConstraintConcurrently(AddConstraint):
+    """
+    Добавляет ограничение уникальности без долгой блокировки таблицы.
+
+    На PostgreSQL сначала конкурентно строится уникальный индекс, а затем он превращается в ограничение
+    (ALTER TABLE ... ADD CONSTRAINT ... UNIQUE USING INDEX), что требует лишь кратковременной блокировки.
+    """
+
+    atomic = False
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        """
+        Создаёт уникальный индекс и ограничение на его основе.
+        """
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if not is_postgresql(schema_editor):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+            return
+
+        quote = schema_editor.quote_name
+        table = quote(model._meta.db_table)
+        name = quote(self.constraint.name)
+        columns = ", ".join(quote(model._meta.get_field(field).column) for field in self.constraint.fields)
+        schema_editor.execute(f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})")
+        schema_editor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}")
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        """
+        Удаляет ограничение вместе с его индексом.
+        """
+        RemoveConstraint(self.model_name, self.constraint.name).database_forwards(
+            app_label, schema_editor, from_state, to_state
+        )
+
+    def describe(self):
+        return "Concurrently create constraint %s on model %s" % (self.constraint.name, self.model_name)
+
+
+class CreateTrigramIndex(Operation):
+    """
+    Создаёт конкурентно GIN-индекс pg_trgm для поиска по частичному совпадению (icontains) на PostgreSQL.
+
+    Django выполняет icontains как UPPER("column"::text) LIKE UPPER(%s), поэтому индекс строится по тому же
+    выражению. Индекс не попадает в состояние моделей и на других СУБД не создаётся.
+    """
+
+    reversible = True
+    atomic = False
+
+    def __init__(self, model_name, field_name, name):
+        self.model_name = model_name
+        self.field_name = field_name
+        self.name = name
+
+    def state_forwards(self, app_label, state):
+        """
+        Не меняет состояние моделей: индекс существует только в PostgreSQL.
+        """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        """
+        Создаёт триграммный индекс.
+        """
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not is_postgresql(schema_editor) or not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        quote = schema_editor.quote_name
+        column = quote(model._meta.get_field(self.field_name).column)
+        schema_editor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {quote(self.name)} ON {quote(model._meta.db_table)} "
+            f"USING gin ((UPPER({column}::text)) gin_trgm_ops)"
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        """
+        Удаляет триграммный индекс.
+        """
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not is_postgresql(schema_editor) or not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {schema_editor.quote_name(self.name)}")
+
+    def describe(self):
+        return "Concurrently create trigram index %s on %s.%s" % (self.name, self.model_name, self.field_name)
+
+    def deconstruct(self):
+        return (
+            self.__class__.__qualname__,
+            [],
+            {"model_name": self.model_name, "field_name": self.field_name, "name": self.name},
+        )
@@ -0,0 +1,42 @@
+"""
+Рендерер JSON на основе orjson, совместимый по выводу с rest_framework.renderers.JSONRenderer.
+"""
+
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Даты и время передаются в JSONEncoder DRF, чтобы формат (например, "Z" вместо "+00:00") совпадал с JSONRenderer
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Кодирует ответ в компактный JSON через orjson.
+
+    Вывод совпадает побайтно с JSONRenderer при настройках DRF по умолчанию (UNICODE_JSON и COMPACT_JSON): типы,
+    которые orjson не кодирует сам, передаются в JSONEncoder DRF. Если клиент запросил отступы или orjson не
+    смог закодировать данные (например, целые числа больше 64 бит), используется стандартный JSONRenderer.
+    """
+
+    default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Кодирует данные ответа в JSON.
+        :param data: Данные ответа
+        :param accepted_media_type: Принятый тип содержимого
+        :param renderer_context: Контекст рендеринга
+        :return: JSON в виде байтов
+        """
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Как и JSONRenderer, экранируем U+2028 и U+2029, чтобы ответ оставался подмножеством JavaScript
+        return ret.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
@@ -0,0 +1,187 @@
+"""
+Маршрутизация чтения на реплику БД.
+
+Чтение уходит на реплику (алиас REPLICA_DATABASE) только в запросах, которые явно разрешили это через
+ReplicaReadMixin: безопасный метод, пользователь не делал записей в последние REPLICA_PIN_SECONDS секунд и в текущем
+запросе ещё не было записи. Любая запись закрепляет остаток запроса за основной БД, а ReplicaRoutingMiddleware
+после ответа закрепляет за ней и пользователя, чтобы он видел свои изменения, пока реплика догоняет основную БД.
+Вне HTTP-запросов (Celery, команды управления) все запросы идут в основную БД.
+"""
+
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+from config.middleware import AsyncCapableMiddleware
+
+_state = ContextVar("db_routing_state", default=None)
+
+
+@dataclass
+class RoutingState:
+    """
+    Состояние маршрутизации в рамках одного запроса.
+    Attributes:
+        read_from_replica (bool): Чтение разрешено направлять на реплику
+        wrote (bool): В запросе была запись в основную БД
+    """
+
+    read_from_replica: bool = False
+    wrote: bool = False
+
+
+def replica_available():
+    """
+    Проверяет, что реплика настроена.
+    :return: True, если алиас реплики есть в DATABASES
+    """
+    return settings.REPLICA_DATABASE in settings.DATABASES
+
+
+def get_pin_key(user_id):
+    """
+    Возвращает ключ кеша, закрепляющего пользователя за основной БД.
+    :param user_id: ID пользователя
+    :return: Ключ кеша
+    """
+    return f"db:pin:{user_id}"
+
+
+def is_pinned(user):
+    """
+    Проверяет, что пользователь недавно делал запись и должен читать из основной БД.
+    :param user: Пользователь
+    :return: True, если пользователь закреплён за основной БД
+    """
+    return user.is_authenticated and cache.get(get_pin_key(user.pk)) is not None
+
+
+def allow_replica_reads(request):
+    """
+    Разрешает направлять на реплику чтение до конца текущего запроса, если это безопасно.
+    :param request: Запрос
+    :return: True, если чтение будет направляться на реплику
+    """
+    state = _state.get()
+    if state is None or not replica_available():
+        return False
+    state.read_from_replica = request.method in SAFE_METHODS and not state.wrote and not is_pinned(request.user)
+    return state.read_from_replica
+
+
+class ReplicaRouter:
+    """
+    Направляет чтение на реплику, если это разрешено для текущего запроса, а запись - в основную БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        """
+        Выбирает БД для чтения.
+        :param model: Модель
+        :param hints: Подсказки
+        :return: Алиас реплики или None (основная БД)
+        """
+        state = _state.get()
+        if state is not None and state.read_from_replica and not state.wrote:
+            return settings.REPLICA_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        """
+        Выбирает БД для записи и закрепляет остаток запроса за основной БД.
+        :param model: Модель
+        :param hints: Подсказки
+        :return: Алиас основной БД
+        """
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """
+        Разрешает связи между объектами основной БД и реплики: это одни и те же данные.
+        :param obj1: Первый объект
+        :param obj2: Второй объект
+        :param hints: Подсказки
+        :return: True
+        """
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """
+        Разрешает миграции только в основной БД: реплика получает изменения схемы через репликацию.
+        :param db: Алиас БД
+        :param app_label: Приложение
+        :param model_name: Модель
+        :param hints: Подсказки
+        :return: True для основной БД, иначе False
+        """
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware(AsyncCapableMiddleware):
+    """
+    Создаёт состояние маршрутизации на время запроса и после записи закрепляет пользователя за основной БД на
+    REPLICA_PIN_SECONDS секунд.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _state.set(RoutingState())
+        try:
+            response = self.get_response(request)
+            if _state.get().wrote:
+                self.pin_user(request)
+            return response
+        finally:
+            _state.reset(token)
+
+    async def __acall__(self, request):
+        token = _state.set(RoutingState())
+        try:
+            response = await self.get_response(request)
+            if _state.get().wrote:
+                await sync_to_async(self.pin_user)(request)  # Пользователь может быть ленивым и читаться из БД
+            return response
+        finally:
+            _state.reset(token)
+
+    @staticmethod
+    def pin_user(request):
+        """
+        Закрепляет пользователя запроса с записью за основной БД.
+        :param request: Запрос
+        :return: None
+        """
+        user = getattr(request, "user", None)  # DRF записывает сюда пользователя после аутентификации
+        if user is not None and user.is_authenticated and replica_available():
+            cache.set(get_pin_key(user.pk), 1, settings.REPLICA_PIN_SECONDS)
+
+
+class ReplicaReadMixin:
+    """
+    Разрешает представлению читать с реплики в безопасных запросах (см. config.routers).
+    Attributes:
+        replica_actions (tuple): Действия вьюсета, которые читают с реплики (None - все безопасные запросы)
+    """
+
+    replica_actions = None
+
+    def initial(self, request, *args, **kwargs):
+        """
+        Включает чтение с реплики до проверки прав и выполнения действия.
+        :param request: Запрос
+        :param args: Список позиционных документов
+        :param kwargs: Список именованных аргументов
+        :return: None
+        """
+        if self.replica_actions is None or getattr(self, "action", None) in self.replica_actions:
+            allow_replica_reads(request)
+        super().initial(request, *args, **kwargs)
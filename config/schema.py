@@ -0,0 +1,82 @@
+"""
+Схема OpenAPI для документации API (/swagger/, /redoc/).
+
+Построение схемы обходит все представления и сериализаторы и занимает сотни миллисекунд, поэтому схема не строится
+на каждый запрос. Команда build_schema при запуске web записывает её в файл OPENAPI_SCHEMA_FILE (со сжатыми копиями,
+см. config.storage), и nginx отдаёт его по адресу /openapi.json. Если файла нет (nginx не перед приложением или
+команда не запускалась), запрос попадает в schema_json_view: процесс строит схему один раз за время жизни (то есть
+один раз за развёртывание) и дальше отдаёт готовый ответ. Интерфейсы Swagger и ReDoc загружают схему с
+/openapi.json (SPEC_URL в SWAGGER_SETTINGS и REDOC_SETTINGS). Схема публичная и не зависит от пользователя.
+"""
+
+import hashlib
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import etag, require_safe
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+from rest_framework.request import Request
+
+API_INFO = openapi.Info(
+    title="Snippets API",
+    default_version="v1",
+    description="Test description",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="contact@snippets.local"),
+    license=openapi.License(name="BSD License"),
+)
+
+schema_view = get_schema_view(API_INFO, public=True, permission_classes=[permissions.AllowAny])
+
+_schema = None
+_schema_lock = threading.Lock()
+
+
+def generate_schema():
+    """
+    Строит схему OpenAPI всех маршрутов API от имени анонимного пользователя. Адрес сервера в схему не пишется:
+    Swagger и ReDoc отправляют запросы на адрес, с которого открыта документация.
+    :return: Схема в JSON (байты)
+    """
+    http_request = HttpRequest()
+    http_request.method = "GET"
+    request = Request(http_request)
+    request.user = AnonymousUser()
+    schema = OpenAPISchemaGenerator(API_INFO, url="").get_schema(request=request, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def get_schema():
+    """
+    Возвращает схему, построенную в этом процессе (в режиме DEBUG строит её заново, чтобы были видны изменения кода).
+    :return: Кортеж (схема в JSON, её ETag)
+    """
+    global _schema
+    if settings.DEBUG:
+        content = generate_schema()
+        return content, hashlib.md5(content).hexdigest()
+    with _schema_lock:
+        if _schema is None:
+            content = generate_schema()
+            _schema = content, hashlib.md5(content).hexdigest()
+        return _schema
+
+
+@require_safe
+@etag(lambda request: get_schema()[1])
+def schema_json_view(request):
+    """
+    Отдаёт схему OpenAPI, если её не отдал nginx из файла.
+    :param request: Запрос
+    :return: Ответ со схемой
+    """
+    response = HttpResponse(get_schema()[0], content_type="application/json")
+    patch_cache_control(response, no_cache=True)  # Схема меняется с развёртыванием, браузер проверяет её по ETag
+    return response
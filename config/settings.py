@@ -44,11 +44,16 @@ INSTALLED_APPS += [
 INSTALLED_APPS += ["users", "materials"]  # User model  # Material model
 
 MIDDLEWARE = [
+    "config.metrics.MetricsMiddleware",
+    "config.middleware.PerformanceMiddleware",
+    "config.traffic.TrafficCaptureMiddleware",
+    "config.slow_queries.QueryOriginMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "config.routers.ReplicaRoutingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -76,6 +81,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "config.wsgi.application"
 
+# Асинхронные представления для ASGI-сервера (см. config.async_views): gunicorn запускает config.asgi с воркерами
+# uvicorn, а запросы к Stripe и ЦБ РФ не занимают поток на время ожидания ответа
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "False") == "True"
+
 # Database
 DATABASES = {
     "default": {
@@ -85,9 +94,58 @@ DATABASES = {
         "PASSWORD": os.getenv("DB_PASSWORD"),
         "HOST": os.getenv("DB_HOST"),
         "PORT": os.getenv("DB_PORT"),
+        # Постоянные соединения: соединение переиспользуется запросами процесса до DB_CONN_MAX_AGE секунд и
+        # проверяется перед повторным использованием. Под ASGI каждый запрос выполняет синхронный код в своём потоке, и
+        # постоянные соединения накапливались бы по потокам, поэтому по умолчанию они отключены (используйте DB_POOL)
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 0 if ASYNC_VIEWS else 60)),
+        "CONN_HEALTH_CHECKS": os.getenv("DB_CONN_HEALTH_CHECKS", "True") == "True",
     }
 }
 
+# Роль процесса (web или celery) - от неё зависит размер пула соединений
+DJANGO_PROCESS_ROLE = os.getenv("DJANGO_PROCESS_ROLE", "web")
+
+# Пул соединений psycopg 3 (DB_POOL=True) вместо постоянных соединений. Размер задаётся на процесс: у gunicorn
+# пул нужен на все потоки воркера, у воркера Celery (prefork) каждый дочерний процесс выполняет одну задачу за раз
+DB_POOL_SIZES = {
+    "web": (int(os.getenv("DB_POOL_MIN_SIZE_WEB", 2)), int(os.getenv("DB_POOL_MAX_SIZE_WEB", 8))),
+    "celery": (int(os.getenv("DB_POOL_MIN_SIZE_CELERY", 1)), int(os.getenv("DB_POOL_MAX_SIZE_CELERY", 2))),
+}
+if os.getenv("DB_POOL", "False") == "True":
+    from psycopg_pool import ConnectionPool
+
+    min_size, max_size = DB_POOL_SIZES[DJANGO_PROCESS_ROLE]
+    DATABASES["default"].update(
+        {
+            "ENGINE": "django.db.backends.postgresql",  # Пул поддерживается только драйвером psycopg 3
+            "CONN_MAX_AGE": 0,  # Соединения возвращаются в пул после каждого запроса
+            "OPTIONS": {
+                "pool": {
+                    "min_size": min_size,
+                    "max_size": max_size,
+                    "timeout": int(os.getenv("DB_POOL_TIMEOUT", 10)),  # Ожидание свободного соединения, сек.
+                    "check": ConnectionPool.check_connection,  # Проверка соединения при выдаче из пула
+                }
+            },
+        }
+    )
+
+# Реплика для чтения (см. config.routers): задаётся хостом DB_REPLICA_HOST, остальные параметры - как у основной БД
+REPLICA_DATABASE = "replica"
+# Сколько секунд после записи пользователь читает из основной БД (должно превышать отставание реплики)
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", 5))
+if os.getenv("DB_REPLICA_HOST"):
+    DATABASES[REPLICA_DATABASE] = {
+        **DATABASES["default"],
+        "HOST": os.getenv("DB_REPLICA_HOST"),
+        "PORT": os.getenv("DB_REPLICA_PORT", DATABASES["default"]["PORT"]),
+    }
+DATABASE_ROUTERS = ["config.routers.ReplicaRouter"]
+
+# SQLite вместо PostgreSQL (DB_ENGINE=sqlite), например для запуска бенчмарков без сервера БД
+if os.getenv("DB_ENGINE") == "sqlite":
+    DATABASES["default"] = {"ENGINE": "django.db.backends.sqlite3", "NAME": BASE_DIR / "db.sqlite3"}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -106,6 +164,11 @@ USE_TZ = True
 STATIC_URL = "static/"
 STATICFILES_DIRS = [os.path.join(BASE_DIR, "static")]
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
+# collectstatic сохраняет файлы с хешем содержимого в имени и их сжатые копии .gz и .br (см. config.storage)
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "config.storage.CompressedManifestStaticFilesStorage"},
+}
 
 # Media files
 MEDIA_ROOT = BASE_DIR / "media"
@@ -125,30 +188,52 @@ AUTHENTICATION_BACKENDS = [
 ]
 
 # Настройка логгера
+# Логи пишутся в файлы в формате JSON из фонового потока, старые файлы ротируются по размеру и сжимаются
+# (см. config.logging_handlers). Частые события запроса списков записываются с долей LOG_LIST_SAMPLE_RATE
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))  # Размер файла лога до ротации, байт
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))  # Количество хранимых архивов
+LOG_LIST_SAMPLE_RATE = float(os.getenv("LOG_LIST_SAMPLE_RATE", 0.1))
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
-    "formatters": {
-        "verbose": {"format": "%(asctime)s - %(name)s - %(levelname)s: %(message)s"},
+    "filters": {
+        "sample_list_requests": {
+            "()": "config.logging_handlers.SamplingFilter",
+            "event": "list_requested",
+            "rate": LOG_LIST_SAMPLE_RATE,
+        },
     },
     "handlers": {
         "users_file": {
             "level": "DEBUG",
-            "class": "logging.FileHandler",
+            "class": "config.logging_handlers.QueueFileHandler",
             "filename": os.path.join(BASE_DIR, "users/logs/reports.log"),
-            "encoding": "utf-8",
-            "formatter": "verbose",
-            "delay": True,  # <-- отложенное открытие файла: файл будет открыт только при первом логе,
-            # а не сразу при конфигурации
+            "max_bytes": LOG_MAX_BYTES,
+            "backup_count": LOG_BACKUP_COUNT,
+            "filters": ["sample_list_requests"],
         },
         "materials_file": {
             "level": "DEBUG",
-            "class": "logging.FileHandler",
+            "class": "config.logging_handlers.QueueFileHandler",
             "filename": os.path.join(BASE_DIR, "materials/logs/reports.log"),
-            "encoding": "utf-8",
-            "formatter": "verbose",
-            "delay": True,  # <-- отложенное открытие файла: файл будет открыт только при первом логе,
-            # а не сразу при конфигурации
+            "max_bytes": LOG_MAX_BYTES,
+            "backup_count": LOG_BACKUP_COUNT,
+            "filters": ["sample_list_requests"],
+        },
+        "config_file": {
+            "level": "DEBUG",
+            "class": "config.logging_handlers.QueueFileHandler",
+            "filename": os.path.join(BASE_DIR, "config/logs/reports.log"),
+            "max_bytes": LOG_MAX_BYTES,
+            "backup_count": LOG_BACKUP_COUNT,
+        },
+        "traffic_file": {
+            "level": "INFO",
+            "class": "config.logging_handlers.QueueFileHandler",
+            "filename": os.path.join(BASE_DIR, "config/logs/traffic.log"),
+            "max_bytes": LOG_MAX_BYTES,
+            "backup_count": LOG_BACKUP_COUNT,
         },
     },
     "loggers": {
@@ -167,9 +252,42 @@ LOGGING = {
             "level": "DEBUG",
             "propagate": False,
         },
+        "config": {
+            "handlers": ["config_file"],
+            "level": "INFO",
+            "propagate": False,
+        },
+        "config.traffic": {
+            "handlers": ["traffic_file"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }
 
+# Метрики производительности запросов (заголовок Server-Timing и лог config.performance, см. config.middleware):
+# доля запросов, для которых они собираются
+PERFORMANCE_SAMPLE_RATE = float(os.getenv("PERFORMANCE_SAMPLE_RATE", 1.0 if DEBUG else 0.1))
+
+# Журнал медленных запросов к БД (лог config.slow_queries, см. config.slow_queries и команду slow_query_report)
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 200))  # Порог длительности запроса, мс
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", 0.1))  # Доля медленных SELECT с планом
+SLOW_QUERY_EXPLAIN_INTERVAL = 60 * 60  # План одного отпечатка снимается не чаще раза в час, сек.
+SLOW_QUERY_MAX_SQL_LENGTH = 4000  # Длина SQL в записи лога, символов
+
+# Запись обезличенного трафика для воспроизведения (лог config.traffic, см. config.traffic и benchmarks/replay.py)
+TRAFFIC_CAPTURE_RATE = float(os.getenv("TRAFFIC_CAPTURE_RATE", 0))  # Доля записываемых запросов
+TRAFFIC_CAPTURE_MAX_BODY = 16 * 1024  # Тела запросов больше этого размера не записываются, байт
+
+# Метрики Prometheus (см. config.metrics): web отдаёт их по адресу /metrics, воркер Celery - на этом порту
+CELERY_METRICS_PORT = int(os.getenv("CELERY_METRICS_PORT", 9808))
+
+# Схема OpenAPI (см. config.schema): команда build_schema пишет её в файл, nginx отдаёт файл по адресу /openapi.json,
+# откуда её загружают Swagger и ReDoc
+OPENAPI_SCHEMA_FILE = os.path.join(STATIC_ROOT, "openapi.json")
+SWAGGER_SETTINGS = {"SPEC_URL": "openapi-schema"}
+REDOC_SETTINGS = {"SPEC_URL": "openapi-schema"}
+
 # Настройка DjangoFilterBackend
 REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": [  # Настройка фильтрации данных
@@ -185,6 +303,14 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Настройка подсчёта количества объектов при пагинации (см. materials.paginators.EstimatedCountPaginator)
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = int(os.getenv("PAGINATION_COUNT_ESTIMATE_THRESHOLD", 100_000))  # Строк
+PAGINATION_COUNT_CACHE_TTL = 60  # Время хранения точного количества для запросов с фильтрами, сек.
+
+# Быстрый путь чтения списков курсов, уроков и пользователей: values_list() вместо экземпляров моделей и orjson
+# вместо стандартного JSON-рендерера (см. config.mixins.FastListMixin)
+FAST_READ_PATH = os.getenv("FAST_READ_PATH", "False") == "True"
+
 # Настройка Simple JWT
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),  # Настройка времени жизни токена доступа
@@ -196,6 +322,16 @@ SIMPLE_JWT = {
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_API_KEY = os.getenv("STRIPE_API_KEY")
 
+# Адреса внешних API. Для нагрузочных тестов их можно направить на заглушки (см. benchmarks/stubs.py)
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "https://api.stripe.com")
+CBR_DAILY_URL = os.getenv("CBR_DAILY_URL", "https://www.cbr.ru/scripts/XML_daily.asp")  # Ежедневные курсы ЦБ РФ
+
+# Настройка HTTP-клиента асинхронных запросов к внешним API (Stripe, ЦБ РФ)
+EXTERNAL_API_TIMEOUT = int(os.getenv("EXTERNAL_API_TIMEOUT", 10))  # Таймаут запроса, сек.
+EXTERNAL_API_MAX_CONNECTIONS = int(os.getenv("EXTERNAL_API_MAX_CONNECTIONS", 200))  # Соединений на процесс
+STRIPE_MAX_NETWORK_RETRIES = 2  # Повторы запроса к Stripe при сетевой ошибке или ответе 409/429/5xx
+STRIPE_MAX_RETRY_DELAY = 60  # Самая долгая пауза перед повтором (заголовок Retry-After), сек.
+
 # Настройка Cors
 CORS_ALLOWED_ORIGINS = ["http://localhost:3000", "http://127.0.0.1:3000"]
 CSRF_TRUSTED_ORIGINS = ["http://localhost:3000", "http://127.0.0.1:3000"]
@@ -208,6 +344,40 @@ CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers.DatabaseScheduler"
 
+# Настройка кеша (Redis)
+CACHES = {
+    "default": {
+        "BACKEND": "config.cache.InstrumentedRedisCache",  # Считает попадания и промахи (см. config.middleware)
+        "LOCATION": os.getenv("CACHE_URL", "redis://redis:6379/2"),
+    }
+}
+# CACHE_URL=locmem:// - кеш в памяти процесса вместо Redis, например для запуска бенчмарков без Redis
+if CACHES["default"]["LOCATION"] == "locmem://":
+    CACHES["default"] = {"BACKEND": "config.cache.InstrumentedLocMemCache"}
+
+# Настройка идемпотентности создания оплат (заголовок Idempotency-Key)
+IDEMPOTENCY_KEY_MODEL = "users.IdempotencyKey"  # Модель сохранённых ответов (см. config.mixins.IdempotentCreateMixin)
+IDEMPOTENCY_KEY_TTL = timedelta(hours=int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", 24)))  # Время хранения ответа
+# Блокировка ключа должна пережить самое долгое создание оплаты: запрос курса в ЦБ РФ и два запроса к Stripe (цена и
+# сессия) со всеми повторами и паузами. Иначе повтор с тем же ключом начнёт вторую сессию оплаты. Обычно блокировка
+# снимается сразу после ответа, срок важен, только если процесс завершился посреди запроса.
+IDEMPOTENCY_LOCK_TIMEOUT = (
+    EXTERNAL_API_TIMEOUT * (1 + 2 * (STRIPE_MAX_NETWORK_RETRIES + 1))
+    + 2 * STRIPE_MAX_NETWORK_RETRIES * STRIPE_MAX_RETRY_DELAY
+    + 30  # Запросы к БД и запас
+)  # Время жизни блокировки ключа, сек.
+IDEMPOTENCY_LOCK_WAIT = 10  # Сколько ждёт повторный запрос, пока выполняется первый, сек.
+
+# Настройка сводной аналитики по оплатам
+PAYMENT_ROLLUP_OVERLAP = timedelta(minutes=5)  # Перекрытие окна обновления относительно водяного знака
+PAYMENT_ROLLUP_LOCK_TIMEOUT = 10 * 60  # Время жизни блокировки задачи обновления, сек.
+
+# Настройка ленты изменений каталога (/changes/)
+CHANGE_FEED_PAGE_SIZE = 500  # Максимальное количество изменений в одном ответе
+# Изменения моложе этого интервала не отдаются: время updated_at проставляется до фиксации транзакции, и более
+# поздняя по времени запись может стать видимой раньше более ранней
+CHANGE_FEED_SETTLE_SECONDS = 5
+
 # Настройка почты
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = os.getenv("EMAIL_HOST")
@@ -216,6 +386,16 @@ EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "True")
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 
-# Настройка лёгкой БД для тестов
+# Настройка лёгкой БД для тестов (TEST_DATABASE=postgresql запускает тесты на PostgreSQL, например для проверки
+# планов запросов)
 if "test" in sys.argv:
-    DATABASES["default"] = {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}
+    if os.getenv("TEST_DATABASE", "sqlite") == "sqlite":
+        DATABASES["default"] = {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}
+    # Реплика в тестах - зеркало основной БД. Маршрутизация на неё выключена и включается тестами маршрутизации
+    # через override_settings(REPLICA_DATABASE="replica")
+    DATABASES["replica"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+    REPLICA_DATABASE = None
+    CACHES["default"] = {"BACKEND": "config.cache.InstrumentedLocMemCache"}
+    # Тесты не запускают collectstatic, манифеста нет
+    STORAGES["staticfiles"] = {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}
+    PERFORMANCE_SAMPLE_RATE = 1.0
@@ -0,0 +1,173 @@
+"""
+Журнал медленных запросов к БД.
+
+Обработчик общей обёртки запросов к БД (config.middleware.query_observer) записывает в лог config.slow_queries каждый
+запрос дольше SLOW_QUERY_THRESHOLD_MS вместе с его отпечатком (SQL без значений параметров), источником (представление
+или задача Celery, см. QueryOriginMiddleware и config.celery) и, для доли SLOW_QUERY_EXPLAIN_RATE медленных SELECT в
+PostgreSQL, планом EXPLAIN (ANALYZE, BUFFERS). План одного отпечатка снимается не чаще раза в
+SLOW_QUERY_EXPLAIN_INTERVAL секунд: EXPLAIN ANALYZE выполняет запрос повторно. Команда slow_query_report ранжирует
+отпечатки по суммарному времени.
+"""
+
+import hashlib
+import logging
+import random
+import re
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.http import HttpRequest
+
+from config.middleware import AsyncCapableMiddleware, add_query_observer, get_view_name, unobserved_queries
+
+logger = logging.getLogger("config.slow_queries")
+
+_origin = ContextVar("query_origin", default=None)
+
+# Правила нормализации SQL для отпечатка: значения заменяются на "?", списки значений сворачиваются
+FINGERPRINT_RULES = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),  # Строки
+    (re.compile(r"%s|\$\d+"), "?"),  # Параметры
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),  # Числа
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(?+)"),  # Списки IN (...) и VALUES (...)
+    (re.compile(r"\(\?\+\)(?:\s*,\s*\(\?\+\))+"), "(?+)+"),  # Несколько строк VALUES
+    (re.compile(r"\s+"), " "),
+]
+
+
+def fingerprint(sql):
+    """
+    Нормализует SQL: запросы, отличающиеся только значениями, получают одинаковый отпечаток.
+    :param sql: SQL
+    :return: Кортеж (нормализованный SQL, короткий хеш)
+    """
+    normalized = sql
+    for pattern, replacement in FINGERPRINT_RULES:
+        normalized = pattern.sub(replacement, normalized)
+    normalized = normalized.strip()
+    return normalized, hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def set_query_origin(origin):
+    """
+    Задаёт источник запросов к БД в текущем контексте.
+    :param origin: HTTP-запрос или имя задачи Celery
+    :return: Токен для восстановления предыдущего значения
+    """
+    return _origin.set(origin)
+
+
+def get_query_origin():
+    """
+    Возвращает источник запросов к БД в текущем контексте: имя представления (или метод и путь, если запрос не попал
+    в представление), имя задачи Celery или None.
+    :return: Источник запросов
+    """
+    origin = _origin.get()
+    if not isinstance(origin, HttpRequest):
+        return origin
+    match = getattr(origin, "resolver_match", None)
+    name = get_view_name(match.func, origin.method) if match is not None else None
+    return name or f"{origin.method} {origin.path}"
+
+
+def reset_query_origin(token):
+    """
+    Восстанавливает предыдущий источник запросов к БД.
+    :param token: Токен из set_query_origin()
+    :return: None
+    """
+    _origin.reset(token)
+
+
+def explain(connection, sql, params):
+    """
+    Снимает план запроса EXPLAIN (ANALYZE, BUFFERS) в точке сохранения: ошибка не прерывает транзакцию запроса.
+    :param connection: Соединение с БД
+    :param sql: SQL
+    :param params: Параметры
+    :return: План в виде текста или None, если снять его не удалось
+    """
+    try:
+        with unobserved_queries(), transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params)
+                return "\n".join(row[0] for row in cursor.fetchall())
+    except DatabaseError as error:
+        logger.warning("Не удалось получить план запроса: %s", error)
+        return None
+
+
+def should_explain(connection, sql, digest):
+    """
+    Решает, снимать ли план медленного запроса.
+    :param connection: Соединение с БД
+    :param sql: SQL
+    :param digest: Хеш отпечатка
+    :return: True, если план нужно снять
+    """
+    if connection.vendor != "postgresql" or not sql.lstrip()[:6].upper() == "SELECT":
+        return False
+    if random.random() >= settings.SLOW_QUERY_EXPLAIN_RATE:
+        return False
+    return cache.add(f"slow_query:explain:{digest}", 1, settings.SLOW_QUERY_EXPLAIN_INTERVAL)
+
+
+@add_query_observer
+def log_slow_query(connection, sql, params, many, duration):
+    """
+    Записывает медленный запрос к БД в лог (обработчик config.middleware.query_observer).
+    :param connection: Соединение
+    :param sql: SQL
+    :param params: Параметры
+    :param many: executemany
+    :param duration: Время запроса, сек.
+    :return: None
+    """
+    duration *= 1000
+    if duration < settings.SLOW_QUERY_THRESHOLD_MS:
+        return
+
+    normalized, digest = fingerprint(sql)
+    origin = get_query_origin()
+    plan = explain(connection, sql, params) if not many and should_explain(connection, sql, digest) else None
+    logger.warning(
+        "Медленный запрос к БД (%.1f мс) в %s",
+        duration,
+        origin or "неизвестном источнике",
+        extra={
+            "event": "slow_query",
+            "duration_ms": round(duration, 1),
+            "fingerprint": digest,
+            "normalized_sql": normalized,
+            "sql": sql[: settings.SLOW_QUERY_MAX_SQL_LENGTH],
+            "origin": origin,
+            "database": connection.alias,
+            "plan": plan,
+        },
+    )
+
+
+class QueryOriginMiddleware(AsyncCapableMiddleware):
+    """
+    Запоминает запрос как источник запросов к БД для журнала медленных запросов. Имя представления определяется только
+    при записи медленного запроса (get_query_origin()): process_view под ASGI выполнялся бы в отдельном потоке.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = set_query_origin(request)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_query_origin(token)
+
+    async def __acall__(self, request):
+        token = set_query_origin(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            reset_query_origin(token)
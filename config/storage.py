@@ -0,0 +1,125 @@
+"""
+Хранилище статики с хешированными именами и сжатыми копиями файлов.
+
+При collectstatic ManifestStaticFilesStorage сохраняет копию каждого файла под именем с хешем содержимого
+(base.css -> base.5af66c1b1797.css) и записывает соответствие имён в манифест staticfiles.json, а тег static в
+шаблонах ссылается на хешированные имена. Содержимое по такому имени не меняется, поэтому nginx отдаёт его с
+Cache-Control immutable и сроком в год (см. nginx/nginx.conf). CompressedManifestStaticFilesStorage дополнительно
+сохраняет рядом с каждым хешированным текстовым файлом сжатые копии .gz и .br: nginx отдаёт их готовыми
+(gzip_static, brotli_static) и не сжимает файлы на каждый запрос. Согласованность манифеста и сжатых копий проверяет
+команда check_static.
+"""
+
+import gzip
+import zlib
+
+import brotli
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".mjs", ".map", ".json", ".svg", ".html", ".txt", ".xml", ".ttf", ".eot")
+MIN_COMPRESS_SIZE = 256  # Файлы меньше этого размера не сжимаются (выигрыш меньше заголовков ответа), байт
+
+
+def compress_gzip(content):
+    """
+    Сжимает содержимое в gzip. Время в заголовке не пишется, поэтому повторная сборка даёт тот же файл.
+    :param content: Содержимое файла
+    :return: Сжатое содержимое
+    """
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def compress_brotli(content):
+    """
+    Сжимает содержимое в brotli с максимальной степенью сжатия.
+    :param content: Содержимое файла
+    :return: Сжатое содержимое
+    """
+    return brotli.compress(content, quality=11)
+
+
+# Сжатые копии: расширение, функция сжатия и функция распаковки
+COMPRESSORS = {".gz": (compress_gzip, gzip.decompress), ".br": (compress_brotli, brotli.decompress)}
+
+
+def is_compressible(name, size):
+    """
+    Проверяет, что у файла должны быть сжатые копии.
+    :param name: Имя файла
+    :param size: Размер файла, байт
+    :return: True, если файл сжимается
+    """
+    return name.lower().endswith(COMPRESSIBLE_EXTENSIONS) and size >= MIN_COMPRESS_SIZE
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Сохраняет статику с хешированными именами и сжатыми копиями .gz и .br хешированных файлов (см. config.storage).
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        """
+        Хеширует файлы и записывает манифест (ManifestStaticFilesStorage), затем сжимает хешированные файлы.
+        :param paths: Собранные файлы
+        :param dry_run: Только показать, что будет сделано
+        :param options: Параметры collectstatic
+        :return: Генератор кортежей (исходное имя, хешированное имя, обработан ли файл)
+        """
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in sorted(set(self.hashed_files.values())):
+            self.compress(name)
+
+    def compress(self, name):
+        """
+        Сохраняет сжатые копии файла, если он сжимается. Содержимое файла с хешированным именем не меняется, поэтому
+        уже сохранённые копии (collectstatic при каждом запуске web) не пересоздаются: brotli с максимальной
+        степенью сжатия работает медленно.
+        :param name: Хешированное имя файла
+        :return: None
+        """
+        missing = [extension for extension in COMPRESSORS if not self.exists(f"{name}{extension}")]
+        if not missing:
+            return
+        with self.open(name) as file:
+            content = file.read()
+        if not is_compressible(name, len(content)):
+            return
+        for extension in missing:
+            compress, _ = COMPRESSORS[extension]
+            self._save(f"{name}{extension}", ContentFile(compress(content)))
+
+    def verify(self):
+        """
+        Проверяет, что манифест и сжатые копии согласованы: все файлы манифеста есть, у каждого сжимаемого файла
+        есть сжатые копии, и каждая сжатая копия распаковывается в содержимое своего файла.
+        :return: Список описаний ошибок (пустой, если ошибок нет)
+        """
+        hashed_files, _ = self.load_manifest()
+        if not hashed_files:
+            return [f"Манифест {self.manifest_name} не найден или пуст: запустите collectstatic"]
+        errors = []
+        for name in sorted(set(hashed_files.values())):
+            if not self.exists(name):
+                errors.append(f"{name}: файл из манифеста отсутствует")
+                continue
+            with self.open(name) as file:
+                content = file.read()
+            if not is_compressible(name, len(content)):
+                continue
+            for extension, (_, decompress) in COMPRESSORS.items():
+                compressed_name = f"{name}{extension}"
+                if not self.exists(compressed_name):
+                    errors.append(f"{compressed_name}: нет сжатой копии")
+                    continue
+                with self.open(compressed_name) as file:
+                    compressed = file.read()
+                try:
+                    matches = decompress(compressed) == content
+                except (OSError, EOFError, zlib.error, brotli.error):
+                    matches = False
+                if not matches:
+                    errors.append(f"{compressed_name}: сжатая копия не совпадает с файлом")
+        return errors
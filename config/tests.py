@@ -0,0 +1,920 @@
+import gzip
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+import unittest
+from collections import Counter
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, override_settings
+from django.urls import URLResolver, get_resolver, reverse
+from prometheus_client import REGISTRY
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config.celery import count_task_retry, reset_task_query_origin, set_task_query_origin
+from config.logging_handlers import QueueFileHandler, SamplingFilter
+from config.middleware import PerformanceMiddleware, get_view_query_budget, query_observer
+from config import schema
+from config.slow_queries import explain, fingerprint
+from config.storage import CompressedManifestStaticFilesStorage
+from config.traffic import MASK, get_pseudonym, sanitize
+from materials.models import Course, Lesson
+from materials.tasks import send_course_update_email
+from materials.views import CourseViewSet
+from users.models import Payment, Subscription
+from users.tasks import block_inactive_users, update_payment_rollup
+
+User = get_user_model()
+
+
+class LoggingHandlersTestCase(SimpleTestCase):
+    """
+    Определяет тесты неблокирующей записи логов в файлы.
+    """
+
+    def setUp(self):
+        """
+        Создаёт временный каталог для логов.
+        :param self: Объект класса
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.filename = os.path.join(self.directory.name, "reports.log")
+
+    def make_record(self, message, *args, **extra):
+        """
+        Создаёт запись лога.
+        :param message: Сообщение
+        :param args: Аргументы сообщения
+        :param extra: Дополнительные поля записи
+        :return: Запись лога
+        """
+        record = logging.LogRecord("users.views", logging.INFO, __file__, 1, message, args, None)
+        record.__dict__.update(extra)
+        return record
+
+    def read_lines(self):
+        """
+        Читает записи из файла лога.
+        :return: Список словарей
+        """
+        with open(self.filename, encoding="utf-8") as file:
+            return [json.loads(line) for line in file]
+
+    def test_json_records(self):
+        """
+        Проверяет, что записи пишутся в файл в формате JSON с полями из extra.
+        :param self: Объект класса
+        """
+        handler = QueueFileHandler(self.filename)
+        handler.handle(self.make_record("Курс %s запрошен", "Python", event="course_requested"))
+        handler.close()
+
+        [line] = self.read_lines()
+        self.assertEqual(line["message"], "Курс Python запрошен")
+        self.assertEqual(line["level"], "INFO")
+        self.assertEqual(line["logger"], "users.views")
+        self.assertEqual(line["event"], "course_requested")
+
+    def test_rotation_compresses_old_files(self):
+        """
+        Проверяет, что старые файлы ротируются и сжимаются в gzip.
+        :param self: Объект класса
+        """
+        handler = QueueFileHandler(self.filename, max_bytes=500, backup_count=2)
+        for number in range(30):
+            handler.handle(self.make_record("Запись %s", number))
+        handler.close()
+
+        self.assertTrue(os.path.exists(f"{self.filename}.1.gz"))
+        self.assertFalse(os.path.exists(f"{self.filename}.3.gz"))
+        with gzip.open(f"{self.filename}.1.gz", "rt", encoding="utf-8") as file:
+            self.assertTrue(all(json.loads(line)["message"].startswith("Запись") for line in file))
+
+    def test_listener_restarted_after_fork(self):
+        """
+        Проверяет, что при смене процесса запускается новый фоновый поток с новой очередью.
+        :param self: Объект класса
+        """
+        handler = QueueFileHandler(self.filename)
+        handler.handle(self.make_record("До fork"))
+        parent_listener, parent_queue = handler.listener, handler.queue
+        parent_listener.stop()
+        handler.listener_pid = -1  # Процесс, запустивший поток, - родительский
+
+        handler.handle(self.make_record("После fork"))
+        self.assertIsNot(handler.listener, parent_listener)
+        self.assertIsNot(handler.queue, parent_queue)
+        handler.close()
+        self.assertEqual([line["message"] for line in self.read_lines()], ["До fork", "После fork"])
+
+    def test_full_queue_drops_records(self):
+        """
+        Проверяет, что при переполненной очереди запись отбрасывается без ожидания.
+        :param self: Объект класса
+        """
+        handler = QueueFileHandler(self.filename, queue_size=2)
+        for message in ("Первая", "Вторая", "Третья"):
+            handler.enqueue(self.make_record(message))
+        self.assertEqual(handler.dropped, 1)
+
+        handler.queue.get_nowait()
+        handler.queue.get_nowait()
+        handler.enqueue(self.make_record("Четвёртая"))  # Очередь освободилась - за записью следует предупреждение
+        self.assertEqual(handler.queue.get_nowait().getMessage(), "Четвёртая")
+        self.assertEqual(handler.queue.get_nowait().levelno, logging.WARNING)
+        self.assertEqual(handler.reported_dropped, 1)
+        handler.close()
+
+    def test_sampling_filter(self):
+        """
+        Проверяет, что фильтр отбирает только записи заданного события.
+        :param self: Объект класса
+        """
+        drop_all = SamplingFilter("list_requested", rate=0)
+        self.assertFalse(drop_all.filter(self.make_record("Список", event="list_requested")))
+        self.assertTrue(drop_all.filter(self.make_record("Курс")))
+
+        keep_all = SamplingFilter("list_requested", rate=1)
+        self.assertTrue(keep_all.filter(self.make_record("Список", event="list_requested")))
+
+        half = SamplingFilter("list_requested", rate=0.5)
+        records = [self.make_record("Список", event="list_requested") for _ in range(200)]
+        kept = [record for record in records if half.filter(record)]
+        self.assertTrue(0 < len(kept) < 200)
+        self.assertTrue(all(record.sample_rate == 0.5 for record in kept))
+
+
+class CompressedStaticStorageTestCase(SimpleTestCase):
+    """
+    Определяет тесты хранилища статики со сжатыми копиями файлов.
+    """
+
+    def setUp(self):
+        """
+        Создаёт хранилище во временном каталоге и исходные файлы статики.
+        :param self: Объект класса
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = CompressedManifestStaticFilesStorage(location=directory.name, base_url="/static/")
+        self.css = b"body { background: url('logo.svg'); }\n" * 20
+        self.files = {"app.css": self.css, "logo.svg": b"<svg></svg>", "data.bin": b"\0" * 1024}
+        for name, content in self.files.items():
+            self.storage.save(name, ContentFile(content))
+
+    def collect(self):
+        """
+        Выполняет обработку файлов, как collectstatic.
+        :return: Соответствие исходных имён хешированным
+        """
+        processed = self.storage.post_process({name: (self.storage, name) for name in self.files})
+        return {name: hashed_name for name, hashed_name, _ in processed}
+
+    def test_compressed_copies(self):
+        """
+        Проверяет хешированные имена, сжатые копии и проверку их согласованности.
+        :param self: Объект класса
+        """
+        hashed = self.collect()
+
+        self.assertRegex(hashed["app.css"], r"^app\.[0-9a-f]{12}\.css$")
+        with self.storage.open(hashed["app.css"]) as file:
+            content = file.read()
+        self.assertIn(hashed["logo.svg"].encode(), content)
+        with self.storage.open(f"{hashed['app.css']}.gz") as file:
+            self.assertEqual(gzip.decompress(file.read()), content)
+        self.assertTrue(self.storage.exists(f"{hashed['app.css']}.br"))
+        self.assertFalse(self.storage.exists(f"{hashed['logo.svg']}.gz"))  # Меньше MIN_COMPRESS_SIZE
+        self.assertFalse(self.storage.exists(f"{hashed['data.bin']}.gz"))  # Не текстовый файл
+        self.assertEqual(self.storage.verify(), [])
+
+    def test_verify(self):
+        """
+        Проверяет, что проверка находит пропавшие и устаревшие сжатые копии.
+        :param self: Объект класса
+        """
+        self.assertEqual(len(self.storage.verify()), 1)  # Манифеста нет
+
+        hashed = self.collect()
+        self.storage.delete(f"{hashed['app.css']}.br")
+        self.storage.delete(f"{hashed['app.css']}.gz")
+        self.storage.save(f"{hashed['app.css']}.gz", ContentFile(gzip.compress(b"old")))
+
+        errors = self.storage.verify()
+        self.assertEqual(len(errors), 2)
+        self.assertIn(".css.gz: сжатая копия не совпадает с файлом", errors[0])
+        self.assertIn(".css.br: нет сжатой копии", errors[1])
+
+
+class OpenAPISchemaTestCase(APITestCase):
+    """
+    Определяет тесты схемы OpenAPI.
+    """
+
+    def setUp(self):
+        """
+        Сбрасывает схему, построенную процессом.
+        :param self: Объект класса
+        """
+        patcher = mock.patch.object(schema, "_schema", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_schema_view(self):
+        """
+        Проверяет, что схема строится один раз и проверяется браузером по ETag.
+        :param self: Объект класса
+        """
+        with mock.patch.object(schema, "generate_schema", wraps=schema.generate_schema) as generate_schema:
+            response = self.client.get("/openapi.json")
+            cached = self.client.get("/openapi.json", HTTP_IF_NONE_MATCH=response["ETag"])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("/course/", json.loads(response.content)["paths"])
+        self.assertNotIn("host", json.loads(response.content))
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        generate_schema.assert_called_once()
+
+    def test_build_schema(self):
+        """
+        Проверяет, что команда build_schema записывает схему и её сжатые копии.
+        :param self: Объект класса
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "openapi.json")
+            call_command("build_schema", output=path, stdout=io.StringIO())
+            with open(path, "rb") as file:
+                content = file.read()
+            with open(f"{path}.gz", "rb") as file:
+                self.assertEqual(gzip.decompress(file.read()), content)
+            self.assertTrue(os.path.exists(f"{path}.br"))
+        self.assertEqual(content, self.client.get("/openapi.json").content)
+
+
+class PerformanceMiddlewareTestCase(APITestCase):
+    """
+    Определяет тесты сбора метрик производительности запросов.
+    """
+
+    def setUp(self):
+        """
+        Создаёт тестовые данные.
+        :param self: Объект класса
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username="owner", email="owner@example.com", password="password123")
+        self.client.force_authenticate(user=self.user)
+        Course.objects.bulk_create(Course(name=f"Курс {number}", owner=self.user) for number in range(3))
+
+    def test_server_timing(self):
+        """
+        Проверяет заголовок Server-Timing и строку лога с метриками запроса.
+        :param self: Объект класса
+        """
+        with self.assertLogs("config.performance", "INFO") as logs:
+            response = self.client.get("/course/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = response.headers["Server-Timing"]
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertRegex(timing, r"serializer;dur=[\d.]+")
+        self.assertRegex(timing, r"total;dur=[\d.]+$")
+        [record] = logs.records
+        self.assertEqual(record.event, "request_timing")
+        self.assertEqual(record.view, "CourseViewSet.list")
+        self.assertGreater(record.db_queries, 0)
+
+    def test_cache_and_queries(self):
+        """
+        Проверяет подсчёт запросов к БД и попаданий и промахов кеша.
+        :param self: Объект класса
+        """
+
+        def view(request):
+            cache.get("missing")
+            cache.set("present", 1)
+            cache.get("present")
+            cache.get_many(["present", "missing"])
+            User.objects.count()
+            return HttpResponse()
+
+        with self.assertLogs("config.performance", "INFO"):
+            response = PerformanceMiddleware(view)(RequestFactory().get("/"))
+        self.assertIn("db;dur=", response.headers["Server-Timing"])
+        self.assertIn('desc="1 queries"', response.headers["Server-Timing"])
+        self.assertIn('cache;desc="2 hits, 2 misses"', response.headers["Server-Timing"])
+
+    def test_query_budget_exceeded(self):
+        """
+        Проверяет предупреждение о превышении бюджета запросов к БД.
+        :param self: Объект класса
+        """
+        with mock.patch.object(CourseViewSet, "query_budget", {"list": 1}):
+            with self.assertLogs("config.performance", "WARNING") as logs:
+                self.client.get("/course/")
+        [record] = logs.records
+        self.assertEqual(record.event, "query_budget_exceeded")
+        self.assertEqual(record.query_budget, 1)
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        """
+        Проверяет, что для запросов вне выборки метрики не собираются.
+        :param self: Объект класса
+        """
+        response = self.client.get("/course/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Server-Timing", response.headers)
+
+    @override_settings(DEBUG=True)
+    def test_asgi_chain_not_adapted(self):
+        """
+        Проверяет, что под ASGI цепочка middleware собирается без перевода обработчиков в синхронный режим.
+        :param self: Объект класса
+        """
+        with self.assertNoLogs("django.request", "DEBUG"):
+            ASGIHandler()
+
+    async def test_asgi_request(self):
+        """
+        Проверяет метрики запроса, прошедшего через асинхронную цепочку middleware.
+        :param self: Объект класса
+        """
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        with self.assertLogs("config.performance", "INFO") as logs:
+            response = await AsyncClient().get("/course/", headers=headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(response.headers["Server-Timing"], r'db;dur=[\d.]+;desc="\d+ queries"')
+        [record] = logs.records
+        self.assertEqual(record.view, "CourseViewSet.list")
+        self.assertGreater(record.db_queries, 0)
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+class SlowQueryTestCase(APITestCase):
+    """
+    Определяет тесты журнала медленных запросов к БД.
+    """
+
+    def setUp(self):
+        """
+        Создаёт тестовые данные.
+        :param self: Объект класса
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username="owner", email="owner@example.com", password="password123")
+        self.client.force_authenticate(user=self.user)
+
+    def test_fingerprint(self):
+        """
+        Проверяет, что запросы, отличающиеся только значениями, получают одинаковый отпечаток.
+        :param self: Объект класса
+        """
+        first = fingerprint("SELECT * FROM users_user WHERE id IN (1, 2, 3) AND email = 'a@example.com' LIMIT 21")
+        second = fingerprint("SELECT *  FROM users_user WHERE id IN (%s, %s) AND email = %s LIMIT 5")
+        self.assertEqual(first, second)
+        self.assertEqual(first[0], "SELECT * FROM users_user WHERE id IN (?+) AND email = ? LIMIT ?")
+        self.assertNotEqual(first[1], fingerprint("SELECT * FROM users_payment WHERE id = 1")[1])
+
+    def test_view_origin(self):
+        """
+        Проверяет, что медленный запрос записывается с отпечатком и представлением, которое его выполнило.
+        :param self: Объект класса
+        """
+        with self.assertLogs("config.slow_queries", "WARNING") as logs:
+            self.client.get("/course/")
+        record = logs.records[0]
+        self.assertEqual(record.event, "slow_query")
+        self.assertEqual(record.origin, "CourseViewSet.list")
+        self.assertEqual(record.fingerprint, fingerprint(record.sql)[1])
+        self.assertIsNone(record.plan)  # План снимается только в PostgreSQL
+
+    def test_task_origin(self):
+        """
+        Проверяет, что запросы задачи Celery записываются с именем задачи.
+        :param self: Объект класса
+        """
+        set_task_query_origin(task=update_payment_rollup)
+        try:
+            with self.assertLogs("config.slow_queries", "WARNING") as logs:
+                User.objects.count()
+        finally:
+            reset_task_query_origin()
+        self.assertEqual(logs.records[0].origin, "task users.tasks.update_payment_rollup")
+
+    def test_explain_not_counted(self):
+        """
+        Проверяет, что запросы к БД проходят через одну обёртку, а EXPLAIN журнала медленных запросов не считается
+        запросом приложения (не попадает в метрики и бюджет запросов).
+        :param self: Объект класса
+        """
+        connection.ensure_connection()
+        self.assertEqual(connection.execute_wrappers, [query_observer])
+
+        def view(request):
+            User.objects.count()
+            explain(connection, "SELECT 1", [])  # В SQLite EXPLAIN (ANALYZE) - ошибка, она тоже не считается
+            return HttpResponse()
+
+        with self.assertLogs("config.performance", "INFO"):
+            response = PerformanceMiddleware(view)(RequestFactory().get("/"))
+        self.assertIn('desc="1 queries"', response.headers["Server-Timing"])
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "EXPLAIN ANALYZE снимается только в PostgreSQL")
+    @override_settings(SLOW_QUERY_EXPLAIN_RATE=1)
+    def test_explain_plan(self):
+        """
+        Проверяет, что для медленного SELECT снимается план EXPLAIN (ANALYZE, BUFFERS).
+        :param self: Объект класса
+        """
+        with self.assertLogs("config.slow_queries", "WARNING") as logs:
+            list(User.objects.filter(email__icontains="owner"))
+        self.assertIn("Buffers", logs.records[0].plan)
+
+
+@override_settings(TRAFFIC_CAPTURE_RATE=1)
+class TrafficCaptureTestCase(APITestCase):
+    """
+    Определяет тесты записи обезличенного трафика.
+    """
+
+    def setUp(self):
+        """
+        Создаёт тестовые данные.
+        :param self: Объект класса
+        """
+        self.user = User.objects.create_user(username="owner", email="owner@example.com", password="password123")
+        self.client.force_authenticate(user=self.user)
+
+    def test_capture(self):
+        """
+        Проверяет, что запрос записывается без персональных данных, а пользователь - псевдонимом.
+        :param self: Объект класса
+        """
+        body = {"email": "new@example.com", "phone": "+79990000000", "city": "Москва", "first_name": "Иван"}
+        with self.assertLogs("config.traffic", "INFO") as logs:
+            response = self.client.patch(f"/users/user/{self.user.pk}/?token=abc&fields=id", body, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        [record] = logs.records
+        self.assertEqual(record.event, "traffic")
+        self.assertEqual(record.path, f"/users/user/{self.user.pk}/")
+        self.assertEqual(record.query, {"token": MASK, "fields": ["id"]})
+        self.assertEqual(record.body, {"email": MASK, "phone": MASK, "city": MASK, "first_name": MASK})
+        self.assertEqual(record.user, get_pseudonym(self.user))
+        self.assertNotEqual(record.user, str(self.user.pk))
+        self.assertEqual(record.route, "UserViewSet.partial_update")
+        self.assertEqual(record.status, status.HTTP_200_OK)
+        self.assertNotIn("example.com", logs.output[0])
+
+    def test_search_masked(self):
+        """
+        Проверяет, что строка поиска (поиск оплат идёт и по почте пользователя) не записывается, а почта и телефон
+        скрываются по значению в любом поле.
+        :param self: Объект класса
+        """
+        with self.assertLogs("config.traffic", "INFO") as logs:
+            response = self.client.get("/users/payment/?search=ivan.petrov@mail.ru&ordering=-date")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(logs.records[0].query, {"search": MASK, "ordering": ["-date"]})
+        self.assertNotIn("ivan.petrov", logs.output[0])
+        data = {"comment": "пишите ivan.petrov@mail.ru", "contact": "+7 (999) 123-45-67", "date": "2024-01-01"}
+        self.assertEqual(sanitize(data), {"comment": MASK, "contact": MASK, "date": "2024-01-01"})
+
+    def test_skipped(self):
+        """
+        Проверяет, что тела не в JSON не записываются, а запросы вне выборки и к админке не попадают в лог.
+        :param self: Объект класса
+        """
+        with self.assertLogs("config.traffic", "INFO") as logs:
+            self.client.patch(f"/users/user/{self.user.pk}/", {"city": "Москва"})
+        self.assertEqual(logs.records[0].body, MASK)
+
+        with self.assertNoLogs("config.traffic"):
+            self.client.get("/admin/")
+            with self.settings(TRAFFIC_CAPTURE_RATE=0):
+                self.client.get("/course/")
+
+
+class MetricsTestCase(APITestCase):
+    """
+    Определяет тесты метрик Prometheus.
+    """
+
+    def setUp(self):
+        """
+        Создаёт тестовые данные.
+        :param self: Объект класса
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username="owner", email="owner@example.com", password="password123")
+        self.client.force_authenticate(user=self.user)
+        Course.objects.bulk_create(Course(name=f"Курс {number}", owner=self.user) for number in range(3))
+
+    def sample(self, name, **labels):
+        """
+        Возвращает текущее значение метрики.
+        :param name: Имя временного ряда
+        :param labels: Метки
+        :return: Значение (0, если ряда ещё нет)
+        """
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_request_metrics(self):
+        """
+        Проверяет метрики запроса: время ответа, код ответа и количество запросов к БД по маршруту.
+        :param self: Объект класса
+        """
+        labels = {"route": "CourseViewSet.list", "method": "GET"}
+        count = self.sample("http_request_duration_seconds_count", **labels)
+        responses = self.sample("http_responses_total", status="200", **labels)
+        queries = self.sample("http_request_db_queries_sum", **labels)
+
+        self.client.get("/course/")
+
+        self.assertEqual(self.sample("http_request_duration_seconds_count", **labels), count + 1)
+        self.assertEqual(self.sample("http_responses_total", status="200", **labels), responses + 1)
+        self.assertGreater(self.sample("http_request_db_queries_sum", **labels), queries)
+        self.assertEqual(self.sample("http_requests_in_progress"), 0)
+
+    def test_unmatched_route(self):
+        """
+        Проверяет, что запросы по неизвестным адресам объединяются в один маршрут.
+        :param self: Объект класса
+        """
+        labels = {"route": "unmatched", "method": "GET", "status": "404"}
+        before = self.sample("http_responses_total", **labels)
+        self.client.get("/missing/1/")
+        self.client.get("/missing/2/")
+        self.assertEqual(self.sample("http_responses_total", **labels), before + 2)
+
+    def test_metrics_endpoint(self):
+        """
+        Проверяет выдачу метрик в текстовом формате Prometheus.
+        :param self: Объект класса
+        """
+        self.client.get("/course/")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",route="CourseViewSet.list"}', response.content.decode()
+        )
+
+    def test_task_metrics(self):
+        """
+        Проверяет время выполнения и ожидания в очереди, ошибки и повторы задач Celery.
+        :param self: Объект класса
+        """
+        name = send_course_update_email.name
+        runtime = self.sample("celery_task_runtime_seconds_count", task=name)
+        wait = self.sample("celery_task_queue_wait_seconds_sum", task=name)
+        failures = self.sample("celery_task_failures_total", task=name)
+
+        send_course_update_email.apply(args=[1], headers={"published_at": time.time() - 5})
+        self.assertEqual(self.sample("celery_task_runtime_seconds_count", task=name), runtime + 1)
+        self.assertGreaterEqual(self.sample("celery_task_queue_wait_seconds_sum", task=name), wait + 5)
+
+        with mock.patch("materials.tasks.Course.objects.get", side_effect=RuntimeError):
+            send_course_update_email.apply(args=[1])
+        self.assertEqual(self.sample("celery_task_failures_total", task=name), failures + 1)
+
+        retries = self.sample("celery_task_retries_total", task=block_inactive_users.name)
+        count_task_retry(sender=block_inactive_users)
+        self.assertEqual(self.sample("celery_task_retries_total", task=block_inactive_users.name), retries + 1)
+
+
+def iter_routes(patterns, namespace=""):
+    """
+    Обходит маршруты URL-конфигурации.
+    :param patterns: Список маршрутов
+    :param namespace: Пространство имён маршрутов
+    :return: Генератор пар (имя маршрута с пространством имён, функция представления)
+    """
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            prefix = f"{namespace}{pattern.namespace}:" if pattern.namespace else namespace
+            yield from iter_routes(pattern.url_patterns, prefix)
+        elif pattern.name:
+            yield f"{namespace}{pattern.name}", pattern.callback
+
+
+def get_route_methods(callback):
+    """
+    Возвращает HTTP-методы, которые обрабатывает представление (без HEAD и OPTIONS).
+    :param callback: Функция представления
+    :return: Множество методов
+    """
+    if hasattr(callback, "actions"):
+        methods = set(callback.actions)
+    elif hasattr(callback, "view_class"):
+        methods = {method for method in callback.view_class.http_method_names if hasattr(callback.view_class, method)}
+    else:
+        methods = {"get"}
+    return {method.upper() for method in methods - {"head", "options"}}
+
+
+def group_queries(queries):
+    """
+    Группирует запросы к БД по отпечатку (см. config.slow_queries.fingerprint).
+    :param queries: Список SQL
+    :return: Словарь {нормализованный SQL: количество}
+    """
+    return Counter(fingerprint(sql)[0] for sql in queries)
+
+
+def format_queries(queries, baseline=()):
+    """
+    Формирует описание запросов к БД для сообщения об ошибке. Если задан baseline, выводятся только запросы, которых
+    стало больше.
+    :param queries: Список SQL
+    :param baseline: Список SQL для сравнения
+    :return: Строка с количеством и нормализованным SQL каждой группы
+    """
+    groups, expected = group_queries(queries), group_queries(baseline)
+    return "\n".join(
+        f"{count} (было {expected[sql]}): {sql[:300]}" if baseline else f"{count}: {sql[:300]}"
+        for sql, count in groups.items()
+        if not baseline or count > expected[sql]
+    )
+
+
+class QueryBudgetTestCase(APITestCase):
+    """
+    Определяет тесты бюджета запросов к БД для всех маршрутов config.urls.
+
+    Бюджет задаётся атрибутом query_budget представления (см. config.middleware), для сторонних представлений - в
+    EXTERNAL_BUDGETS. Каждый запрос выполняется на данных из одной строки и из LARGE строк: количество запросов к БД
+    должно совпадать (нет запросов на каждую строку) и не превышать бюджет. Исключение - каскадное удаление: Django
+    удаляет и обновляет связанные строки пачками по id (WHERE id IN (...)), поэтому для DELETE допускается рост
+    только таких запросов.
+    """
+
+    LARGE = 500
+    IGNORED_NAMESPACES = ("admin:",)  # Админка Django не входит в API
+
+    # Бюджеты представлений, которые не задают query_budget (сторонние и служебные)
+    EXTERNAL_BUDGETS = {
+        "materials:api-root": 1,
+        "users:api-root": 1,
+        "users:token_obtain_pair": 1,
+        "users:token_refresh": 1,
+        "schema-swagger-ui": 0,
+        "schema-redoc": 0,
+        "openapi-schema": 0,
+        "metrics": 0,
+    }
+
+    # Параметры запроса списков: на странице должно быть больше одной строки
+    QUERY_PARAMS = {"materials:course-list": {"page_size": 10}, "materials:lesson-list": {"page_size": 10}}
+
+    # Запросы: (маршрут, метод, параметры адреса, тело, пользователь)
+    ENDPOINTS = [
+        ("materials:api-root", "GET", None, None, "owner"),
+        ("materials:course-list", "GET", None, None, "owner"),
+        ("materials:course-list", "POST", None, lambda self: {"name": "Курс", "description": "Описание"}, "owner"),
+        ("materials:course-detail", "GET", lambda self: {"pk": self.course.pk}, None, "owner"),
+        (
+            "materials:course-detail",
+            "PUT",
+            lambda self: {"pk": self.course.pk},
+            lambda self: {"name": "Курс", "description": "Описание"},
+            "owner",
+        ),
+        ("materials:course-detail", "PATCH", lambda self: {"pk": self.course.pk}, lambda self: {"name": "-"}, "owner"),
+        ("materials:course-detail", "DELETE", lambda self: {"pk": self.course.pk}, None, "owner"),
+        (
+            "materials:lesson-create",
+            "POST",
+            None,
+            lambda self: {"name": "Урок", "description": "-", "course": self.course.pk, "owner": self.owner.pk},
+            "owner",
+        ),
+        ("materials:lesson-list", "GET", None, None, "owner"),
+        ("materials:lesson-detail", "GET", lambda self: {"pk": self.lesson.pk}, None, "owner"),
+        (
+            "materials:lesson-update",
+            "PUT",
+            lambda self: {"pk": self.lesson.pk},
+            lambda self: {"name": "Урок", "description": "-", "course": self.course.pk, "owner": self.owner.pk},
+            "owner",
+        ),
+        ("materials:lesson-update", "PATCH", lambda self: {"pk": self.lesson.pk}, lambda self: {"name": "-"}, "owner"),
+        ("materials:lesson-delete", "DELETE", lambda self: {"pk": self.lesson.pk}, None, "owner"),
+        ("materials:changes", "GET", None, None, "owner"),
+        ("users:api-root", "GET", None, None, "owner"),
+        ("users:token_obtain_pair", "POST", None, lambda self: {"email": "owner@example.com", "password": "1"}, None),
+        ("users:token_refresh", "POST", None, lambda self: {"email": "owner@example.com", "password": "1"}, None),
+        ("users:subscription", "POST", None, lambda self: {"course_id": self.course.pk}, "owner"),
+        ("users:subscription", "PUT", None, lambda self: {"course_id": self.course.pk}, "owner"),
+        ("users:subscription", "DELETE", None, lambda self: {"course_id": self.course.pk}, "owner"),
+        ("users:subscription-bulk", "POST", None, lambda self: {"course_ids": self.course_ids()}, "owner"),
+        ("users:payment-export", "GET", None, None, "owner"),
+        ("users:user-list", "GET", None, None, "owner"),
+        (
+            "users:user-list",
+            "POST",
+            None,
+            lambda self: {"username": "new", "email": "new@example.com", "password": "password123"},
+            "owner",
+        ),
+        ("users:user-detail", "GET", lambda self: {"pk": self.owner.pk}, None, "owner"),
+        (
+            "users:user-detail",
+            "PUT",
+            lambda self: {"pk": self.owner.pk},
+            lambda self: {"username": "owner", "email": "owner@example.com"},
+            "owner",
+        ),
+        ("users:user-detail", "PATCH", lambda self: {"pk": self.owner.pk}, lambda self: {"city": "Омск"}, "owner"),
+        ("users:user-detail", "DELETE", lambda self: {"pk": self.owner.pk}, None, "owner"),
+        ("users:payment-list", "GET", None, None, "owner"),
+        (
+            "users:payment-list",
+            "POST",
+            None,
+            lambda self: {
+                "user": self.owner.pk,
+                "amount": "1000.00",
+                "payment_method": "cash",
+                "course": self.course.pk,
+            },
+            "owner",
+        ),
+        ("users:payment-analytics", "GET", None, None, "admin"),
+        ("users:payment-detail", "GET", lambda self: {"pk": self.payment.pk}, None, "owner"),
+        (
+            "users:payment-detail",
+            "PUT",
+            lambda self: {"pk": self.payment.pk},
+            lambda self: {
+                "user": self.owner.pk,
+                "amount": "500.00",
+                "payment_method": "cash",
+                "course": self.course.pk,
+            },
+            "owner",
+        ),
+        (
+            "users:payment-detail",
+            "PATCH",
+            lambda self: {"pk": self.payment.pk},
+            lambda self: {"status": "paid"},
+            "owner",
+        ),
+        ("users:payment-detail", "DELETE", lambda self: {"pk": self.payment.pk}, None, "owner"),
+        ("users:payment-check-status", "GET", lambda self: {"pk": self.payment.pk}, None, "owner"),
+        ("schema-swagger-ui", "GET", None, None, None),
+        ("schema-redoc", "GET", None, None, None),
+        ("openapi-schema", "GET", None, None, None),
+        ("metrics", "GET", None, None, None),
+    ]
+
+    def setUp(self):
+        """
+        Создаёт данные из одной строки в каждой таблице.
+        :param self: Объект класса
+        """
+        self.owner = User.objects.create_user(username="owner", email="owner@example.com", password="1")
+        self.admin = User.objects.create_user(username="admin", email="admin@example.com", password="1", is_staff=True)
+        self.course = Course.objects.create(name="Курс", description="Описание", owner=self.owner)
+        self.lesson = Lesson.objects.create(name="Урок", course=self.course, owner=self.owner)
+        Subscription.objects.create(user=self.owner, course=self.course)
+        self.payment = Payment.objects.create(user=self.owner, course=self.course, amount=1000, session_id="cs_test")
+        stripe_response = mock.Mock(status_code=200, json=lambda: {"payment_status": "paid"})
+        for target, value in (
+            ("users.views.convert_rub_to_usd", 10.0),
+            ("users.views.create_price", mock.Mock(id="price_test")),
+            ("users.views.create_checkout_session", ("cs_test", "https://checkout.stripe.com/cs_test")),
+            ("users.views.requests.get", stripe_response),
+        ):
+            patcher = mock.patch(target, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def add_rows(self):
+        """
+        Добавляет по LARGE строк в таблицы, которые читают маршруты.
+        :param self: Объект класса
+        """
+        users = User.objects.bulk_create(
+            User(username=f"user_{number}", email=f"user_{number}@example.com") for number in range(self.LARGE)
+        )
+        courses = Course.objects.bulk_create(
+            Course(name=f"Курс {number}", owner=self.owner) for number in range(self.LARGE)
+        )
+        Lesson.objects.bulk_create(
+            Lesson(name=f"Урок {number}", course=self.course, owner=self.owner) for number in range(self.LARGE)
+        )
+        Subscription.objects.bulk_create(Subscription(user=self.owner, course=course) for course in courses)
+        Payment.objects.bulk_create(
+            Payment(user=self.owner, course=course, amount=1000, payment_method="transfer") for course in courses
+        )
+        Payment.objects.bulk_create(Payment(user=user, course=self.course, amount=500) for user in users)
+
+    def course_ids(self):
+        """
+        Возвращает id всех курсов владельца.
+        :param self: Объект класса
+        :return: Список id
+        """
+        return list(Course.objects.filter(owner=self.owner).values_list("id", flat=True))
+
+    def run_endpoint(self, endpoint):
+        """
+        Выполняет запрос и собирает выполненные запросы к БД. Изменения откатываются, кеш очищается.
+        :param endpoint: Описание запроса из ENDPOINTS
+        :return: Список SQL
+        """
+        name, method, kwargs, data, user = endpoint
+        url = reverse(name, kwargs=kwargs(self) if kwargs else None)
+        body = data(self) if data else None
+        self.client.credentials(
+            **({"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(getattr(self, user))}"} if user else {})
+        )
+        cache.clear()
+        queries = []
+
+        def collect(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with transaction.atomic(), connection.execute_wrapper(collect):
+            if body is None:
+                response = getattr(self.client, method.lower())(url, self.QUERY_PARAMS.get(name))
+            else:
+                response = self.client.generic(method, url, json.dumps(body), "application/json")
+            if hasattr(response, "streaming_content"):
+                b"".join(response.streaming_content)
+            transaction.set_rollback(True)
+        self.assertLess(
+            response.status_code, 400, f"{method} {name}: {response.status_code} {getattr(response, 'data', '')}"
+        )
+        return queries
+
+    def get_budget(self, name, method):
+        """
+        Возвращает бюджет запросов к БД маршрута.
+        :param name: Имя маршрута
+        :param method: HTTP-метод
+        :return: Бюджет или None, если он не задан
+        """
+        if name in self.EXTERNAL_BUDGETS:
+            return self.EXTERNAL_BUDGETS[name]
+        return get_view_query_budget(dict(iter_routes(get_resolver().url_patterns))[name], method)
+
+    def test_all_routes_covered(self):
+        """
+        Проверяет, что для каждого маршрута и метода config.urls есть запрос в ENDPOINTS и задан бюджет.
+        :param self: Объект класса
+        """
+        covered = {(name, method) for name, method, *_ in self.ENDPOINTS}
+        for name, callback in iter_routes(get_resolver().url_patterns):
+            if name.startswith(self.IGNORED_NAMESPACES):
+                continue
+            for method in get_route_methods(callback):
+                with self.subTest(route=name, method=method):
+                    self.assertIn((name, method), covered, "Нет запроса в ENDPOINTS")
+                    self.assertIsNotNone(self.get_budget(name, method), "Не задан query_budget")
+
+    def test_query_budgets(self):
+        """
+        Проверяет, что количество запросов к БД не зависит от количества строк и не превышает бюджет.
+        :param self: Объект класса
+        """
+        small = [self.run_endpoint(endpoint) for endpoint in self.ENDPOINTS]
+        self.add_rows()
+        for endpoint, small_queries in zip(self.ENDPOINTS, small):
+            name, method = endpoint[:2]
+            large_queries = self.run_endpoint(endpoint)
+            with self.subTest(route=name, method=method):
+                budget = self.get_budget(name, method)
+                self.assertIsNotNone(budget, "Не задан query_budget")
+                self.assertLessEqual(
+                    len(small_queries), budget, f"Превышен бюджет {budget}. Запросы:\n{format_queries(small_queries)}"
+                )
+                grown = group_queries(large_queries) - group_queries(small_queries)
+                if method == "DELETE":
+                    grown = {sql: count for sql, count in grown.items() if " IN (" not in sql}
+                if grown:
+                    self.fail(
+                        f"Количество запросов зависит от количества строк: {len(small_queries)} и "
+                        f"{len(large_queries)}. Запросы, которых стало больше:\n"
+                        f"{format_queries(large_queries, small_queries)}"
+                    )
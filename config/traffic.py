@@ -0,0 +1,184 @@
+"""
+Запись трафика для воспроизведения.
+
+TrafficCaptureMiddleware для доли запросов TRAFFIC_CAPTURE_RATE пишет в лог config.traffic (файл
+config/logs/traffic.log) обезличенное описание запроса: метод, путь, параметры, тело JSON-запроса, псевдоним
+пользователя, маршрут, код и время ответа. Скрипт benchmarks/replay.py воспроизводит такие записи (а также JSON-лог
+доступа nginx) на локальном стенде.
+
+Обезличивание: значения полей, имена которых содержат SENSITIVE_PARTS (пароли, токены, почта, телефон, ссылки и id
+сессий оплаты, имя и город пользователя, строка поиска), заменяются на MASK. Поиск идёт и по почте пользователя,
+поэтому имени поля недостаточно: строки, в которых есть адрес почты или номер телефона (SENSITIVE_VALUE_PATTERNS), тоже
+заменяются на MASK, в каком бы поле они ни были. Пользователь записывается как HMAC от его id с SECRET_KEY: по записи
+нельзя узнать, кто это, но запросы одного пользователя остаются связаны. Заголовки (в том числе Authorization), адрес
+клиента и тела ответов не записываются. Тела не в JSON и тела больше TRAFFIC_CAPTURE_MAX_BODY байт не записываются.
+Запросы к админке и адреса, не попавшие ни в одно представление, пропускаются.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import random
+import re
+from time import perf_counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from config.middleware import AsyncCapableMiddleware, get_view_name
+
+logger = logging.getLogger("config.traffic")
+
+MASK = "***"
+SENSITIVE_PARTS = (
+    "password",
+    "token",
+    "secret",
+    "email",
+    "phone",
+    "card",
+    "session",
+    "link",
+    "authorization",
+    "username",
+    "first_name",
+    "last_name",
+    "city",
+    "search",
+)
+SENSITIVE_VALUE_PATTERNS = (
+    re.compile(r"[^\s@]+@[^\s@]+\.\w+"),  # Адрес почты
+    re.compile(r"(?<![\w-])\+?(?:\d[\s()-]*){10,15}(?!\w)"),  # Номер телефона: 10-15 цифр (даты и id короче)
+)
+
+
+def is_sensitive(name):
+    """
+    Проверяет, что поле может содержать персональные данные или секреты.
+    :param name: Имя поля
+    :return: True, если значение нужно скрыть
+    """
+    name = name.lower()
+    return any(part in name for part in SENSITIVE_PARTS)
+
+
+def is_sensitive_value(value):
+    """
+    Проверяет, что значение похоже на адрес почты или номер телефона.
+    :param value: Значение поля
+    :return: True, если значение нужно скрыть
+    """
+    return isinstance(value, str) and any(pattern.search(value) for pattern in SENSITIVE_VALUE_PATTERNS)
+
+
+def sanitize(value):
+    """
+    Скрывает значения чувствительных полей во вложенных словарях и списках.
+    :param value: Данные запроса
+    :return: Копия данных со скрытыми значениями
+    """
+    if isinstance(value, dict):
+        return {key: MASK if is_sensitive(str(key)) else sanitize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [sanitize(item) for item in value]
+    return MASK if is_sensitive_value(value) else value
+
+
+def get_pseudonym(user):
+    """
+    Возвращает псевдоним пользователя: одинаковый для всех его запросов и не раскрывающий id без SECRET_KEY.
+    :param user: Пользователь
+    :return: Псевдоним или None для анонимного пользователя
+    """
+    if user is None or not user.is_authenticated:
+        return None
+    return hmac.new(settings.SECRET_KEY.encode(), str(user.pk).encode(), hashlib.sha256).hexdigest()[:16]
+
+
+def read_body(request):
+    """
+    Читает тело JSON-запроса до обработки представлением (после DRF поток тела уже прочитан).
+    :param request: Запрос
+    :return: Данные тела, MASK для тела, которое не записывается, или None, если тела нет
+    """
+    length = int(request.META.get("CONTENT_LENGTH") or 0)
+    if not length:
+        return None
+    if request.content_type != "application/json" or length > settings.TRAFFIC_CAPTURE_MAX_BODY:
+        return MASK
+    try:
+        return sanitize(json.loads(request.body))
+    except ValueError:
+        return MASK
+
+
+class TrafficCaptureMiddleware(AsyncCapableMiddleware):
+    """
+    Записывает обезличенное описание доли запросов TRAFFIC_CAPTURE_RATE (см. config.traffic).
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.should_capture(request):
+            return self.get_response(request)
+
+        body = read_body(request)
+        started = perf_counter()
+        response = self.get_response(request)
+        self.log(request, response, body, perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if not self.should_capture(request):
+            return await self.get_response(request)
+
+        body = read_body(request)  # Тело ASGI-запроса уже получено целиком, чтение не ждёт сети
+        started = perf_counter()
+        response = await self.get_response(request)
+        # Пользователь может быть ленивым и читаться из БД
+        await sync_to_async(self.log)(request, response, body, perf_counter() - started)
+        return response
+
+    @staticmethod
+    def should_capture(request):
+        """
+        Решает, записывать ли запрос.
+        :param request: Запрос
+        :return: True, если запрос попал в выборку и это не запрос к админке
+        """
+        return random.random() < settings.TRAFFIC_CAPTURE_RATE and not request.path.startswith("/admin/")
+
+    @staticmethod
+    def log(request, response, body, duration):
+        """
+        Записывает описание запроса в лог, если запрос попал в представление.
+        :param request: Запрос
+        :param response: Ответ
+        :param body: Тело запроса из read_body()
+        :param duration: Время обработки запроса, сек.
+        :return: None
+        """
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            return
+        user = getattr(request, "user", None)
+        logger.info(
+            "%s %s: %s",
+            request.method,
+            request.path,
+            response.status_code,
+            extra={
+                "event": "traffic",
+                "method": request.method,
+                "path": request.path,
+                "query": sanitize({key: request.GET.getlist(key) for key in request.GET}),
+                "body": body,
+                "user": get_pseudonym(user),
+                "staff": bool(user is not None and user.is_authenticated and user.is_staff),
+                "route": get_view_name(match.func, request.method),
+                "status": response.status_code,
+                "duration_ms": round(duration * 1000, 1),
+            },
+        )
@@ -5,22 +5,8 @@ URL configuration for config project.
 from django.contrib import admin
 from django.urls import path, include
 
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Snippets API",
-        default_version="v1",
-        description="Test description",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="contact@snippets.local"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
+from config.metrics import metrics_view
+from config.schema import schema_json_view, schema_view
 
 urlpatterns = [
     # -- URL for admin --
@@ -32,4 +18,7 @@ urlpatterns = [
     # -- URL for API documentation --
     path("swagger/", schema_view.with_ui("swagger", cache_timeout=0), name="schema-swagger-ui"),  # swagger
     path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),  # redoc
+    path("openapi.json", schema_json_view, name="openapi-schema"),  # схема для swagger и redoc (см. config.schema)
+    # -- URL for Prometheus metrics --
+    path("metrics", metrics_view, name="metrics"),
 ]
@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# Роль процесса определяет размер пула соединений с БД
+export DJANGO_PROCESS_ROLE=celery
+
 # Ожидаем, пока база будет доступна
 echo "Waiting for postgres..."
 
@@ -15,5 +18,11 @@ python manage.py migrate
 # Создаём директории логов и файлы логов (запускаем скрипт)
 source "$(dirname "$0")/entrypoint_prepare_logs.sh"
 
-# Запускаем Celery
+# Каталог метрик Prometheus в многопроцессном режиме (см. config.metrics) очищается при старте: файлы прошлого запуска
+# исказили бы счётчики
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Запускаем Celery (метрики - на порту CELERY_METRICS_PORT)
 celery -A config worker --loglevel=info
@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# Роль процесса определяет размер пула соединений с БД
+export DJANGO_PROCESS_ROLE=celery
+
 # Ожидаем, пока база будет доступна
 echo "Waiting for postgres..."
 
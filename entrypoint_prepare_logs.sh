@@ -1,5 +1,5 @@
 #!/bin/bash
 
-mkdir -p /app/materials/logs /app/users/logs
-touch /app/materials/logs/reports.log /app/users/logs/reports.log
-chown -R userdj:groupdjango /app/materials/logs /app/users/logs
+mkdir -p /app/materials/logs /app/users/logs /app/config/logs
+touch /app/materials/logs/reports.log /app/users/logs/reports.log /app/config/logs/reports.log /app/config/logs/traffic.log
+chown -R userdj:groupdjango /app/materials/logs /app/users/logs /app/config/logs
@@ -22,5 +22,17 @@ source "$(dirname "$0")/entrypoint_prepare_logs.sh"
 # Собираем статику
 python manage.py collectstatic --noinput
 
-# Запускаем Gunicorn
-exec gunicorn config.wsgi:application --bind 0.0.0.0:8000
+# Проверяем, что манифест статики и сжатые копии .gz и .br согласованы (см. config.storage)
+python manage.py check_static || exit 1
+
+# Строим схему OpenAPI один раз за запуск: nginx отдаёт её из файла (см. config.schema)
+python manage.py build_schema
+
+# Каталог метрик Prometheus в многопроцессном режиме (см. config.metrics) очищается при старте: файлы прошлого запуска
+# исказили бы счётчики
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Запускаем Gunicorn (приложение WSGI или ASGI, воркеры, потоки и таймауты - в gunicorn.conf.py)
+exec gunicorn -c gunicorn.conf.py
@@ -0,0 +1,100 @@
+"""
+Конфигурация gunicorn для web-контейнера.
+
+Значения по умолчанию рассчитаны на количество CPU и переопределяются переменными окружения GUNICORN_*.
+Воркеры gthread обслуживают несколько запросов одновременно, поэтому медленные вызовы внешних API (Stripe, ЦБ РФ)
+не блокируют весь воркер. При ASYNC_VIEWS=True запускается ASGI-приложение с воркерами uvicorn: создание оплаты и
+проверка её статуса выполняются асинхронно, и один воркер ждёт ответов Stripe и ЦБ РФ сразу для многих запросов
+(см. config.async_views).
+"""
+
+import multiprocessing
+import os
+
+async_views = os.getenv("ASYNC_VIEWS", "False") == "True"
+
+# Приложение (если не передано в командной строке)
+wsgi_app = "config.asgi:application" if async_views else "config.wsgi:application"
+
+# Адрес и сокет
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+backlog = int(os.getenv("GUNICORN_BACKLOG", 2048))
+
+# Воркеры: процессы для CPU, потоки внутри процесса - для ожидания БД и внешних API. Ожидание закрывают потоки,
+# поэтому процессов - по одному на CPU и один запасной, а не 2*CPU+1, как для sync-воркеров: лишние процессы только
+# отнимают друг у друга CPU (см. benchmarks/load_test.py)
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "uvicorn_worker.UvicornWorker" if async_views else "gthread")
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 4))  # Только для gthread
+
+# Приложение загружается в мастер-процессе до fork: воркеры стартуют быстрее и делят память с мастером
+preload_app = os.getenv("GUNICORN_PRELOAD", "True") == "True"
+
+# Перезапуск воркера после max_requests запросов (со случайным разбросом, чтобы воркеры не перезапускались
+# одновременно) ограничивает рост памяти
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+# Таймауты. keepalive должен быть больше keepalive_timeout в upstream nginx (60 с): соединение закрывает nginx, а не
+# gunicorn, и nginx не отправляет запрос в соединение, которое gunicorn уже закрыл
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 75))
+
+# Файл heartbeat воркеров в памяти: в Docker /tmp может находиться на медленном overlay-диске
+worker_tmp_dir = os.getenv("GUNICORN_WORKER_TMP_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else None)
+
+# Логи в stdout/stderr контейнера
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-") or None  # Пустое значение отключает журнал запросов
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+
+
+def close_db_connections():
+    """
+    Закрывает соединения с БД текущего процесса и пулы соединений psycopg.
+    :return: None
+    """
+    from django.db import connections
+
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+        if hasattr(connection, "close_pool"):  # Потоки пула psycopg не переживают fork
+            connection.close_pool()
+
+
+def pre_fork(server, worker):
+    """
+    Закрывает соединения с БД мастер-процесса перед fork, чтобы воркер не унаследовал их сокеты.
+    :param server: Мастер-процесс gunicorn
+    :param worker: Создаваемый воркер
+    :return: None
+    """
+    if server.cfg.preload_app:
+        close_db_connections()
+
+
+def post_fork(server, worker):
+    """
+    Сбрасывает соединения с БД, унаследованные воркером, - каждый воркер открывает свои.
+    :param server: Мастер-процесс gunicorn
+    :param worker: Созданный воркер
+    :return: None
+    """
+    if server.cfg.preload_app:
+        close_db_connections()
+    server.log.info("Воркер %s запущен", worker.pid)
+
+
+def child_exit(server, worker):
+    """
+    Помечает файлы метрик Prometheus завершившегося воркера: его значения больше не учитываются в метрике
+    выполняющихся запросов (см. config.metrics).
+    :param server: Мастер-процесс gunicorn
+    :param worker: Завершившийся воркер
+    :return: None
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,32 +1,77 @@
 from django.contrib import admin
+from django.db.models.functions import Substr
 
+from config.admin_mixins import AutocompleteFilter, LargeTableAdminMixin
 from materials.models import Course, Lesson
 
+DESCRIPTION_PREVIEW_LENGTH = 100  # Длина описания в списке, символов
+
+
+class DescriptionPreviewMixin:
+    """
+    Выводит в списке начало описания. Начало вырезается в SQL, полный текст описания в списке не читается.
+    """
+
+    list_defer = ("description",)
+
+    def get_queryset(self, request):
+        """
+        Добавляет к объектам начало описания (на символ длиннее выводимого, чтобы знать, что текст обрезан).
+        :param request: Запрос
+        :return: QuerySet
+        """
+        queryset = super().get_queryset(request)
+        return queryset.annotate(description_start=Substr("description", 1, DESCRIPTION_PREVIEW_LENGTH + 1))
+
+    @admin.display(description="Описание")
+    def description_preview(self, obj):
+        """
+        Возвращает начало описания.
+        :param obj: Объект
+        :return: Начало описания с многоточием, если описание длиннее
+        """
+        text = obj.description_start
+        return f"{text[:DESCRIPTION_PREVIEW_LENGTH]}…" if len(text) > DESCRIPTION_PREVIEW_LENGTH else text
+
 
 @admin.register(Course)
-class CourseAdmin(admin.ModelAdmin):
+class CourseAdmin(DescriptionPreviewMixin, LargeTableAdminMixin, admin.ModelAdmin):
     """
     Отображает поля модели Курсы в админке.
     """
 
     list_display = (
         "name",
-        "description",
+        "description_preview",
     )
-    list_filter = ("name",)
+    search_fields = ("name",)
+    autocomplete_fields = ("owner",)
     ordering = ("name",)
 
 
 @admin.register(Lesson)
-class LessonAdmin(admin.ModelAdmin):
+class LessonAdmin(DescriptionPreviewMixin, LargeTableAdminMixin, admin.ModelAdmin):
     """
     Отображает поля модели Уроки в админке.
     """
 
     list_display = (
         "name",
-        "description",
+        "description_preview",
         "course",
     )
-    list_filter = ("name", "course")
+    list_select_related = ("course",)
+    list_defer = ("description", "course__description")
+    list_filter = (("course", AutocompleteFilter),)
+    search_fields = ("name",)
+    autocomplete_fields = ("course", "owner")
     ordering = ("name",)
+
+    def get_queryset(self, request):
+        """
+        Читает курс вместе с уроком: название курса входит в строковое представление урока (в том числе в ответах
+        автодополнения оплат).
+        :param request: Запрос
+        :return: QuerySet
+        """
+        return super().get_queryset(request).select_related("course")
@@ -8,3 +8,6 @@ class MaterialsConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "materials"
+
+    def ready(self):
+        import materials.signals  # noqa
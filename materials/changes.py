@@ -0,0 +1,125 @@
+"""
+Лента изменений каталога (курсы и уроки) для инкрементальной синхронизации клиентов.
+
+Изменения упорядочены по ключу (время, тип источника, id): для курсов и уроков время берётся из updated_at, для
+удалённых объектов - из CatalogTombstone.deleted_at. Курсор - это последний отданный ключ, поэтому каждый запрос
+читает по индексам (updated_at, id) и (deleted_at, id) только изменения после курсора, а не весь каталог.
+"""
+
+import base64
+import heapq
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .models import CatalogTombstone, Course, Lesson
+from .serializers import CourseSyncSerializer, LessonSerializer
+
+# Источники изменений в порядке, который используется при равном времени изменения
+COURSE, LESSON, TOMBSTONE = range(3)
+END = TOMBSTONE + 1  # Курсор после всех источников для одного момента времени
+
+
+def encode_cursor(timestamp, kind, pk):
+    """
+    Кодирует позицию в ленте изменений в непрозрачную для клиента строку.
+    :param timestamp: Время изменения
+    :param kind: Номер источника изменений
+    :param pk: ID записи в источнике
+    :return: Курсор
+    """
+    payload = json.dumps([timestamp.isoformat(), kind, pk], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Декодирует курсор, полученный от клиента.
+    :param cursor: Курсор
+    :return: Кортеж (время изменения, номер источника, ID записи)
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, kind, pk = json.loads(raw)
+        timestamp = parse_datetime(timestamp)
+    except (ValueError, TypeError):
+        raise ValidationError({"since": "Некорректный курсор."})
+    if timestamp is None or not isinstance(kind, int) or not isinstance(pk, int):
+        raise ValidationError({"since": "Некорректный курсор."})
+    return timestamp, kind, pk
+
+
+def after_cursor(field, kind, cursor):
+    """
+    Строит условие "запись источника идёт в ленте после курсора".
+    :param field: Поле времени изменения в источнике
+    :param kind: Номер источника
+    :param cursor: Декодированный курсор или None
+    :return: Условие Q
+    """
+    if cursor is None:
+        return Q()
+    timestamp, cursor_kind, pk = cursor
+    if kind > cursor_kind:
+        return Q(**{f"{field}__gte": timestamp})
+    if kind < cursor_kind:
+        return Q(**{f"{field}__gt": timestamp})
+    return Q(**{f"{field}__gt": timestamp}) | Q(**{field: timestamp, "id__gt": pk})
+
+
+def get_changes(since=None, limit=None, request=None):
+    """
+    Возвращает страницу изменений каталога после курсора.
+    :param since: Курсор из предыдущего ответа или None для полной синхронизации
+    :param limit: Максимальное количество изменений
+    :param request: Запрос (для абсолютных ссылок на файлы)
+    :return: Словарь со списком изменений, курсором следующего запроса и признаком наличия ещё изменений
+    """
+    limit = limit or settings.CHANGE_FEED_PAGE_SIZE
+    cursor = decode_cursor(since) if since else None
+    # Недавние изменения откладываем: их транзакции ещё могут фиксироваться не в порядке времени изменения
+    until = timezone.now() - timedelta(seconds=settings.CHANGE_FEED_SETTLE_SECONDS)
+
+    sources = [
+        (COURSE, Course.objects.all(), "updated_at"),
+        (LESSON, Lesson.objects.all(), "updated_at"),
+        (TOMBSTONE, CatalogTombstone.objects.all(), "deleted_at"),
+    ]
+    streams = []
+    for kind, queryset, field in sources:
+        # Из каждого источника берём не больше limit + 1 записей - этого достаточно для слияния
+        rows = queryset.filter(after_cursor(field, kind, cursor), **{f"{field}__lte": until}).order_by(field, "id")
+        streams.append([(getattr(obj, field), kind, obj.pk, obj) for obj in rows[: limit + 1]])
+
+    page = list(heapq.merge(*streams, key=lambda row: row[:3]))[: limit + 1]
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    if has_more:
+        timestamp, kind, pk, _ = page[-1]
+        next_cursor = encode_cursor(timestamp, kind, pk)
+    else:
+        # Все изменения до until уже отданы - следующий запрос начнётся сразу после until
+        next_cursor = encode_cursor(until, END, 0)
+
+    context = {"request": request}
+    courses = [row[3] for row in page if row[1] == COURSE]
+    lessons = [row[3] for row in page if row[1] == LESSON]
+    data = {(COURSE, item["id"]): item for item in CourseSyncSerializer(courses, many=True, context=context).data}
+    data.update({(LESSON, item["id"]): item for item in LessonSerializer(lessons, many=True, context=context).data})
+
+    changes = []
+    for timestamp, kind, pk, obj in page:
+        if kind == TOMBSTONE:
+            changes.append({"type": obj.object_type, "op": "delete", "id": obj.object_id, "at": timestamp})
+        else:
+            object_type = (
+                CatalogTombstone.ObjectTypes.COURSE if kind == COURSE else CatalogTombstone.ObjectTypes.LESSON
+            )
+            changes.append({"type": object_type, "op": "upsert", "id": pk, "data": data[(kind, pk)]})
+    return {"changes": changes, "cursor": next_cursor, "has_more": has_more}
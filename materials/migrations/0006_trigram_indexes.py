@@ -0,0 +1,23 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+from config.operations import CreateTrigramIndex
+
+
+class Migration(migrations.Migration):
+    """
+    Создаёт триграммные индексы для поиска по названиям курсов и уроков (search_fields PaymentViewSet).
+    Индексы строятся конкурентно, поэтому миграция не атомарна.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ("materials", "0005_rename_last_updated_course_updated_at"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        CreateTrigramIndex(model_name="course", field_name="name", name="materials_course_name_trgm"),
+        CreateTrigramIndex(model_name="lesson", field_name="name", name="materials_lesson_name_trgm"),
+    ]
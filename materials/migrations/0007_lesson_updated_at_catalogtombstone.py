@@ -0,0 +1,51 @@
+from django.db import migrations, models
+
+from config.operations import AddIndexConcurrentlyIfSupported
+
+
+class Migration(migrations.Migration):
+    """
+    Добавляет время изменения урока, индексы (updated_at, id) для ленты изменений каталога и таблицу удалённых
+    объектов. Индексы на существующих таблицах строятся конкурентно, поэтому миграция не атомарна.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ("materials", "0006_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lesson",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Последнее обновление"),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name="course",
+            index=models.Index(fields=["updated_at", "id"], name="materials_course_updated_idx"),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name="lesson",
+            index=models.Index(fields=["updated_at", "id"], name="materials_lesson_updated_idx"),
+        ),
+        migrations.CreateModel(
+            name="CatalogTombstone",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "object_type",
+                    models.CharField(
+                        choices=[("course", "Курс"), ("lesson", "Урок")], max_length=10, verbose_name="Тип объекта"
+                    ),
+                ),
+                ("object_id", models.PositiveBigIntegerField(verbose_name="ID объекта")),
+                ("deleted_at", models.DateTimeField(auto_now_add=True, verbose_name="Время удаления")),
+            ],
+            options={
+                "verbose_name": "Удалённый объект каталога",
+                "verbose_name_plural": "Удалённые объекты каталога",
+                "indexes": [models.Index(fields=["deleted_at", "id"], name="materials_tombstone_del_idx")],
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import connections, models, router
+from django.utils import timezone
 
 
 class Course(models.Model):
@@ -8,7 +9,8 @@ class Course(models.Model):
         name (str): Название курса,
         description (str): Описание курса,
         image (ImageField): Превью курса,
-        owner (User): Владелец курса.
+        owner (User): Владелец курса,
+        updated_at (DateTimeField): Последнее обновление.
     """
 
     name = models.CharField(max_length=255, verbose_name="Название курса")
@@ -31,10 +33,11 @@ class Course(models.Model):
         return self.name
 
     class Meta:
-        """Определяет отображение имени модели в админке."""
+        """Определяет отображение имени модели в админке и индекс для ленты изменений."""
 
         verbose_name = "Курс"
         verbose_name_plural = "Курсы"
+        indexes = [models.Index(fields=["updated_at", "id"], name="materials_course_updated_idx")]
 
 
 class Lesson(models.Model):
@@ -46,7 +49,8 @@ class Lesson(models.Model):
         course (Course): Курс,
         image (ImageField): Превью урока,
         video (FileField): Видео урока,
-        owner (User): Владелец урока
+        owner (User): Владелец урока,
+        updated_at (DateTimeField): Последнее обновление
     """
 
     name = models.CharField(max_length=255, verbose_name="Название урока")
@@ -61,6 +65,7 @@ class Lesson(models.Model):
         null=True,
         verbose_name="Владелец урока",
     )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Последнее обновление")
 
     def __str__(self):
         """
@@ -77,3 +82,68 @@ class Lesson(models.Model):
 
         verbose_name = "Урок"
         verbose_name_plural = "Уроки"
+        indexes = [models.Index(fields=["updated_at", "id"], name="materials_lesson_updated_idx")]
+
+
+class CatalogTombstoneManager(models.Manager):
+    """
+    Определяет менеджера записей об удалении. Записи об объектах, удаляемых каскадом, создаются одним запросом
+    INSERT ... SELECT, поэтому число запросов не зависит от количества удаляемых объектов.
+    """
+
+    def create_for(self, object_type, queryset):
+        """
+        Создаёт записи об удалении всех объектов queryset одним запросом.
+        :param object_type: Тип объектов (CatalogTombstone.ObjectTypes)
+        :param queryset: Удаляемые объекты
+        :return: None
+        """
+        connection = connections[router.db_for_write(self.model)]
+        quote = connection.ops.quote_name
+        opts = self.model._meta
+        columns = ", ".join(quote(opts.get_field(name).column) for name in ("object_type", "object_id", "deleted_at"))
+        select, params = queryset.values(deleted_id=models.F("pk")).query.get_compiler(connection=connection).as_sql()
+        sql = (
+            f"INSERT INTO {quote(opts.db_table)} ({columns}) "
+            f"SELECT %s, deleted.deleted_id, %s FROM ({select}) deleted"
+        )
+        deleted_at = connection.ops.adapt_datetimefield_value(timezone.now())
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [object_type, deleted_at, *params])
+
+
+class CatalogTombstone(models.Model):
+    """
+    Определяет запись об удалённом курсе или уроке для ленты изменений каталога.
+    Attributes:
+        object_type (str): Тип удалённого объекта,
+        object_id (int): ID удалённого объекта,
+        deleted_at (DateTimeField): Время удаления
+    """
+
+    class ObjectTypes(models.TextChoices):
+        COURSE = "course", "Курс"
+        LESSON = "lesson", "Урок"
+
+    object_type = models.CharField(max_length=10, choices=ObjectTypes.choices, verbose_name="Тип объекта")
+    object_id = models.PositiveBigIntegerField(verbose_name="ID объекта")
+    deleted_at = models.DateTimeField(auto_now_add=True, verbose_name="Время удаления")
+
+    objects = CatalogTombstoneManager()
+
+    def __str__(self):
+        """
+        Определяет отображение записи об удалении в админке.
+        :return: Тип и ID удалённого объекта
+        """
+        return f"{self.object_type} {self.object_id}"
+
+    class Meta:
+        """
+        Управляет поведением модели.
+        Определяет имя модели в админке и индекс для ленты изменений.
+        """
+
+        verbose_name = "Удалённый объект каталога"
+        verbose_name_plural = "Удалённые объекты каталога"
+        indexes = [models.Index(fields=["deleted_at", "id"], name="materials_tombstone_del_idx")]
@@ -1,7 +1,159 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, Paginator, PageNotAnInteger
+from django.db import connections
+from django.utils.functional import cached_property
 from rest_framework.pagination import PageNumberPagination
 
 
-class CoursePagination(PageNumberPagination):
+def get_estimated_count(queryset):
+    """
+    Возвращает оценку количества строк таблицы из статистики планировщика PostgreSQL (pg_class.reltuples).
+    :param queryset: QuerySet модели
+    :return: Оценка количества строк или None, если оценка недоступна (другая СУБД, таблица ещё не анализировалась)
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)", [queryset.model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:  # -1 - таблица ещё не анализировалась
+        return None
+    return row[0]
+
+
+def is_unfiltered(queryset):
+    """
+    Проверяет, что queryset выбирает все строки таблицы (без фильтров, DISTINCT, группировки и срезов).
+    :param queryset: QuerySet
+    :return: True, если количество строк queryset совпадает с количеством строк таблицы
+    """
+    query = queryset.query
+    return not query.where and not query.distinct and query.group_by is None and not query.is_sliced
+
+
+class EstimatedPage(Page):
+    """
+    Страница пагинатора с оценочным количеством объектов: наличие следующей страницы определяется по лишней строке,
+    прочитанной вместе со страницей, а не по количеству страниц.
+    """
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        """
+        Проверяет наличие следующей страницы.
+        :return: True, если следующая страница есть
+        """
+        return self._has_next
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор, который не считает точное количество строк больших таблиц на каждый запрос.
+
+    Для queryset без фильтров, если статистика планировщика оценивает таблицу не меньше чем в estimate_threshold
+    строк, возвращается оценка из pg_class.reltuples. Точное количество для остальных запросов от этого порога
+    кешируется на cache_ttl секунд. Номер страницы при оценочном количестве не ограничивается сверху.
+    """
+
+    estimate_threshold = None
+    cache_ttl = None
+
+    count_is_estimated = False
+
+    @cached_property
+    def count(self):
+        """
+        Возвращает оценочное или точное (возможно, из кеша) количество объектов.
+        :return: Количество объектов
+        """
+        queryset = self.object_list
+        threshold = self.estimate_threshold
+        if threshold is None:
+            threshold = settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD
+        if not hasattr(queryset, "query"):
+            return super().count
+
+        if is_unfiltered(queryset):
+            estimate = get_estimated_count(queryset)
+            if estimate is not None and estimate >= threshold:
+                self.count_is_estimated = True
+                return estimate
+
+        # Ключ - по запросу без сортировки и невыбранных аннотаций (например, подписки пользователя): они не меняют
+        # количество, и пользователи с одинаковыми фильтрами получают одно закешированное значение
+        sql, params = queryset.order_by().values("pk").query.sql_with_params()
+        digest = hashlib.sha256(f"{queryset.db}:{sql}:{params}".encode()).hexdigest()
+        cache_key = f"pagination:count:{digest}"
+        count = cache.get(cache_key)
+        if count is None:
+            count = super().count
+            if count >= threshold:  # Небольшие количества считаются быстро и всегда точно
+                ttl = self.cache_ttl if self.cache_ttl is not None else settings.PAGINATION_COUNT_CACHE_TTL
+                cache.set(cache_key, count, ttl)
+        return count
+
+    def validate_number(self, number):
+        """
+        Проверяет номер страницы. При оценочном количестве номер не ограничивается количеством страниц.
+        :param number: Номер страницы
+        :return: Номер страницы
+        """
+        if not self.count_is_estimated:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages["invalid_page"])
+        if number < 1:
+            raise EmptyPage(self.error_messages["min_page"])
+        return number
+
+    def page(self, number):
+        """
+        Возвращает страницу. При оценочном количестве читает на одну строку больше, чтобы определить наличие
+        следующей страницы.
+        :param number: Номер страницы
+        :return: Страница
+        """
+        if not self.count or not self.count_is_estimated:  # count вычисляется первым и определяет признак оценки
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom : bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(self.error_messages["no_results"])
+        return EstimatedPage(rows[: self.per_page], number, self, has_next=len(rows) > self.per_page)
+
+
+class EstimatedCountPagination(PageNumberPagination):
+    """
+    Определяет пагинацию с оценочным количеством объектов для больших таблиц (см. EstimatedCountPaginator).
+    В ответе поле count_is_estimated показывает, что count - оценка, а не точное значение.
+    """
+
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        """
+        Добавляет в ответ признак оценочного количества объектов.
+        :param data: Данные страницы
+        :return: Ответ
+        """
+        response = super().get_paginated_response(data)
+        response.data["count_is_estimated"] = self.page.paginator.count_is_estimated
+        return response
+
+
+class CoursePagination(EstimatedCountPagination):
     """
     Определяет пагинацию для представления курсов.
     """
@@ -11,7 +163,7 @@ class CoursePagination(PageNumberPagination):
     max_page_size = 10  # Максимальное количество элементов на одной странице
 
 
-class LessonPagination(PageNumberPagination):
+class LessonPagination(EstimatedCountPagination):
     """
     Определяет пагинацию для представления уроков.
     """
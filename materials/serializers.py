@@ -3,12 +3,14 @@ from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from config.middleware import TimedSerializerMixin
+from config.mixins import SparseFieldsSerializerMixin
 from users.models import Subscription
 from .models import Course, Lesson
 from .validators import DescriptionValidator
 
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(TimedSerializerMixin, SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """
     Определяет сериализатор для модели Урок.
     """
@@ -24,7 +26,7 @@ class LessonSerializer(serializers.ModelSerializer):
         validators = [DescriptionValidator(field="description")]
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(TimedSerializerMixin, SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """
     Определяет сериализатор для модели Курс.
     """
@@ -35,18 +37,22 @@ class CourseSerializer(serializers.ModelSerializer):
     @staticmethod
     def get_lessons_count(obj):
         """
-        Получает количество уроков в курсе.
+        Получает количество уроков в курсе (из аннотации списка курсов, если она есть).
         :param obj: Объект курса
         :return: Количество уроков
         """
+        if hasattr(obj, "lessons_count"):
+            return obj.lessons_count
         return obj.lessons.count()
 
     def get_is_subscribed(self, obj):
         """
-        Определяет, подписан ли текущий пользователь на курс.
+        Определяет, подписан ли текущий пользователь на курс (из аннотации списка курсов, если она есть).
         :param obj: Объект курса
         :return: True, если пользователь подписан, иначе False
         """
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
         user = self.context.get("request").user
         if user.is_authenticated:
             return Subscription.objects.filter(user=user, course=obj).exists()
@@ -70,7 +76,22 @@ class CourseSerializer(serializers.ModelSerializer):
         validators = [DescriptionValidator(field="description")]
 
 
-class CourseDetailSerializer(serializers.ModelSerializer):
+class CourseSyncSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    Определяет сериализатор курса для ленты изменений каталога (без вычисляемых полей, требующих запросов к БД).
+    """
+
+    class Meta:
+        """
+        Управляет поведением сериализатора курса.
+        Задаёт поля модели.
+        """
+
+        model = Course
+        fields = ["id", "name", "description", "image", "owner", "updated_at"]
+
+
+class CourseDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Определяет сериализатор для детализации модели Курс.
     """
@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q, QuerySet
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from .models import CatalogTombstone, Course, Lesson
+
+
+def get_origin_model(origin):
+    """
+    Возвращает модель объекта, с которого началось удаление.
+    :param origin: Объект или QuerySet, у которого вызван delete()
+    :return: Модель
+    """
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def create_owner_tombstones(sender, instance, origin=None, **kwargs):
+    """
+    Сохраняет записи об удалении курсов и уроков пользователя, которые удаляются вместе с ним. Записи создаются
+    одним запросом на тип объектов, а не по одному на каждый объект (см. create_course_tombstone).
+    :param sender: Модель пользователя
+    :param instance: Удаляемый пользователь
+    :param origin: Объект или QuerySet, у которого вызван delete()
+    :param kwargs: Список именованных аргументов
+    :return: None
+    """
+    if get_origin_model(origin) is not sender:
+        return
+    CatalogTombstone.objects.create_for(CatalogTombstone.ObjectTypes.COURSE, Course.objects.filter(owner=instance))
+    CatalogTombstone.objects.create_for(
+        CatalogTombstone.ObjectTypes.LESSON, Lesson.objects.filter(Q(owner=instance) | Q(course__owner=instance))
+    )
+
+
+@receiver(pre_delete, sender=Course)
+def create_course_lessons_tombstones(sender, instance, origin=None, **kwargs):
+    """
+    Сохраняет записи об удалении уроков курса одним запросом.
+    :param sender: Модель курса
+    :param instance: Удаляемый курс
+    :param origin: Объект или QuerySet, у которого вызван delete()
+    :param kwargs: Список именованных аргументов
+    :return: None
+    """
+    if get_origin_model(origin) is Course:
+        CatalogTombstone.objects.create_for(
+            CatalogTombstone.ObjectTypes.LESSON, Lesson.objects.filter(course=instance)
+        )
+
+
+@receiver(post_delete, sender=Course)
+def create_course_tombstone(sender, instance, origin=None, **kwargs):
+    """
+    Сохраняет запись об удалении курса для ленты изменений каталога. Курсы, удалённые вместе с владельцем, уже
+    записаны в create_owner_tombstones.
+    :param sender: Модель курса
+    :param instance: Удалённый курс
+    :param origin: Объект или QuerySet, у которого вызван delete()
+    :param kwargs: Список именованных аргументов
+    :return: None
+    """
+    if get_origin_model(origin) is not get_user_model():
+        CatalogTombstone.objects.create(object_type=CatalogTombstone.ObjectTypes.COURSE, object_id=instance.pk)
+
+
+@receiver(post_delete, sender=Lesson)
+def create_lesson_tombstone(sender, instance, origin=None, **kwargs):
+    """
+    Сохраняет запись об удалении урока для ленты изменений каталога. Уроки, удалённые вместе с курсом или
+    владельцем, уже записаны в create_course_lessons_tombstones и create_owner_tombstones.
+    :param sender: Модель урока
+    :param instance: Удалённый урок
+    :param origin: Объект или QuerySet, у которого вызван delete()
+    :param kwargs: Список именованных аргументов
+    :return: None
+    """
+    if get_origin_model(origin) not in (Course, get_user_model()):
+        CatalogTombstone.objects.create(object_type=CatalogTombstone.ObjectTypes.LESSON, object_id=instance.pk)
@@ -47,4 +47,4 @@ def send_course_update_email(course_id):
                 recipient_list=[sub.user.email],
                 fail_silently=True,
             )
-            logger.info("Письмо отправлено пользователю %s" % sub.user)
+            logger.info("Письмо отправлено пользователю %s", sub.user)
@@ -1,7 +1,13 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
-from rest_framework.test import APITestCase
-from materials.models import Lesson, Course
-from users.models import User
+from rest_framework.test import APITestCase, APITransactionTestCase
+from materials.models import CatalogTombstone, Lesson, Course
+from users.models import Subscription, User
 
 
 # Можно импортировать пользователя из users.models или получить через
@@ -252,3 +258,550 @@ class CourseViewSetTestCase(APITestCase):
         self.client.force_authenticate(user=self.moderator)
         response = self.client.delete(self.course_url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+# -- Тестирование ленты изменений каталога --
+@override_settings(CHANGE_FEED_SETTLE_SECONDS=0, CHANGE_FEED_PAGE_SIZE=2)
+class ChangeFeedAPIViewTestCase(APITestCase):
+    """
+    Тестирует инкрементальную синхронизацию курсов и уроков.
+    """
+
+    def setUp(self):
+        """
+        Создаёт пользователя и каталог.
+        :return: None
+        """
+        self.user = User.objects.create_user(username="user", email="user@example.com", password="testpass")
+        self.course = Course.objects.create(name="Course", description="Description", owner=self.user)
+        self.lessons = [
+            Lesson.objects.create(name=f"Lesson {i}", description="Description", course=self.course, owner=self.user)
+            for i in range(3)
+        ]
+        self.url = "/changes/"
+        self.client.force_authenticate(user=self.user)
+
+    def sync(self, cursor=None):
+        """
+        Читает ленту изменений до конца, начиная с курсора.
+        :param cursor: Курсор или None для полной синхронизации
+        :return: Список изменений и курсор для следующей синхронизации
+        """
+        changes = []
+        while True:
+            params = {"since": cursor} if cursor else {}
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["changes"]), 2)
+            changes.extend(response.data["changes"])
+            cursor = response.data["cursor"]
+            if not response.data["has_more"]:
+                return changes, cursor
+
+    def test_initial_sync(self):
+        """
+        Проверяет, что полная синхронизация постранично отдаёт каждый объект каталога ровно один раз.
+        :return: None
+        """
+        changes, _ = self.sync()
+        keys = [(change["type"], change["id"]) for change in changes]
+        expected = [("course", self.course.id)] + [("lesson", lesson.id) for lesson in self.lessons]
+        self.assertCountEqual(keys, expected)
+        self.assertTrue(all(change["op"] == "upsert" for change in changes))
+
+    def test_incremental_sync(self):
+        """
+        Проверяет, что после курсора отдаются только изменённые и удалённые объекты.
+        :return: None
+        """
+        _, cursor = self.sync()
+
+        self.lessons[0].name = "Renamed"
+        self.lessons[0].save()
+        lesson_id = self.lessons[1].id
+        self.lessons[1].delete()
+
+        changes, cursor = self.sync(cursor)
+        self.assertEqual(
+            [(change["type"], change["op"], change["id"]) for change in changes],
+            [("lesson", "upsert", self.lessons[0].id), ("lesson", "delete", lesson_id)],
+        )
+        self.assertEqual(changes[0]["data"]["name"], "Renamed")
+
+        changes, _ = self.sync(cursor)
+        self.assertEqual(changes, [])
+
+    def test_course_delete_creates_tombstones(self):
+        """
+        Проверяет, что удаление курса попадает в ленту вместе с удалением его уроков.
+        :return: None
+        """
+        _, cursor = self.sync()
+        course_id = self.course.id
+        self.course.delete()
+
+        changes, _ = self.sync(cursor)
+        self.assertEqual(CatalogTombstone.objects.count(), 4)
+        self.assertCountEqual(
+            [(change["type"], change["id"]) for change in changes],
+            [("course", course_id)] + [("lesson", lesson.id) for lesson in self.lessons],
+        )
+        self.assertTrue(all(change["op"] == "delete" for change in changes))
+
+    def test_invalid_cursor(self):
+        """
+        Проверяет, что некорректный курсор отклоняется.
+        :return: None
+        """
+        response = self.client.get(self.url, {"since": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+# -- Тестирование однократной загрузки объекта за запрос --
+class ObjectMemoizationTestCase(APITestCase):
+    """
+    Проверяет, что курс или урок загружается из БД один раз за запрос, а права доступа не делают лишних запросов.
+    """
+
+    def setUp(self):
+        """
+        Создаёт владельца, модератора, курс и урок.
+        :return: None
+        """
+        from django.contrib.auth.models import Group
+
+        self.owner = User.objects.create_user(username="owner", email="owner@example.com", password="testpass")
+        self.moderator = User.objects.create_user(
+            username="moderator", email="moderator@example.com", password="testpass"
+        )
+        Group.objects.get_or_create(name="Модераторы")[0].user_set.add(self.moderator)
+        self.course = Course.objects.create(name="Course", description="Description", owner=self.owner)
+        self.lesson = Lesson.objects.create(
+            name="Lesson", description="Description", course=self.course, owner=self.owner
+        )
+
+    def test_retrieve_course_owner(self):
+        """
+        Проверяет запросы при просмотре курса владельцем: курс, количество уроков и уроки.
+        :return: None
+        """
+        self.client.force_authenticate(user=self.owner)
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/course/{self.course.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_retrieve_course_moderator(self):
+        """
+        Проверяет, что принадлежность к модераторам проверяется одним запросом.
+        :return: None
+        """
+        self.client.force_authenticate(user=self.moderator)
+        with self.assertNumQueries(4):
+            response = self.client.get(f"/course/{self.course.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_update_course_owner(self):
+        """
+        Проверяет запросы при обновлении курса: курс, UPDATE, количество уроков и подписка.
+        :return: None
+        """
+        self.client.force_authenticate(user=self.owner)
+        with self.assertNumQueries(4):
+            response = self.client.put(
+                f"/course/{self.course.id}/", {"name": "Updated", "description": "Updated Description"}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_retrieve_lesson(self):
+        """
+        Проверяет, что урок загружается одним запросом.
+        :return: None
+        """
+        self.client.force_authenticate(user=self.owner)
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/lesson/list/{self.lesson.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_get_object_memoized(self):
+        """
+        Проверяет, что повторный вызов get_object() возвращает тот же объект без запроса к БД.
+        :return: None
+        """
+        from rest_framework.test import APIRequestFactory, force_authenticate
+
+        from materials.views import LessonRetrieveAPIView
+
+        request = APIRequestFactory().get(f"/lesson/list/{self.lesson.id}/")
+        force_authenticate(request, user=self.owner)
+        view = LessonRetrieveAPIView()
+        view.setup(request, pk=self.lesson.id)
+        view.request = view.initialize_request(request)
+        view.format_kwarg = None
+        lesson = view.get_object()
+        with self.assertNumQueries(0):
+            self.assertIs(view.get_object(), lesson)
+
+
+# -- Тестирование выборочных полей и получения нескольких объектов по ID --
+class SparseFieldsTestCase(APITestCase):
+    """
+    Тестирует параметры ?fields=, ?omit= и ?ids= в списках курсов и уроков.
+    """
+
+    def setUp(self):
+        """
+        Создаёт пользователя, курсы и уроки.
+        :return: None
+        """
+        self.user = User.objects.create_user(username="user", email="user@example.com", password="testpass")
+        self.courses = [
+            Course.objects.create(name=f"Course {i}", description="Description", owner=self.user) for i in range(3)
+        ]
+        self.lessons = [
+            Lesson.objects.create(name=f"Lesson {i}", description="Description", course=course, owner=self.user)
+            for i, course in enumerate(self.courses)
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    def test_course_fields(self):
+        """
+        Проверяет, что возвращаются только запрошенные поля, а методы сериализатора не вызываются.
+        :return: None
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/course/", {"fields": "id,name"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data["results"][0]), ["id", "name"])
+        select = next(query["sql"] for query in queries if "LIMIT" in query["sql"])
+        self.assertNotIn("description", select)
+        self.assertNotIn("materials_lesson", select)  # Без подзапросов lessons_count и is_subscribed
+        self.assertNotIn("users_subscription", select)
+        self.assertEqual(len(queries), 2)  # Количество курсов и страница курсов
+
+    def test_course_omit_annotation(self):
+        """
+        Проверяет, что подзапрос исключённого поля не выполняется, а остальные поля вычисляются аннотацией.
+        :return: None
+        """
+        Subscription.objects.create(user=self.user, course=self.courses[0])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/course/", {"omit": "lessons_count"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("lessons_count", response.data["results"][0])
+        self.assertTrue(response.data["results"][0]["is_subscribed"])
+        select = next(query["sql"] for query in queries if "LIMIT" in query["sql"])
+        self.assertNotIn("materials_lesson", select)
+        self.assertEqual(len(queries), 2)
+
+    def test_lesson_omit(self):
+        """
+        Проверяет исключение полей из списка уроков.
+        :return: None
+        """
+        response = self.client.get("/lesson/list/", {"omit": "description,image,video"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        item = response.data["results"][0]
+        self.assertNotIn("description", item)
+        self.assertNotIn("video", item)
+        self.assertIn("name", item)
+
+    def test_unknown_field(self):
+        """
+        Проверяет, что неизвестное поле отклоняется.
+        :return: None
+        """
+        response = self.client.get("/course/", {"fields": "id,secret"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_multi_get(self):
+        """
+        Проверяет получение нескольких курсов по ID одним запросом без пагинации.
+        :return: None
+        """
+        ids = [self.courses[0].id, self.courses[2].id]
+        response = self.client.get("/course/", {"ids": ",".join(map(str, ids)), "fields": "id"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{"id": ids[0]}, {"id": ids[1]}])
+
+    def test_multi_get_invalid(self):
+        """
+        Проверяет отклонение некорректного списка ID.
+        :return: None
+        """
+        response = self.client.get("/lesson/list/", {"ids": "1,abc"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_fields_ignored_for_write(self):
+        """
+        Проверяет, что параметр fields не влияет на создание урока.
+        :return: None
+        """
+        response = self.client.post(
+            "/lesson/create/?fields=id",
+            {"name": "New Lesson", "description": "New Description", "course": self.courses[0].id},
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn("description", response.data)
+
+
+# -- Тестирование быстрого пути чтения списков --
+class FastReadPathTestCase(APITestCase):
+    """
+    Проверяет, что быстрый путь чтения (values_list и orjson) отдаёт побайтно тот же ответ, что и обычный.
+    """
+
+    def setUp(self):
+        """
+        Создаёт пользователя, курсы с уроками, файлами и подпиской.
+        :return: None
+        """
+        self.user = User.objects.create_user(username="user", email="user@example.com", password="testpass")
+        for i in range(3):
+            course = Course.objects.create(
+                name=f"Курс {i}",
+                description='Описание\u2028с "кавычками" и переводом\nстроки',
+                image=f"courses/{i}.png" if i else None,
+                owner=self.user if i != 1 else None,
+            )
+            Lesson.objects.create(
+                name=f"Урок {i}", description="Описание", course=course, video="lessons/video.mp4", owner=self.user
+            )
+        Subscription.objects.create(user=self.user, course=course)
+        self.client.force_authenticate(user=self.user)
+
+    def assertSameResponse(self, url, params=None):
+        """
+        Сравнивает ответы обычного и быстрого пути.
+        :param url: URL списка
+        :param params: Параметры запроса
+        :return: None
+        """
+        with override_settings(FAST_READ_PATH=False):
+            expected = self.client.get(url, params)
+        with override_settings(FAST_READ_PATH=True):
+            actual = self.client.get(url, params)
+        self.assertEqual(expected.status_code, status.HTTP_200_OK)
+        self.assertEqual(actual.status_code, status.HTTP_200_OK)
+        self.assertEqual(actual.content, expected.content)
+
+    def test_course_list(self):
+        """
+        Проверяет список курсов с количеством уроков и подпиской.
+        :return: None
+        """
+        self.assertSameResponse("/course/", {"page_size": 10})
+        self.assertSameResponse("/course/", {"page": 2})
+        self.assertSameResponse("/course/", {"fields": "id,is_subscribed"})
+
+    def test_lesson_list(self):
+        """
+        Проверяет список уроков с файлами и связанными объектами.
+        :return: None
+        """
+        self.assertSameResponse("/lesson/list/", {"page_size": 10})
+
+    def test_user_list(self):
+        """
+        Проверяет список пользователей.
+        :return: None
+        """
+        self.client.force_authenticate(user=self.user)
+        self.assertSameResponse("/users/user/")
+
+    @override_settings(FAST_READ_PATH=True)
+    def test_course_list_queries(self):
+        """
+        Проверяет, что количество уроков и подписка вычисляются в запросе страницы, а не для каждого курса.
+        :return: None
+        """
+        with self.assertNumQueries(2):  # Количество курсов и страница курсов
+            response = self.client.get("/course/", {"page_size": 10})
+        self.assertEqual(len(response.data["results"]), 3)
+
+
+# -- Тестирование пагинации с оценочным количеством --
+@override_settings(PAGINATION_COUNT_ESTIMATE_THRESHOLD=100)
+class EstimatedCountPaginationTestCase(APITestCase):
+    """
+    Проверяет, что для больших таблиц без фильтров количество берётся из статистики планировщика.
+    """
+
+    def setUp(self):
+        """
+        Создаёт пользователя, курс и уроки.
+        :return: None
+        """
+        self.user = User.objects.create_user(username="user", email="user@example.com", password="testpass")
+        course = Course.objects.create(name="Course", description="Description", owner=self.user)
+        for i in range(3):
+            Lesson.objects.create(name=f"Lesson {i}", description="Description", course=course, owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    @mock.patch("materials.paginators.get_estimated_count", return_value=1000)
+    def test_estimated_count(self, get_estimated_count):
+        """
+        Проверяет оценочное количество и переходы по страницам без COUNT(*).
+        :return: None
+        """
+        with self.assertNumQueries(1):  # Только страница, без COUNT(*)
+            response = self.client.get("/lesson/list/")
+        self.assertEqual(response.data["count"], 1000)
+        self.assertTrue(response.data["count_is_estimated"])
+        self.assertIsNotNone(response.data["next"])
+
+        response = self.client.get("/lesson/list/", {"page": 2})
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNone(response.data["next"])
+
+        response = self.client.get("/lesson/list/", {"page": 3})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @mock.patch("materials.paginators.get_estimated_count", return_value=1000)
+    def test_course_list_estimated_count(self, get_estimated_count):
+        """
+        Проверяет, что список курсов с количеством уроков и подпиской пользователя тоже получает оценочное количество.
+        :return: None
+        """
+        with self.assertNumQueries(1):  # Только страница, без COUNT(*)
+            response = self.client.get("/course/")
+        self.assertEqual(response.data["count"], 1000)
+        self.assertTrue(response.data["count_is_estimated"])
+        self.assertEqual(response.data["results"][0]["lessons_count"], 3)
+        self.assertFalse(response.data["results"][0]["is_subscribed"])
+
+    @mock.patch("materials.paginators.get_estimated_count", return_value=None)
+    def test_count_cache_shared_between_users(self, get_estimated_count):
+        """
+        Проверяет, что закешированное точное количество курсов не зависит от пользователя (подписка пользователя в
+        запросе страницы не попадает в ключ кеша).
+        :return: None
+        """
+        cache.clear()
+        self.addCleanup(cache.clear)  # Закешированное количество не должно попасть в другие тесты
+        other = User.objects.create_user(username="other", email="other@example.com", password="testpass")
+        with self.settings(PAGINATION_COUNT_ESTIMATE_THRESHOLD=1):
+            self.client.get("/course/")
+            self.client.force_authenticate(user=other)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get("/course/")
+        self.assertEqual(response.data["count"], 1)
+        self.assertFalse(any("COUNT(*)" in query["sql"] for query in queries.captured_queries))
+
+    @mock.patch("materials.paginators.get_estimated_count", return_value=10)
+    def test_small_table_exact_count(self, get_estimated_count):
+        """
+        Проверяет, что ниже порога возвращается точное количество.
+        :return: None
+        """
+        response = self.client.get("/lesson/list/")
+        self.assertEqual(response.data["count"], 3)
+        self.assertFalse(response.data["count_is_estimated"])
+
+
+class LessonAdminTestCase(APITestCase):
+    """
+    Определяет тесты списка уроков в админке.
+    """
+
+    def setUp(self):
+        """
+        Создаёт администратора, курс и уроки с длинными описаниями.
+        :return: None
+        """
+        self.admin = User.objects.create_superuser(username="root", email="root@example.com", password="pass")
+        self.client.force_login(self.admin)
+        course = Course.objects.create(name="Course", description="Полное описание курса", owner=self.admin)
+        Lesson.objects.create(name="Short", description="Коротко", course=course, owner=self.admin)
+        Lesson.objects.create(name="Long", description="а" * 150 + "конец", course=course, owner=self.admin)
+
+    @mock.patch("materials.paginators.get_estimated_count", return_value=1_000_000)
+    def test_changelist(self, get_estimated_count):
+        """
+        Проверяет, что описание обрезается в SQL, полные описания не читаются, а количество строк оценивается.
+        :return: None
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/admin/materials/lesson/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, "Коротко")
+        self.assertContains(response, "а" * 100 + "…")
+        self.assertNotContains(response, "конец")
+        self.assertNotContains(response, "Полное описание курса")
+        self.assertIn("1000000", response.content.decode().replace("\xa0", "").replace(" ", ""))
+        sql = "\n".join(query["sql"] for query in queries.captured_queries)
+        self.assertNotIn("COUNT(*)", sql)
+        self.assertIn('SUBSTR("materials_lesson"."description", 1, 101)', sql)
+        self.assertNotRegex(sql, r'(?<!SUBSTR\()"materials_lesson"\."description"')
+        self.assertNotIn('"materials_course"."description"', sql)
+
+
+# -- Тестирование чтения с реплики --
+@override_settings(REPLICA_DATABASE="replica")
+class ReplicaRoutingTestCase(APITransactionTestCase):
+    """
+    Проверяет, что чтение каталога идёт на реплику, а после записи - в основную БД.
+    Реплика - отдельное соединение с той же БД, поэтому данные теста должны быть зафиксированы, а не оставаться в
+    транзакции TestCase.
+    """
+
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        """
+        Создаёт пользователя и курс.
+        :return: None
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username="user", email="user@example.com", password="testpass")
+        self.course = Course.objects.create(name="Course", description="Description", owner=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def get_queries(self, method, url, data=None):
+        """
+        Выполняет запрос и собирает SQL-запросы к основной БД и к реплике.
+        :param method: HTTP-метод
+        :param url: URL
+        :param data: Данные запроса
+        :return: Ответ, запросы к основной БД и запросы к реплике
+        """
+        with CaptureQueriesContext(connections["default"]) as primary:
+            with CaptureQueriesContext(connections["replica"]) as replica:
+                response = getattr(self.client, method)(url, data)
+        return response, primary.captured_queries, replica.captured_queries
+
+    def test_safe_request_reads_from_replica(self):
+        """
+        Проверяет, что просмотр курса читается с реплики.
+        :return: None
+        """
+        response, primary, replica = self.get_queries("get", f"/course/{self.course.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(primary, [])
+        self.assertTrue(replica)
+
+    def test_write_pins_user_to_primary(self):
+        """
+        Проверяет, что после записи пользователь какое-то время читает из основной БД.
+        :return: None
+        """
+        response, _, replica = self.get_queries(
+            "put", f"/course/{self.course.id}/", {"name": "Updated", "description": "Updated Description"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(replica, [])
+
+        response, primary, replica = self.get_queries("get", f"/course/{self.course.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(replica, [])
+        self.assertTrue(primary)
+
+    def test_view_without_replica_reads_uses_primary(self):
+        """
+        Проверяет, что представления без ReplicaReadMixin читают из основной БД.
+        :return: None
+        """
+        response, primary, replica = self.get_queries("get", "/users/user/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(replica, [])
+        self.assertTrue(primary)
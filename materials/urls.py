@@ -1,6 +1,7 @@
 from materials.apps import MaterialsConfig
 from rest_framework import routers
 from .views import (
+    ChangeFeedAPIView,
     CourseViewSet,
     LessonCreateAPIView,
     LessonListAPIView,
@@ -25,4 +26,6 @@ urlpatterns = [
     path("lesson/list/<int:pk>/", LessonRetrieveAPIView.as_view(), name="lesson-detail"),
     path("lesson/update/<int:pk>/", LessonUpdateAPIView.as_view(), name="lesson-update"),
     path("lesson/delete/<int:pk>/", LessonDestroyAPIView.as_view(), name="lesson-delete"),
+    # URL ленты изменений каталога
+    path("changes/", ChangeFeedAPIView.as_view(), name="changes"),
 ] + router.urls
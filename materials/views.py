@@ -1,10 +1,18 @@
 # View for materials app
+from django.db.models import Count, Exists, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import viewsets, generics
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from config.routers import ReplicaReadMixin
+from config.mixins import CachedObjectMixin, FastListMixin, MultiGetMixin, SparseFieldsMixin
+from users.models import Subscription
 from users.permissions import IsModerator, IsOwner
+from .changes import get_changes
 from .mixins import LessonPermissionMixin
 from .models import Course, Lesson
-from .paginators import CoursePagination
+from .paginators import CoursePagination, LessonPagination
 from .serializers import CourseSerializer, LessonSerializer, CourseDetailSerializer
 from .tasks import send_course_update_email
 import logging
@@ -13,9 +21,13 @@ logger = logging.getLogger(__name__)
 
 
 # -- ViewSet для создания CRUD-операций с курсами --
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(
+    ReplicaReadMixin, CachedObjectMixin, SparseFieldsMixin, MultiGetMixin, FastListMixin, viewsets.ModelViewSet
+):
     """
     Определяет ViewSet для CRUD-операций с курсами.
+    Объект курса загружается один раз за запрос (см. CachedObjectMixin). Список курсов поддерживает параметры
+    ?fields=, ?omit= и ?ids= (см. SparseFieldsMixin и MultiGetMixin) и быстрый путь чтения (см. FastListMixin).
     Attributes:
         queryset: Список курсов
         serializer_class: Сериализатор курсов
@@ -23,6 +35,9 @@ class CourseViewSet(viewsets.ModelViewSet):
 
     queryset = Course.objects.all().order_by("id")
 
+    # Бюджет запросов к БД по действиям: превышение записывается в лог (см. config.middleware)
+    query_budget = {"list": 10, "retrieve": 5, "create": 5, "update": 6, "partial_update": 6, "destroy": 12}
+
     # -- Serializer
     def get_serializer_class(self):
         """
@@ -33,6 +48,36 @@ class CourseViewSet(viewsets.ModelViewSet):
             return CourseDetailSerializer
         return CourseSerializer
 
+    def get_queryset(self):
+        """
+        Добавляет к списку курсов количество уроков и подписку пользователя, чтобы сериализатор не выполнял запросы
+        для каждого курса. Обе аннотации - подзапросы без GROUP BY: они вычисляются только для строк страницы, а
+        пагинатор считает список как всю таблицу курсов (см. materials.paginators). Аннотации добавляются только для
+        полей, которые попадут в ответ (см. параметры ?fields= и ?omit=).
+        :return: Список курсов
+        """
+        queryset = super().get_queryset()
+        if self.action == "list":
+            fields = self.get_serializer().fields
+            annotations = self.get_fast_annotations()
+            queryset = queryset.annotate(**{name: annotations[name] for name in annotations if name in fields})
+        return queryset
+
+    def get_fast_annotations(self):
+        """
+        Вычисляет количество уроков и подписку пользователя в запросе для быстрого пути чтения списка курсов.
+        :return: Словарь аннотаций
+        """
+        user = self.request.user
+        if user.is_authenticated:
+            is_subscribed = Exists(Subscription.objects.filter(user=user.pk, course=OuterRef("pk")))
+        else:
+            is_subscribed = Value(False)
+        lessons_count = (
+            Lesson.objects.filter(course=OuterRef("pk")).order_by().values("course").annotate(count=Count("pk"))
+        )
+        return {"lessons_count": Coalesce(Subquery(lessons_count.values("count")), 0), "is_subscribed": is_subscribed}
+
     # -- Permissions
     def get_permissions(self):
         """
@@ -90,7 +135,7 @@ class CourseViewSet(viewsets.ModelViewSet):
         :param kwargs: Список именованных аргументов
         :return: Ответ
         """
-        logger.info("Получен запрос на список курсов от %s", request.user)
+        logger.info("Получен запрос на список курсов от %s", request.user, extra={"event": "list_requested"})
         return super().list(request, *args, **kwargs)
 
     def retrieve(self, request, *args, **kwargs):
@@ -115,7 +160,7 @@ class CourseViewSet(viewsets.ModelViewSet):
         """
         response = super().update(request, *args, **kwargs)
         logger.info("Курс %s обновлён пользователем %s", response.data.get("name"), request.user)
-        course_id = self.get_object().id
+        course_id = self.get_object().id  # Объект уже загружен в super().update()
         send_course_update_email.delay(course_id)  # Отправляем уведомление об обновлении курса
         return response
 
@@ -141,6 +186,7 @@ class LessonCreateAPIView(LessonPermissionMixin, generics.CreateAPIView):
     """
 
     serializer_class = LessonSerializer
+    query_budget = 4  # Бюджет запросов к БД (см. config.middleware)
 
     def perform_create(self, serializer):
         """
@@ -167,9 +213,13 @@ class LessonCreateAPIView(LessonPermissionMixin, generics.CreateAPIView):
         return response
 
 
-class LessonListAPIView(LessonPermissionMixin, generics.ListAPIView):
+class LessonListAPIView(
+    ReplicaReadMixin, SparseFieldsMixin, MultiGetMixin, FastListMixin, LessonPermissionMixin, generics.ListAPIView
+):
     """
     Определяет API endpoint для получения списка уроков.
+    Поддерживает параметры ?fields=, ?omit= и ?ids= (см. SparseFieldsMixin и MultiGetMixin) и быстрый путь чтения
+    (см. FastListMixin).
     Attributes:
         queryset: Список уроков
         serializer_class: Сериализатор урока
@@ -178,7 +228,8 @@ class LessonListAPIView(LessonPermissionMixin, generics.ListAPIView):
 
     queryset = Lesson.objects.all().order_by("id")
     serializer_class = LessonSerializer
-    pagination_class = CoursePagination
+    pagination_class = LessonPagination
+    query_budget = 3  # Бюджет запросов к БД (см. config.middleware)
 
     def list(self, request, *args, **kwargs):
         """
@@ -188,11 +239,11 @@ class LessonListAPIView(LessonPermissionMixin, generics.ListAPIView):
         :param kwargs: Список именованных аргументов
         :return: Ответ
         """
-        logger.info("Запрос на получение списка уроков от %s", request.user)
+        logger.info("Запрос на получение списка уроков от %s", request.user, extra={"event": "list_requested"})
         return super().list(request, *args, **kwargs)
 
 
-class LessonRetrieveAPIView(LessonPermissionMixin, generics.RetrieveAPIView):
+class LessonRetrieveAPIView(ReplicaReadMixin, CachedObjectMixin, LessonPermissionMixin, generics.RetrieveAPIView):
     """
     Определяет API endpoint для получения одного урока.
     Attributes:
@@ -202,6 +253,7 @@ class LessonRetrieveAPIView(LessonPermissionMixin, generics.RetrieveAPIView):
 
     queryset = Lesson.objects.all().order_by("id")
     serializer_class = LessonSerializer
+    query_budget = 2  # Бюджет запросов к БД (см. config.middleware)
 
     def retrieve(self, request, *args, **kwargs):
         """
@@ -216,7 +268,7 @@ class LessonRetrieveAPIView(LessonPermissionMixin, generics.RetrieveAPIView):
         return super().retrieve(request, *args, **kwargs)
 
 
-class LessonUpdateAPIView(LessonPermissionMixin, generics.UpdateAPIView):
+class LessonUpdateAPIView(CachedObjectMixin, LessonPermissionMixin, generics.UpdateAPIView):
     """
     Определяет API endpoint для обновления урока.
     Attributes:
@@ -226,6 +278,7 @@ class LessonUpdateAPIView(LessonPermissionMixin, generics.UpdateAPIView):
 
     queryset = Lesson.objects.all().order_by("id")
     serializer_class = LessonSerializer
+    query_budget = 5  # Бюджет запросов к БД (см. config.middleware)
 
     def update(self, request, *args, **kwargs):
         """
@@ -240,7 +293,7 @@ class LessonUpdateAPIView(LessonPermissionMixin, generics.UpdateAPIView):
         return response
 
 
-class LessonDestroyAPIView(LessonPermissionMixin, generics.DestroyAPIView):
+class LessonDestroyAPIView(CachedObjectMixin, LessonPermissionMixin, generics.DestroyAPIView):
     """
     Определяет API endpoint для удаления урока.
     Attributes:
@@ -250,6 +303,7 @@ class LessonDestroyAPIView(LessonPermissionMixin, generics.DestroyAPIView):
 
     queryset = Lesson.objects.all().order_by("id")
     serializer_class = LessonSerializer
+    query_budget = 6  # Бюджет запросов к БД (см. config.middleware)
 
     def destroy(self, request, *args, **kwargs):
         """
@@ -262,3 +316,26 @@ class LessonDestroyAPIView(LessonPermissionMixin, generics.DestroyAPIView):
         lesson = self.get_object()
         logger.warning("Урок %s удалён пользователем %s", lesson.name, request.user)
         return super().destroy(request, *args, **kwargs)
+
+
+# -- API endpoint для инкрементальной синхронизации каталога --
+class ChangeFeedAPIView(APIView):
+    """
+    Определяет API endpoint ленты изменений курсов и уроков.
+    Клиент передаёт курсор из предыдущего ответа в параметре since и получает только изменения после него.
+    """
+
+    permission_classes = [IsAuthenticated]
+    query_budget = 4  # Бюджет запросов к БД (см. config.middleware)
+
+    def get(self, request):
+        """
+        Возвращает созданные, изменённые и удалённые курсы и уроки после курсора.
+        :param request: Запрос
+        :return: Ответ со списком изменений, курсором для следующего запроса и признаком has_more
+        """
+        result = get_changes(since=request.query_params.get("since"), request=request)
+        logger.info(
+            "Лента изменений каталога запрошена пользователем %s: %s изменений", request.user, len(result["changes"])
+        )
+        return Response(result)
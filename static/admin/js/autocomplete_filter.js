@@ -0,0 +1,15 @@
+'use strict';
+// Фильтр списка с автодополнением (config.admin_mixins.AutocompleteFilter): при выборе объекта открывает список,
+// отфильтрованный по нему, при очистке поля - список без этого фильтра
+{
+    const $ = django.jQuery;
+    $(function() {
+        $('.autocomplete-filter select').on('change', function() {
+            const queryString = this.closest('.autocomplete-filter').dataset.queryString;
+            const separator = queryString === '?' ? '' : '&';
+            window.location.search = this.value
+                ? `${queryString}${separator}${encodeURIComponent(this.name)}=${encodeURIComponent(this.value)}`
+                : queryString;
+        });
+    });
+}
@@ -1,10 +1,11 @@
 from django.contrib import admin
 
+from config.admin_mixins import AutocompleteFilter, LargeTableAdminMixin
 from users.models import User, Payment
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """
     Отображает поля модели Пользователи в админке.
     """
@@ -18,7 +19,10 @@ class UserAdmin(admin.ModelAdmin):
         "is_active",
         "date_joined",
     )
-    list_filter = ("username",)
+    list_filter = (
+        "is_staff",
+        "is_active",
+    )
     search_fields = (
         "username",
         "email",
@@ -26,7 +30,7 @@ class UserAdmin(admin.ModelAdmin):
 
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     """
     Отображает поля модели Оплаты в админке.
     """
@@ -39,10 +43,12 @@ class PaymentAdmin(admin.ModelAdmin):
         "amount",
         "date",
     )
+    list_select_related = ("user", "course", "lesson__course")
+    list_defer = ("course__description", "lesson__description", "lesson__course__description")
     list_filter = (
-        "user",
-        "course",
-        "lesson",
+        ("user", AutocompleteFilter),
+        ("course", AutocompleteFilter),
+        ("lesson", AutocompleteFilter),
         "payment_method",
     )
     search_fields = (
@@ -50,3 +56,4 @@ class PaymentAdmin(admin.ModelAdmin):
         "course__name",
         "lesson__name",
     )
+    autocomplete_fields = ("user", "course", "lesson")
@@ -0,0 +1,44 @@
+import os
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from config.schema import generate_schema
+from config.storage import COMPRESSORS
+
+
+def write_file(path, content):
+    """
+    Записывает файл атомарно: nginx не отдаст наполовину записанный файл.
+    :param path: Путь к файлу
+    :param content: Содержимое (байты)
+    :return: None
+    """
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(content)
+    os.replace(temporary, path)
+
+
+class Command(BaseCommand):
+    """
+    Кастомная команда. Строит схему OpenAPI и записывает её в файл вместе со сжатыми копиями .gz и .br, которые
+    отдаёт nginx (см. config.schema).
+    """
+
+    help = "Строит схему OpenAPI и записывает её в файл для nginx"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=settings.OPENAPI_SCHEMA_FILE, help="Файл схемы")
+
+    def handle(self, *args, **options):
+        path = options["output"]
+        started = perf_counter()
+        content = generate_schema()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        for extension, (compress, _) in COMPRESSORS.items():
+            write_file(f"{path}{extension}", compress(content))
+        write_file(path, content)
+        elapsed = perf_counter() - started
+        self.stdout.write(f"Схема OpenAPI ({len(content)} байт) записана в {path} за {elapsed:.1f} с")
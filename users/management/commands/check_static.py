@@ -0,0 +1,21 @@
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """
+    Кастомная команда. Проверяет, что после collectstatic манифест статики и сжатые копии файлов согласованы
+    (см. config.storage).
+    """
+
+    help = "Проверяет манифест статики и сжатые копии файлов"
+
+    def handle(self, *args, **options):
+        if not hasattr(staticfiles_storage, "verify"):
+            raise CommandError("Хранилище статики не сохраняет сжатые копии: проверьте STORAGES")
+        errors = staticfiles_storage.verify()
+        for error in errors:
+            self.stderr.write(error)
+        if errors:
+            raise CommandError(f"Статика не согласована, ошибок: {len(errors)}")
+        self.stdout.write(self.style.SUCCESS("Манифест статики и сжатые копии согласованы"))
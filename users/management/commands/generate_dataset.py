@@ -0,0 +1,272 @@
+import random
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate, islice
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from materials.models import Course, Lesson
+from users.models import Payment, Subscription, User
+
+# Показатели распределения Ципфа (вес объекта с рангом r пропорционален 1 / r ** s): чем больше показатель, тем
+# сильнее перекос. При s = 1 около 20 % курсов собирают около 80 % подписок и оплат
+COURSE_POPULARITY_EXPONENT = 1.0
+USER_ACTIVITY_EXPONENT = 0.8
+LESSONS_PER_COURSE_EXPONENT = 0.5
+
+
+def chunked(iterable, size):
+    """
+    Разбивает последовательность на части.
+    :param iterable: Последовательность
+    :param size: Размер части
+    :return: Генератор списков
+    """
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def zipf_weights(rng, count, exponent):
+    """
+    Возвращает веса с распределением Ципфа в случайном порядке (ранг не связан с id объекта).
+    :param rng: Генератор случайных чисел
+    :param count: Количество весов
+    :param exponent: Показатель распределения
+    :return: Список весов
+    """
+    weights = [1 / rank**exponent for rank in range(1, count + 1)]
+    rng.shuffle(weights)
+    return weights
+
+
+def distribute(rng, total, weights, cap=None):
+    """
+    Распределяет total объектов пропорционально весам (дробная часть округляется случайно).
+    :param rng: Генератор случайных чисел
+    :param total: Количество объектов
+    :param weights: Веса
+    :param cap: Максимум на один вес
+    :return: Список количеств
+    """
+    scale = total / sum(weights)
+    counts = []
+    for weight in weights:
+        expected = weight * scale
+        count = int(expected) + (rng.random() < expected % 1)
+        counts.append(min(count, cap) if cap is not None else count)
+    return counts
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """
+    Временно отключает auto_now и auto_now_add у полей, чтобы сохранить сгенерированные даты.
+    :param fields: Поля моделей
+    :return: Контекстный менеджер
+    """
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    """
+    Кастомная команда. Создаёт синтетические данные для нагрузочного тестирования: пользователей, курсы, уроки,
+    подписки и оплаты с неравномерным распределением (популярность курсов, число уроков в курсе и активность
+    пользователей подчиняются распределению Ципфа). При одинаковом --seed данные одинаковы. Объекты создаются через
+    bulk_create частями по --chunk-size, пароль хешируется один раз для всех пользователей.
+    """
+
+    help = "Создаёт синтетические данные для нагрузочного тестирования"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000, help="Количество пользователей")
+        parser.add_argument("--courses", type=int, default=100, help="Количество курсов")
+        parser.add_argument("--lessons", type=int, default=1000, help="Количество уроков")
+        parser.add_argument("--subscriptions", type=int, default=5000, help="Количество подписок (примерно)")
+        parser.add_argument("--payments", type=int, default=10000, help="Количество оплат")
+        parser.add_argument("--days", type=int, default=365, help="Период дат оплат, дней")
+        parser.add_argument("--seed", type=int, default=42, help="Начальное значение генератора случайных чисел")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Размер части для bulk_create")
+        parser.add_argument("--prefix", default="gen", help="Префикс имён пользователей и курсов")
+        parser.add_argument("--password", default="password123", help="Пароль всех пользователей")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["courses"] < 1:
+            raise CommandError("Нужен хотя бы один пользователь и один курс")
+        connection = connections[router.db_for_write(User)]
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError(f"БД {connection.vendor} не возвращает id из bulk_create")
+        prefix = options["prefix"]
+        if User.objects.filter(username__startswith=f"{prefix}_").exists():
+            raise CommandError(f"Данные с префиксом {prefix} уже созданы, укажите другой --prefix")
+
+        self.rng = random.Random(options["seed"])
+        self.chunk_size = options["chunk_size"]
+        self.now = timezone.now()
+
+        user_ids = self.create_users(prefix, options["users"], options["password"])
+        user_weights = zipf_weights(self.rng, len(user_ids), USER_ACTIVITY_EXPONENT)
+        users = (user_ids, list(accumulate(user_weights)))
+        course_weights = zipf_weights(self.rng, options["courses"], COURSE_POPULARITY_EXPONENT)
+        course_ids, course_owners = self.create_courses(prefix, len(course_weights), users)
+        courses = (course_ids, list(accumulate(course_weights)))
+        lesson_ids = self.create_lessons(prefix, course_ids, course_owners, options["lessons"])
+        self.create_subscriptions(users, user_weights, courses, options["subscriptions"])
+        self.create_payments(users, courses, lesson_ids, options["payments"], options["days"])
+
+    def bulk_create(self, model, objects, total):
+        """
+        Сохраняет объекты частями, каждая часть - в своей транзакции.
+        :param model: Модель
+        :param objects: Генератор объектов
+        :param total: Ожидаемое количество (для вывода прогресса)
+        :return: Массив id созданных объектов
+        """
+        ids = array("q")
+        started = perf_counter()
+        for chunk in chunked(objects, self.chunk_size):
+            with transaction.atomic():
+                ids.extend(obj.pk for obj in model.objects.bulk_create(chunk))
+            self.stdout.write(f"\r{model._meta.verbose_name_plural}: {len(ids)} из {total}", ending="")
+        elapsed = perf_counter() - started
+        rate = len(ids) / elapsed if elapsed else 0
+        self.stdout.write(f"\r{model._meta.verbose_name_plural}: {len(ids)} за {elapsed:.1f} с ({rate:.0f} в секунду)")
+        return ids
+
+    def create_users(self, prefix, count, password):
+        """
+        Создаёт пользователей с одним хешем пароля.
+        :param prefix: Префикс имён
+        :param count: Количество
+        :param password: Пароль
+        :return: Массив id
+        """
+        password_hash = make_password(password)
+        date_joined = self.now - timedelta(days=365)
+        users = (
+            User(
+                username=f"{prefix}_{number}",
+                email=f"{prefix}_{number}@example.com",
+                password=password_hash,
+                date_joined=date_joined,
+            )
+            for number in range(count)
+        )
+        return self.bulk_create(User, users, count)
+
+    def create_courses(self, prefix, count, users):
+        """
+        Создаёт курсы. Авторы выбираются с учётом активности пользователей.
+        :param prefix: Префикс названий
+        :param count: Количество
+        :param users: Id пользователей и накопленные веса их активности
+        :return: Кортеж (массив id, список id авторов в том же порядке)
+        """
+        user_ids, user_weights = users
+        owners = self.rng.choices(user_ids, cum_weights=user_weights, k=count)
+        courses = (
+            Course(name=f"{prefix} Курс {number}", description=f"Описание курса {number}", owner_id=owner)
+            for number, owner in enumerate(owners)
+        )
+        return self.bulk_create(Course, courses, count), owners
+
+    def create_lessons(self, prefix, course_ids, course_owners, total):
+        """
+        Создаёт уроки (число уроков в курсе неравномерно), автор урока - владелец курса.
+        :param prefix: Префикс названий
+        :param course_ids: Id курсов
+        :param course_owners: Id авторов курсов в том же порядке
+        :param total: Количество уроков (примерно)
+        :return: Массив id
+        """
+        counts = distribute(self.rng, total, zipf_weights(self.rng, len(course_ids), LESSONS_PER_COURSE_EXPONENT))
+        lessons = (
+            Lesson(
+                name=f"{prefix} Урок {number} курса {course_number}",
+                description=f"Описание урока {number}",
+                course_id=course_id,
+                owner_id=owner_id,
+            )
+            for course_number, (course_id, owner_id, count) in enumerate(zip(course_ids, course_owners, counts))
+            for number in range(count)
+        )
+        return self.bulk_create(Lesson, lessons, sum(counts))
+
+    def create_subscriptions(self, users, user_weights, courses, total):
+        """
+        Создаёт подписки: активные пользователи подписаны на большее число курсов, популярные курсы собирают больше
+        подписок. Повторно выпавший курс пользователя перевыбирается несколько раз, поэтому подписок может быть
+        немного меньше total.
+        :param users: Id пользователей и накопленные веса их активности
+        :param user_weights: Активность пользователей
+        :param courses: Id курсов и накопленные веса их популярности
+        :param total: Количество подписок (примерно)
+        :return: Массив id
+        """
+        (user_ids, _), (course_ids, course_weights) = users, courses
+        counts = distribute(self.rng, total, user_weights, cap=len(course_ids))
+
+        def subscriptions():
+            for user_id, count in zip(user_ids, counts):
+                courses = {}
+                for _ in range(5):
+                    courses.update(dict.fromkeys(self.rng.choices(course_ids, cum_weights=course_weights, k=count)))
+                    if len(courses) >= count:
+                        break
+                for course_id in islice(courses, count):
+                    yield Subscription(user_id=user_id, course_id=course_id)
+
+        return self.bulk_create(Subscription, subscriptions(), sum(counts))
+
+    def create_payments(self, users, courses, lesson_ids, total, days):
+        """
+        Создаёт оплаты курсов (80 %) и уроков (20 %) с датами за последние days дней.
+        :param users: Id пользователей и накопленные веса их активности
+        :param courses: Id курсов и накопленные веса их популярности
+        :param lesson_ids: Id уроков
+        :param total: Количество
+        :param days: Период дат, дней
+        :return: Массив id
+        """
+        (user_ids, user_weights), (course_ids, course_weights) = users, courses
+        rng, seconds = self.rng, days * 24 * 60 * 60
+        statuses = [Payment.StatusChoices.PAID, Payment.StatusChoices.PENDING, Payment.StatusChoices.UNPAID]
+
+        def payments():
+            for start in range(0, total, self.chunk_size):  # Случайные значения выбираются сразу для всей части
+                size = min(self.chunk_size, total - start)
+                columns = zip(
+                    rng.choices(user_ids, cum_weights=user_weights, k=size),
+                    rng.choices(course_ids, cum_weights=course_weights, k=size),
+                    rng.choices(["cash", "transfer"], [3, 7], k=size),
+                    rng.choices(statuses, [8, 1, 1], k=size),
+                )
+                for user_id, course_id, method, status in columns:
+                    lesson_id = rng.choice(lesson_ids) if lesson_ids and rng.random() < 0.2 else None
+                    yield Payment(
+                        user_id=user_id,
+                        course_id=None if lesson_id else course_id,
+                        lesson_id=lesson_id,
+                        amount=Decimal(f"{rng.lognormvariate(9, 0.6):.2f}"),
+                        payment_method=method,
+                        status=status,
+                        date=self.now - timedelta(seconds=rng.randrange(seconds)),
+                        updated_at=self.now,
+                    )
+
+        fields = (Payment._meta.get_field("date"), Payment._meta.get_field("updated_at"))
+        with explicit_dates(*fields):
+            return self.bulk_create(Payment, payments(), total)
@@ -0,0 +1,94 @@
+import glob
+import gzip
+import json
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def get_log_files():
+    """
+    Возвращает файл лога config и его архивы (см. config.logging_handlers).
+    :return: Список путей от старых файлов к новым
+    """
+    filename = settings.LOGGING["handlers"]["config_file"]["filename"]
+    archives = sorted(glob.glob(f"{filename}.*.gz"), key=lambda name: int(name.split(".")[-2]), reverse=True)
+    return archives + [filename]
+
+
+def read_slow_queries(files, since=None):
+    """
+    Читает записи о медленных запросах из файлов лога.
+    :param files: Пути к файлам лога (.gz читаются как архивы)
+    :param since: Учитывать записи не старше этого момента
+    :return: Генератор записей
+    """
+    for path in files:
+        opener = gzip.open if path.endswith(".gz") else open
+        try:
+            with opener(path, "rt", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("event") != "slow_query":
+                        continue
+                    if since is not None and datetime.fromisoformat(record["time"]) < since:
+                        continue
+                    yield record
+        except FileNotFoundError:
+            continue
+
+
+class Command(BaseCommand):
+    """
+    Кастомная команда. Ранжирует отпечатки медленных запросов к БД из лога config.slow_queries по суммарному
+    времени (см. config.slow_queries).
+    """
+
+    help = "Выводит отпечатки медленных запросов к БД, отсортированные по суммарному времени"
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="*", help="Файлы лога (по умолчанию - лог config и его архивы)")
+        parser.add_argument("--limit", type=int, default=20, help="Количество отпечатков в отчёте")
+        parser.add_argument("--hours", type=float, help="Учитывать только записи за последние N часов")
+        parser.add_argument("--plans", action="store_true", help="Выводить последний снятый план отпечатка")
+
+    def handle(self, *args, **options):
+        since = None
+        if options["hours"] is not None:
+            since = datetime.now(timezone.utc) - timedelta(hours=options["hours"])
+
+        stats = {}
+        for record in read_slow_queries(options["files"] or get_log_files(), since):
+            item = stats.setdefault(
+                record["fingerprint"],
+                {"sql": record["normalized_sql"], "count": 0, "total": 0.0, "max": 0.0, "origins": Counter()},
+            )
+            item["count"] += 1
+            item["total"] += record["duration_ms"]
+            item["max"] = max(item["max"], record["duration_ms"])
+            item["origins"][record.get("origin") or "?"] += 1
+            if record.get("plan"):
+                item["plan"] = record["plan"]
+
+        if not stats:
+            self.stdout.write("Медленных запросов не найдено")
+            return
+
+        ranked = sorted(stats.items(), key=lambda pair: pair[1]["total"], reverse=True)[: options["limit"]]
+        for rank, (digest, item) in enumerate(ranked, start=1):
+            origins = ", ".join(f"{origin} ({count})" for origin, count in item["origins"].most_common(3))
+            self.stdout.write(
+                f"{rank}. {digest}: всего {item['total']:.1f} мс, запросов {item['count']}, "
+                f"в среднем {item['total'] / item['count']:.1f} мс, максимум {item['max']:.1f} мс"
+            )
+            self.stdout.write(f"   Источники: {origins}")
+            self.stdout.write(f"   {item['sql'][:500]}")
+            if options["plans"] and item.get("plan"):
+                self.stdout.write("   План:")
+                for line in item["plan"].splitlines():
+                    self.stdout.write(f"     {line}")
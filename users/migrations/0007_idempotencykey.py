@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-19 04:22
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0006_payment_status"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IdempotencyKey",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("key", models.CharField(max_length=255, verbose_name="Ключ идемпотентности")),
+                ("request_hash", models.CharField(max_length=64, verbose_name="Хеш запроса")),
+                ("response_status", models.PositiveSmallIntegerField(verbose_name="Статус ответа")),
+                (
+                    "response_body",
+                    models.JSONField(
+                        encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name="Тело ответа"
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")),
+                ("expires_at", models.DateTimeField(db_index=True, verbose_name="Действителен до")),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="idempotency_keys",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Ключ идемпотентности",
+                "verbose_name_plural": "Ключи идемпотентности",
+                "constraints": [
+                    models.UniqueConstraint(fields=("user", "key"), name="users_idempotencykey_user_key_uniq")
+                ],
+            },
+        ),
+    ]
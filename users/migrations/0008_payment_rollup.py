@@ -0,0 +1,115 @@
+# Generated by Django 5.2 on 2026-10-19 04:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from config.operations import AddIndexConcurrentlyIfSupported
+
+
+class Migration(migrations.Migration):
+    """
+    Добавляет сводную выручку по дням. Индекс по updated_at таблицы оплат строится конкурентно, поэтому миграция не
+    атомарна.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ("materials", "0005_rename_last_updated_course_updated_at"),
+        ("users", "0007_idempotencykey"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RollupWatermark",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=50, unique=True, verbose_name="Сводная таблица")),
+                ("value", models.DateTimeField(verbose_name="Водяной знак")),
+            ],
+            options={
+                "verbose_name": "Водяной знак",
+                "verbose_name_plural": "Водяные знаки",
+            },
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Последнее обновление"),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name="payment",
+            index=models.Index(fields=["updated_at"], name="users_payment_updated_at_idx"),
+        ),
+        migrations.CreateModel(
+            name="ExchangeRate",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField(verbose_name="Дата курса")),
+                ("currency", models.CharField(default="USD", max_length=3, verbose_name="Валюта")),
+                ("rate", models.DecimalField(decimal_places=4, max_digits=12, verbose_name="Курс, руб.")),
+            ],
+            options={
+                "verbose_name": "Курс валюты",
+                "verbose_name_plural": "Курсы валют",
+                "constraints": [
+                    models.UniqueConstraint(fields=("date", "currency"), name="users_exchangerate_date_currency_uniq")
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="PaymentDailyRollup",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("day", models.DateField(db_index=True, verbose_name="День")),
+                (
+                    "payment_method",
+                    models.CharField(
+                        choices=[("cash", "Наличные"), ("transfer", "Перевод на счет")],
+                        max_length=10,
+                        verbose_name="Способ оплаты",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("pending", "Ожидание"), ("paid", "Оплачено"), ("unpaid", "Не оплачено")],
+                        max_length=10,
+                        verbose_name="Статус оплаты",
+                    ),
+                ),
+                ("payments_count", models.PositiveIntegerField(verbose_name="Количество оплат")),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=14, verbose_name="Сумма, руб.")),
+                (
+                    "amount_usd",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=14, null=True, verbose_name="Сумма, $"
+                    ),
+                ),
+                (
+                    "course",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="materials.course",
+                        verbose_name="Курс",
+                    ),
+                ),
+                (
+                    "lesson",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="materials.lesson",
+                        verbose_name="Урок",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Выручка за день",
+                "verbose_name_plural": "Выручка по дням",
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+from django.db import migrations, models
+from django.db.models import Min
+
+from config.operations import AddIndexConcurrentlyIfSupported, AddUniqueConstraintConcurrently, CreateTrigramIndex
+
+
+def delete_duplicate_subscriptions(apps, schema_editor):
+    """
+    Удаляет повторные подписки пользователя на один курс, оставляя самую раннюю.
+    """
+    Subscription = apps.get_model("users", "Subscription")
+    duplicates = (
+        Subscription.objects.values("user", "course")
+        .annotate(first_id=Min("id"), total=models.Count("id"))
+        .filter(total__gt=1)
+    )
+    for duplicate in duplicates:
+        Subscription.objects.filter(user=duplicate["user"], course=duplicate["course"]).exclude(
+            id=duplicate["first_id"]
+        ).delete()
+
+
+class Migration(migrations.Migration):
+    """
+    Добавляет индексы под фильтры, сортировки и поиск PaymentViewSet и уникальность подписки (user, course).
+    Индексы строятся конкурентно, поэтому миграция не атомарна.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ("materials", "0006_trigram_indexes"),
+        ("users", "0008_payment_rollup"),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyIfSupported(
+            model_name="payment",
+            index=models.Index(fields=["user", "date"], name="users_payment_user_date_idx"),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name="payment",
+            index=models.Index(fields=["course", "date"], name="users_payment_course_date_idx"),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name="payment",
+            index=models.Index(fields=["lesson", "date"], name="users_payment_lesson_date_idx"),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name="payment",
+            index=models.Index(fields=["payment_method", "date"], name="users_payment_method_date_idx"),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name="payment",
+            index=models.Index(fields=["date"], name="users_payment_date_idx"),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name="payment",
+            index=models.Index(fields=["amount"], name="users_payment_amount_idx"),
+        ),
+        migrations.RunPython(delete_duplicate_subscriptions, migrations.RunPython.noop),
+        AddUniqueConstraintConcurrently(
+            model_name="subscription",
+            constraint=models.UniqueConstraint(fields=("user", "course"), name="users_subscription_user_course_uniq"),
+        ),
+        CreateTrigramIndex(model_name="user", field_name="email", name="users_user_email_trgm"),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-19 06:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0009_payment_subscription_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PaymentRollupDirtyDay",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("day", models.DateField(unique=True, verbose_name="День")),
+            ],
+            options={
+                "verbose_name": "День для пересчёта выручки",
+                "verbose_name_plural": "Дни для пересчёта выручки",
+            },
+        ),
+    ]
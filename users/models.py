@@ -1,5 +1,8 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models, router, transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
 
 from materials.models import Course, Lesson
 
@@ -129,6 +132,25 @@ class User(AbstractUser):
         return self.username
 
 
+class PaymentQuerySet(models.QuerySet):
+    """
+    Определяет QuerySet оплат. Удаление не меняет updated_at, поэтому дни удалённых оплат отмечаются для пересчёта
+    сводной выручки (PaymentRollupDirtyDay) в той же транзакции, что и удаление.
+    """
+
+    def delete(self):
+        """
+        Удаляет оплаты и отмечает их дни для пересчёта сводной выручки.
+        :return: Количество удалённых объектов и словарь количеств по моделям
+        """
+        with transaction.atomic(using=self.db, savepoint=False):
+            PaymentRollupDirtyDay.objects.mark_for(self)
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Payment(models.Model):
     """
     Определяет модель оплаты.
@@ -141,6 +163,8 @@ class Payment(models.Model):
         payment_method (CharField): Способ оплаты.
         session_id (CharField): ID сессии оплаты.
         link (URLField): Ссылка на оплату.
+        status (CharField): Статус оплаты.
+        updated_at (DateTimeField): Дата последнего изменения (водяной знак для обновления сводной аналитики).
     """
 
     PAYMENT_METHODS = [
@@ -210,6 +234,10 @@ class Payment(models.Model):
 
     status = models.CharField(max_length=10, choices=StatusChoices.choices, default=StatusChoices.PENDING)
 
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Последнее обновление")
+
+    objects = PaymentQuerySet.as_manager()
+
     class Meta:
         """
         Определяет отображение имени модели в админке.
@@ -217,6 +245,17 @@ class Payment(models.Model):
 
         verbose_name = "Оплата"
         verbose_name_plural = "Оплаты"
+        # Индексы под фильтры и сортировки PaymentViewSet (filterset_fields и ordering_fields)
+        indexes = [
+            models.Index(fields=["user", "date"], name="users_payment_user_date_idx"),
+            models.Index(fields=["course", "date"], name="users_payment_course_date_idx"),
+            models.Index(fields=["lesson", "date"], name="users_payment_lesson_date_idx"),
+            models.Index(fields=["payment_method", "date"], name="users_payment_method_date_idx"),
+            models.Index(fields=["date"], name="users_payment_date_idx"),
+            models.Index(fields=["amount"], name="users_payment_amount_idx"),
+            # Оплаты, изменённые после водяного знака сводной выручки (см. users.tasks.update_payment_rollup)
+            models.Index(fields=["updated_at"], name="users_payment_updated_at_idx"),
+        ]
 
     def __str__(self):
         """
@@ -224,10 +263,93 @@ class Payment(models.Model):
         :return: Электронная почта пользователя и сумма оплаты"""
         return f"{self.user.email} - {self.amount} руб."
 
+    def delete(self, using=None, keep_parents=False):
+        """
+        Удаляет оплату и отмечает её день для пересчёта сводной выручки (см. PaymentQuerySet). Оплаты, удаляемые
+        каскадом вместе с пользователем, отмечаются в users.signals.mark_user_payment_days.
+        :param using: Псевдоним БД
+        :param keep_parents: Не удалять родительские модели
+        :return: Количество удалённых объектов и словарь количеств по моделям
+        """
+        with transaction.atomic(using=using or router.db_for_write(Payment, instance=self), savepoint=False):
+            result = super().delete(using=using, keep_parents=keep_parents)
+            PaymentRollupDirtyDay.objects.mark([timezone.localdate(self.date)])
+        return result
+
+
+class SubscriptionManager(models.Manager):
+    """
+    Определяет менеджера подписок. Подписка и отписка выполняются одним запросом и без гонок: повторная подписка
+    отсекается ограничением уникальности (user, course) через INSERT ... ON CONFLICT DO NOTHING.
+    """
+
+    def subscribe_many(self, user, course_ids):
+        """
+        Подписывает пользователя на несколько курсов одним запросом. Несуществующие курсы и уже существующие
+        подписки пропускаются.
+        :param user: Пользователь
+        :param course_ids: Список ID курсов
+        :return: Список ID курсов, на которые пользователь подписан этим вызовом
+        """
+        course_ids = list(dict.fromkeys(course_ids))
+        if not course_ids:
+            return []
+
+        connection = connections[router.db_for_write(self.model)]
+        quote = connection.ops.quote_name
+        opts = self.model._meta
+        user_column = quote(opts.get_field("user").column)
+        course_column = quote(opts.get_field("course").column)
+        course_pk = quote(Course._meta.pk.column)
+        placeholders = ", ".join(["%s"] * len(course_ids))
+        sql = (
+            f"INSERT INTO {quote(opts.db_table)} ({user_column}, {course_column}) "
+            f"SELECT %s, {course_pk} FROM {quote(Course._meta.db_table)} WHERE {course_pk} IN ({placeholders}) "
+            f"ON CONFLICT ({user_column}, {course_column}) DO NOTHING RETURNING {course_column}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [user.pk, *course_ids])
+            return [row[0] for row in cursor.fetchall()]
+
+    def subscribe(self, user, course_id):
+        """
+        Подписывает пользователя на курс (идемпотентно).
+        :param user: Пользователь
+        :param course_id: ID курса
+        :return: True, если подписка добавлена, False, если она уже была или курса не существует
+        """
+        return bool(self.subscribe_many(user, [course_id]))
+
+    def unsubscribe(self, user, course_id):
+        """
+        Отписывает пользователя от курса (идемпотентно).
+        :param user: Пользователь
+        :param course_id: ID курса
+        :return: True, если подписка удалена, иначе False
+        """
+        deleted, _ = self.filter(user=user, course_id=course_id).delete()
+        return bool(deleted)
+
+    def toggle(self, user, course_id):
+        """
+        Переключает подписку пользователя на курс: удаляет существующую или добавляет новую.
+        Выполняет не больше двух запросов (третий - только если курс не найден).
+        :param user: Пользователь
+        :param course_id: ID курса
+        :return: True, если подписка добавлена, False, если удалена, None, если курса не существует
+        """
+        if self.unsubscribe(user, course_id):
+            return False
+        if self.subscribe(user, course_id):
+            return True
+        if not Course.objects.filter(id=course_id).exists():
+            return None
+        return True  # Подписку одновременно добавил параллельный запрос
+
 
 class Subscription(models.Model):
     """
-    Определяет модель подписки.
+    Определяет модель подписки. Пользователь может быть подписан на курс только один раз.
     """
 
     user = models.ForeignKey(
@@ -243,6 +365,8 @@ class Subscription(models.Model):
         verbose_name="Курс",
     )
 
+    objects = SubscriptionManager()
+
     class Meta:
         """
         Определяет отображение имени модели в админке.
@@ -250,6 +374,9 @@ class Subscription(models.Model):
 
         verbose_name = "Подписка"
         verbose_name_plural = "Подписки"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "course"], name="users_subscription_user_course_uniq"),
+        ]
 
     def __str__(self):
         """
@@ -257,3 +384,198 @@ class Subscription(models.Model):
         :return: Электронная почта пользователя и название курса
         """
         return f"{self.user.email} - {self.course.name}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Определяет сохранённый ответ на запрос с заголовком Idempotency-Key.
+    Attributes:
+        user (ForeignKey): Пользователь, отправивший запрос.
+        key (CharField): Значение заголовка Idempotency-Key.
+        request_hash (CharField): Хеш тела запроса (защита от повторного использования ключа с другими данными).
+        response_status (PositiveSmallIntegerField): HTTP-статус сохранённого ответа.
+        response_body (JSONField): Тело сохранённого ответа.
+        created_at (DateTimeField): Дата создания.
+        expires_at (DateTimeField): Дата, после которой ключ считается устаревшим.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="idempotency_keys",
+    )
+    key = models.CharField(max_length=255, verbose_name="Ключ идемпотентности")
+    request_hash = models.CharField(max_length=64, verbose_name="Хеш запроса")
+    response_status = models.PositiveSmallIntegerField(verbose_name="Статус ответа")
+    response_body = models.JSONField(encoder=DjangoJSONEncoder, verbose_name="Тело ответа")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Действителен до")
+
+    class Meta:
+        """
+        Определяет отображение имени модели в админке и уникальность ключа в пределах пользователя.
+        """
+
+        verbose_name = "Ключ идемпотентности"
+        verbose_name_plural = "Ключи идемпотентности"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="users_idempotencykey_user_key_uniq"),
+        ]
+
+    def __str__(self):
+        """
+        Определяет отображение ключа идемпотентности в админке.
+        :return: Ключ и ID пользователя
+        """
+        return f"{self.key} ({self.user_id})"
+
+
+class ExchangeRate(models.Model):
+    """
+    Определяет сохранённый курс валюты по ЦБ РФ на дату.
+    Attributes:
+        date (DateField): Дата курса.
+        currency (CharField): Код валюты.
+        rate (DecimalField): Стоимость одной единицы валюты в рублях.
+    """
+
+    date = models.DateField(verbose_name="Дата курса")
+    currency = models.CharField(max_length=3, default="USD", verbose_name="Валюта")
+    rate = models.DecimalField(max_digits=12, decimal_places=4, verbose_name="Курс, руб.")
+
+    class Meta:
+        """
+        Определяет отображение имени модели в админке и уникальность курса на дату.
+        """
+
+        verbose_name = "Курс валюты"
+        verbose_name_plural = "Курсы валют"
+        constraints = [
+            models.UniqueConstraint(fields=["date", "currency"], name="users_exchangerate_date_currency_uniq"),
+        ]
+
+    def __str__(self):
+        """
+        Определяет отображение курса валюты в админке.
+        :return: Дата, валюта и курс
+        """
+        return f"{self.date} {self.currency} - {self.rate} руб."
+
+
+class PaymentDailyRollup(models.Model):
+    """
+    Определяет сводную строку выручки за день (заполняется задачей users.tasks.update_payment_rollup).
+    Attributes:
+        day (DateField): День оплаты.
+        course (ForeignKey): Курс.
+        lesson (ForeignKey): Урок.
+        payment_method (CharField): Способ оплаты.
+        status (CharField): Статус оплаты.
+        payments_count (PositiveIntegerField): Количество оплат.
+        amount (DecimalField): Сумма оплат в рублях.
+        amount_usd (DecimalField): Сумма оплат в долларах по сохранённому курсу.
+    """
+
+    day = models.DateField(db_index=True, verbose_name="День")
+    course = models.ForeignKey(Course, null=True, blank=True, on_delete=models.SET_NULL, verbose_name="Курс")
+    lesson = models.ForeignKey(Lesson, null=True, blank=True, on_delete=models.SET_NULL, verbose_name="Урок")
+    payment_method = models.CharField(max_length=10, choices=Payment.PAYMENT_METHODS, verbose_name="Способ оплаты")
+    status = models.CharField(max_length=10, choices=Payment.StatusChoices.choices, verbose_name="Статус оплаты")
+    payments_count = models.PositiveIntegerField(verbose_name="Количество оплат")
+    amount = models.DecimalField(max_digits=14, decimal_places=2, verbose_name="Сумма, руб.")
+    amount_usd = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True, verbose_name="Сумма, $")
+
+    class Meta:
+        """
+        Определяет отображение имени модели в админке.
+        """
+
+        verbose_name = "Выручка за день"
+        verbose_name_plural = "Выручка по дням"
+
+    def __str__(self):
+        """
+        Определяет отображение сводной строки в админке.
+        :return: День и сумма
+        """
+        return f"{self.day} - {self.amount} руб."
+
+
+class RollupWatermark(models.Model):
+    """
+    Определяет водяной знак инкрементального обновления сводных таблиц.
+    Attributes:
+        name (CharField): Имя сводной таблицы.
+        value (DateTimeField): Время последнего изменения, до которого данные уже учтены.
+    """
+
+    name = models.CharField(max_length=50, unique=True, verbose_name="Сводная таблица")
+    value = models.DateTimeField(verbose_name="Водяной знак")
+
+    class Meta:
+        """
+        Определяет отображение имени модели в админке.
+        """
+
+        verbose_name = "Водяной знак"
+        verbose_name_plural = "Водяные знаки"
+
+    def __str__(self):
+        """
+        Определяет отображение водяного знака в админке.
+        :return: Имя и значение
+        """
+        return f"{self.name}: {self.value}"
+
+
+class PaymentRollupDirtyDayManager(models.Manager):
+    """
+    Определяет менеджера дней, которые нужно пересчитать в сводной таблице выручки.
+    """
+
+    def mark(self, days):
+        """
+        Отмечает дни для пересчёта одним запросом (уже отмеченные дни пропускаются).
+        :param days: Дни
+        :return: None
+        """
+        self.bulk_create([self.model(day=day) for day in set(days)], ignore_conflicts=True)
+
+    def mark_for(self, payments):
+        """
+        Отмечает для пересчёта дни оплат queryset (например, перед их каскадным удалением).
+        :param payments: QuerySet оплат
+        :return: None
+        """
+        days = payments.annotate(day=TruncDate("date")).values_list("day", flat=True).distinct().order_by()
+        self.mark(days)
+
+
+class PaymentRollupDirtyDay(models.Model):
+    """
+    Определяет день, который нужно пересчитать в сводной таблице выручки, хотя изменённых оплат в нём нет: в этот день
+    были удалены оплаты (задача users.tasks.update_payment_rollup находит изменения только по updated_at). Дни
+    отмечаются при удалении оплаты (Payment.delete(), PaymentQuerySet.delete()) и пользователя с оплатами.
+    Attributes:
+        day (DateField): День оплат.
+    """
+
+    day = models.DateField(unique=True, verbose_name="День")
+
+    objects = PaymentRollupDirtyDayManager()
+
+    class Meta:
+        """
+        Определяет отображение имени модели в админке.
+        """
+
+        verbose_name = "День для пересчёта выручки"
+        verbose_name_plural = "Дни для пересчёта выручки"
+
+    def __str__(self):
+        """
+        Определяет отображение дня в админке.
+        :return: День
+        """
+        return str(self.day)
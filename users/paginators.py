@@ -0,0 +1,13 @@
+from materials.paginators import EstimatedCountPagination
+
+
+class PaymentPagination(EstimatedCountPagination):
+    """
+    Определяет пагинацию для представления оплат.
+    Список оплат разбивается на страницы, только если клиент передал page_size: без него ответ остаётся полным
+    списком, как и раньше.
+    """
+
+    page_size = None  # Без page_size пагинация не применяется
+    page_size_query_param = "page_size"  # Позволяет клиенту запрашивать разное количество элементов
+    max_page_size = 100  # Максимальное количество элементов на одной странице
@@ -1,6 +1,21 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
 
+def is_moderator(request):
+    """
+    Проверяет, входит ли текущий пользователь в группу модераторов.
+    Результат запоминается на время запроса: разрешения вызываются несколько раз за запрос (has_permission и
+    has_object_permission, в том числе внутри IsOwner | IsModerator).
+    :param request: Запрос
+    :return: True, если пользователь является модератором, иначе False
+    """
+    if not hasattr(request, "_is_moderator"):
+        request._is_moderator = (
+            request.user.is_authenticated and request.user.groups.filter(name="Модераторы").exists()
+        )
+    return request._is_moderator
+
+
 class IsOwner(BasePermission):
     """
     Разрешает владельцу полный доступ к объекту.
@@ -16,7 +31,7 @@ class IsOwner(BasePermission):
         :param obj: Объект
         :return: True, если текущий пользователь авторизован и является владельцем, иначе False
         """
-        return request.user.is_authenticated and obj.owner == request.user
+        return request.user.is_authenticated and obj.owner_id == request.user.pk  # Без загрузки владельца из БД
 
 
 class IsModerator(BasePermission):
@@ -34,8 +49,7 @@ class IsModerator(BasePermission):
         :return: True, если текущий пользователь является модератором и действия create и destroy запрещены,
             иначе False
         """
-        is_moderator = request.user.groups.filter(name="Модераторы").exists()
-        return is_moderator and view.action not in ["create", "destroy"]
+        return is_moderator(request) and view.action not in ["create", "destroy"]
 
     def has_object_permission(self, request, view, obj):
         """
@@ -45,7 +59,7 @@ class IsModerator(BasePermission):
         :param obj: Объект
         :return: True, если пользователь является модератором, иначе False
         """
-        return request.user.groups.filter(name="Модераторы").exists()
+        return is_moderator(request)
 
 
 class DenyAll(BasePermission):
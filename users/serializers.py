@@ -1,8 +1,11 @@
 from rest_framework import serializers
+
+from config.middleware import TimedSerializerMixin
+from config.mixins import SparseFieldsSerializerMixin
 from .models import User, Payment
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(TimedSerializerMixin, SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """
     Определяет сериализатор для списка платежей.
     """
@@ -16,7 +19,51 @@ class PaymentSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class UserSerializer(serializers.ModelSerializer):
+class PaymentAnalyticsQuerySerializer(serializers.Serializer):
+    """
+    Проверяет параметры запроса сводной аналитики по оплатам.
+    """
+
+    GROUP_FIELDS = ("day", "course", "lesson", "payment_method", "status")  # Допустимые поля группировки
+
+    group_by = serializers.CharField(required=False, default="day")
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    course = serializers.IntegerField(required=False)
+    lesson = serializers.IntegerField(required=False)
+    payment_method = serializers.ChoiceField(choices=Payment.PAYMENT_METHODS, required=False)
+    status = serializers.ChoiceField(choices=Payment.StatusChoices.choices, required=False)
+
+    def validate_group_by(self, value):
+        """
+        Разбирает список полей группировки.
+        :param value: Поля группировки через запятую
+        :return: Список полей группировки
+        """
+        fields = [name.strip() for name in value.split(",") if name.strip()]
+        unknown = [name for name in fields if name not in self.GROUP_FIELDS]
+        if unknown:
+            raise serializers.ValidationError(
+                "Недопустимые поля группировки: %s. Допустимы: %s."
+                % (", ".join(unknown), ", ".join(self.GROUP_FIELDS))
+            )
+        return list(dict.fromkeys(fields)) or ["day"]
+
+    def get_filters(self):
+        """
+        Преобразует параметры запроса в фильтры сводной таблицы.
+        :return: Словарь фильтров
+        """
+        data = self.validated_data
+        filters = {name: data[name] for name in ("course", "lesson", "payment_method", "status") if name in data}
+        if "date_from" in data:
+            filters["day__gte"] = data["date_from"]
+        if "date_to" in data:
+            filters["day__lte"] = data["date_to"]
+        return filters
+
+
+class UserSerializer(TimedSerializerMixin, SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """
     Определяет сериализатор для списка пользователей.
     """
@@ -32,7 +79,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ["id", "username", "email"]
 
 
-class UserDetailSerializer(serializers.ModelSerializer):
+class UserDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Определяет сериализатор для детальной информации о пользователе.
     """
@@ -1,9 +1,91 @@
+import asyncio
+import logging
+import weakref
+
+import httpx
 import stripe
 import requests
+from datetime import datetime, time, timedelta
+from decimal import Decimal
 from xml.etree import ElementTree
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from config.middleware import timed
 from config.settings import STRIPE_API_KEY
+from .models import ExchangeRate, Payment, PaymentDailyRollup
 
 # stripe.api_key = STRIPE_API_KEY
+stripe.api_base = settings.STRIPE_API_BASE
+# Таймаут запроса к Stripe вместо 80 секунд по умолчанию: от него зависит IDEMPOTENCY_LOCK_TIMEOUT
+stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
+stripe.default_http_client = stripe.new_default_http_client(
+    timeout=settings.EXTERNAL_API_TIMEOUT,
+    async_fallback_client=stripe.HTTPXClient(timeout=settings.EXTERNAL_API_TIMEOUT),
+)
+
+logger = logging.getLogger(__name__)
+
+CENTS = Decimal("0.01")
+
+_async_clients = weakref.WeakKeyDictionary()  # Цикл событий -> HTTP-клиент
+
+
+def get_async_client():
+    """
+    Возвращает асинхронный HTTP-клиент текущего цикла событий.
+    Клиент держит пул соединений к внешним API и переиспользуется всеми запросами процесса, поэтому создаётся один
+    раз на цикл событий (соединения httpx привязаны к циклу, в котором открыты).
+    :return: Клиент httpx.AsyncClient
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=settings.EXTERNAL_API_TIMEOUT,
+            limits=httpx.Limits(max_connections=settings.EXTERNAL_API_MAX_CONNECTIONS),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def parse_usd_rate(content):
+    """
+    Извлекает курс доллара из ежедневного XML ЦБ РФ.
+    :param content: Тело ответа ЦБ РФ
+    :return: Курс конвертации рубля РФ к доллару США или None, если курс не найден
+    """
+    tree = ElementTree.fromstring(content)
+
+    for currency in tree.findall("Valute"):
+        char_code = currency.find("CharCode").text
+        if char_code == "USD":
+            rate = float(currency.find("Value").text.replace(",", "."))
+            return rate
+    return None  # Если курс конвертации не найден
+
+
+@timed("http")
+def get_rub_to_usd_rate():
+    """
+    Получает курс конвертации рубля к доллару
+    :return: Курс конвертации рубля РФ к доллару США
+    """
+    response = requests.get(settings.CBR_DAILY_URL, timeout=settings.EXTERNAL_API_TIMEOUT)
+    return parse_usd_rate(response.content)
+
+
+@timed("http")
+async def aget_rub_to_usd_rate():
+    """
+    Асинхронно получает курс конвертации рубля к доллару
+    :return: Курс конвертации рубля РФ к доллару США
+    """
+    response = await get_async_client().get(settings.CBR_DAILY_URL)
+    return parse_usd_rate(response.content)
 
 
 def convert_rub_to_usd(amount_rub):
@@ -12,32 +94,26 @@ def convert_rub_to_usd(amount_rub):
     :param amount_rub: Сумма в рублях
     :return: Сумма в долларах
     """
+    rate = get_rub_to_usd_rate()
+    return round(float(amount_rub) / rate, 2) if rate else "Ошибка получения курса конвертации"
 
-    def get_rub_to_usd_rate():
-        """
-        Получает курс конвертации рубля к доллару
-        :return: Курс конвертации рубля РФ к доллару США
-        """
-        URL = "https://www.cbr.ru/scripts/XML_daily.asp"  # Ссылка на ежедневный курс конвертации рубля по ЦБ РФ
-        response = requests.get(URL)
-        tree = ElementTree.fromstring(response.content)
-
-        for currency in tree.findall("Valute"):
-            char_code = currency.find("CharCode").text
-            if char_code == "USD":
-                rate = float(currency.find("Value").text.replace(",", "."))
-                return rate
-        return None  # Если курс конвертации не найден
 
-    rate = get_rub_to_usd_rate()
+async def aconvert_rub_to_usd(amount_rub):
+    """
+    Асинхронно конвертирует рубли в доллары
+    :param amount_rub: Сумма в рублях
+    :return: Сумма в долларах
+    """
+    rate = await aget_rub_to_usd_rate()
     return round(float(amount_rub) / rate, 2) if rate else "Ошибка получения курса конвертации"
 
 
+@timed("http")
 def create_price(amount):
     """
     Создаёт цену
     :param amount: Цена оплаты
-    :return: Объект цены stripe
+    :return: Объект цены stripe или None, если Stripe вернул ошибку
     """
     stripe.api_key = STRIPE_API_KEY
     price = None
@@ -48,11 +124,33 @@ def create_price(amount):
             recurring={"interval": "month"},
             product_data={"name": "Gold Plan"},
         )
-    except stripe.error.StripeError as e:
-        print(e)
+    except stripe.error.StripeError:
+        logger.exception("Не удалось создать цену в Stripe на сумму %s USD", amount)
     return price
 
 
+@timed("http")
+async def acreate_price(amount):
+    """
+    Асинхронно создаёт цену (stripe выполняет запрос через httpx)
+    :param amount: Цена оплаты
+    :return: Объект цены stripe или None, если Stripe вернул ошибку
+    """
+    stripe.api_key = STRIPE_API_KEY
+    price = None
+    try:
+        price = await stripe.Price.create_async(
+            currency="usd",
+            unit_amount=int(amount * 100),
+            recurring={"interval": "month"},
+            product_data={"name": "Gold Plan"},
+        )
+    except stripe.error.StripeError:
+        logger.exception("Не удалось создать цену в Stripe на сумму %s USD", amount)
+    return price
+
+
+@timed("http")
 def create_checkout_session(price_id):
     """
     Создаёт сессию оплаты
@@ -71,3 +169,120 @@ def create_checkout_session(price_id):
         cancel_url="http://localhost:8000/",
     )
     return session.get("id"), session.get("url")
+
+
+@timed("http")
+async def acreate_checkout_session(price_id):
+    """
+    Асинхронно создаёт сессию оплаты
+    :param price_id: ID цены
+    :return: Объект сессии stripe
+    """
+    session = await stripe.checkout.Session.create_async(
+        line_items=[
+            {
+                "price": price_id,
+                "quantity": 1,
+            }
+        ],
+        mode="subscription",
+        success_url="http://localhost:8000/",
+        cancel_url="http://localhost:8000/",
+    )
+    return session.get("id"), session.get("url")
+
+
+@timed("http")
+async def aget_checkout_session_status(session_id):
+    """
+    Асинхронно запрашивает статус оплаты сессии в Stripe.
+    :param session_id: ID сессии stripe
+    :return: Кортеж (HTTP-статус ответа Stripe, статус оплаты или None при ошибке)
+    """
+    response = await get_async_client().get(
+        f"{settings.STRIPE_API_BASE}/v1/checkout/sessions/{session_id}",
+        headers={"Authorization": f"Bearer {settings.STRIPE_SECRET_KEY}"},
+    )
+    if response.status_code != 200:
+        return response.status_code, None
+    return response.status_code, response.json().get("payment_status")
+
+
+def get_stored_usd_rate(day):
+    """
+    Получает сохранённый курс доллара на дату (последний известный на эту дату).
+    :param day: Дата
+    :return: Курс в рублях за доллар или None, если курс не сохранялся
+    """
+    return (
+        ExchangeRate.objects.filter(currency="USD", date__lte=day).order_by("-date").values_list("rate", flat=True)
+    ).first()
+
+
+def rebuild_payment_rollup_day(day):
+    """
+    Пересчитывает сводные строки выручки за один день по исходной таблице оплат.
+    :param day: День (в часовом поясе проекта)
+    :return: Количество созданных сводных строк
+    """
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = start + timedelta(days=1)
+    rate = get_stored_usd_rate(day)
+
+    groups = (
+        Payment.objects.filter(date__gte=start, date__lt=end)
+        .values("course", "lesson", "payment_method", "status")
+        .annotate(payments_count=Count("id"), total=Sum("amount"))
+        .order_by()
+    )
+    rows = [
+        PaymentDailyRollup(
+            day=day,
+            course_id=group["course"],
+            lesson_id=group["lesson"],
+            payment_method=group["payment_method"],
+            status=group["status"],
+            payments_count=group["payments_count"],
+            amount=group["total"],
+            amount_usd=(group["total"] / rate).quantize(CENTS) if rate else None,
+        )
+        for group in groups
+    ]
+    with transaction.atomic():
+        PaymentDailyRollup.objects.filter(day=day).delete()
+        PaymentDailyRollup.objects.bulk_create(rows)
+    return len(rows)
+
+
+def get_payment_analytics(group_by, filters):
+    """
+    Агрегирует выручку по сводной таблице.
+    :param group_by: Список полей группировки (day, course, lesson, payment_method, status)
+    :param filters: Словарь фильтров сводной таблицы (day__gte, day__lte, course, lesson, payment_method, status)
+    :return: Список словарей с полями группировки, количеством оплат и суммами в рублях и долларах. Сумма в долларах -
+        None, если хотя бы за один день группы курс доллара не сохранён: неполная сумма выглядела бы как настоящая
+    """
+    rows = (
+        PaymentDailyRollup.objects.filter(**filters)
+        .values(*group_by)
+        .annotate(
+            payments_count=Sum("payments_count"),
+            total=Sum("amount"),
+            total_usd=Sum("amount_usd"),
+            without_rate=Count("pk", filter=Q(amount_usd__isnull=True)),
+        )
+        .order_by(*group_by)
+    )
+    return [
+        {
+            **{name: row[name] for name in group_by},
+            "payments_count": row["payments_count"],
+            "amount": str(row["total"].quantize(CENTS)),
+            "amount_usd": (
+                str(row["total_usd"].quantize(CENTS))
+                if row["total_usd"] is not None and not row["without_rate"]
+                else None
+            ),
+        }
+        for row in rows
+    ]
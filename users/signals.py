@@ -16,11 +16,14 @@ users.tasks.block_inactive_users, которая блокирует пользо
 """
 
 
-from django.db.models.signals import post_migrate
+from django.conf import settings
+from django.db.models.signals import post_migrate, pre_delete
 from django.dispatch import receiver
 from django_celery_beat.models import PeriodicTask, IntervalSchedule
 import json
 
+from users.models import Payment, PaymentRollupDirtyDay
+
 
 @receiver(post_migrate)
 def create_block_inactive_users_task(sender, **kwargs):
@@ -37,3 +40,48 @@ def create_block_inactive_users_task(sender, **kwargs):
             "kwargs": json.dumps({}),
         },
     )
+
+    hourly_schedule, created = IntervalSchedule.objects.get_or_create(
+        every=1,
+        period=IntervalSchedule.HOURS,
+    )
+
+    PeriodicTask.objects.get_or_create(
+        name="Update payment rollup",
+        defaults={
+            "interval": hourly_schedule,
+            "task": "users.tasks.update_payment_rollup",
+            "kwargs": json.dumps({}),
+        },
+    )
+
+    PeriodicTask.objects.get_or_create(
+        name="Update exchange rate",
+        defaults={
+            "interval": schedule,
+            "task": "users.tasks.update_exchange_rate",
+            "kwargs": json.dumps({}),
+        },
+    )
+
+    PeriodicTask.objects.get_or_create(
+        name="Delete expired idempotency keys",
+        defaults={
+            "interval": schedule,
+            "task": "users.tasks.delete_expired_idempotency_keys",
+            "kwargs": json.dumps({}),
+        },
+    )
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def mark_user_payment_days(sender, instance, **kwargs):
+    """
+    Отмечает для пересчёта сводной выручки дни оплат пользователя, которые удаляются вместе с ним: каскадное удаление
+    оплат не вызывает Payment.delete(). Дни читаются одним запросом, и оплаты по-прежнему удаляются одним DELETE.
+    :param sender: Модель пользователя
+    :param instance: Удаляемый пользователь
+    :param kwargs: Список именованных аргументов
+    :return: None
+    """
+    PaymentRollupDirtyDay.objects.mark_for(Payment.objects.filter(user=instance))
@@ -1,8 +1,17 @@
-from users.models import User
+from users.models import User, IdempotencyKey, Payment, PaymentRollupDirtyDay, RollupWatermark, ExchangeRate
+from users.services import rebuild_payment_rollup_day, get_rub_to_usd_rate
 from celery import shared_task
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 
+PAYMENT_ROLLUP_LOCK = "payment_rollup:lock"  # Ключ блокировки обновления сводной таблицы
+
 
 @shared_task
 def block_inactive_users(user_id):
@@ -18,3 +27,67 @@ def block_inactive_users(user_id):
     for user in users_to_block:
         user.is_active = False
         user.save()
+
+
+@shared_task
+def delete_expired_idempotency_keys():
+    """
+    Удаляет устаревшие ключи идемпотентности.
+    :return: Количество удалённых ключей
+    """
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+@shared_task
+def update_payment_rollup():
+    """
+    Обновляет сводную таблицу выручки по дням.
+    Обрабатывает только оплаты, изменённые после водяного знака: пересчитываются только те дни, в которые попали
+    новые или изменённые оплаты (например, после смены статуса), и дни удалённых оплат (PaymentRollupDirtyDay).
+    :return: Количество пересчитанных дней
+    """
+    # Случайное значение блокировки: если запуск пережил её срок и блокировку взял другой воркер, её не снять
+    lock_token = uuid.uuid4().hex
+    if not cache.add(PAYMENT_ROLLUP_LOCK, lock_token, settings.PAYMENT_ROLLUP_LOCK_TIMEOUT):
+        return 0  # Обновление уже выполняется другим воркером
+    try:
+        watermark, _ = RollupWatermark.objects.get_or_create(
+            name="payments", defaults={"value": datetime(1970, 1, 1, tzinfo=dt_timezone.utc)}
+        )
+        # Перекрытие окна нужно, чтобы не пропустить оплаты из транзакций, зафиксированных после прошлого запуска
+        changed = Payment.objects.filter(updated_at__gt=watermark.value - settings.PAYMENT_ROLLUP_OVERLAP)
+        new_value = changed.aggregate(value=Max("updated_at"))["value"]
+        dirty = dict(PaymentRollupDirtyDay.objects.values_list("id", "day"))
+        if new_value is None and not dirty:
+            return 0
+
+        days = set(dirty.values())
+        if new_value is not None:
+            days.update(changed.annotate(day=TruncDate("date")).values_list("day", flat=True).distinct().order_by())
+        days = sorted(days)
+        for day in days:
+            rebuild_payment_rollup_day(day)
+
+        # Удаляются только прочитанные отметки: дни, отмеченные во время пересчёта, пересчитает следующий запуск
+        PaymentRollupDirtyDay.objects.filter(id__in=dirty).delete()
+        if new_value is not None:
+            watermark.value = max(watermark.value, new_value)
+            watermark.save(update_fields=["value"])
+        return len(days)
+    finally:
+        cache.delete_if_value(PAYMENT_ROLLUP_LOCK, lock_token)
+
+
+@shared_task
+def update_exchange_rate():
+    """
+    Сохраняет текущий курс доллара по ЦБ РФ для пересчёта выручки в доллары.
+    :return: Курс или None, если его не удалось получить
+    """
+    rate = get_rub_to_usd_rate()
+    if rate is not None:
+        ExchangeRate.objects.update_or_create(
+            date=timezone.localdate(), currency="USD", defaults={"rate": Decimal(str(rate))}
+        )
+    return rate
@@ -1,10 +1,40 @@
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import tempfile
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from inspect import iscoroutinefunction
+from unittest import mock
+
+import httpx
+import requests
+import stripe
+from asgiref.sync import async_to_sync
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APIRequestFactory, APITestCase, force_authenticate
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from materials.models import Course
-from users.models import Subscription
+from materials.models import Course, Lesson
+from users import services
+from users.models import ExchangeRate, IdempotencyKey, Payment, PaymentRollupDirtyDay, RollupWatermark, Subscription
+from users.tasks import update_payment_rollup
+from users.views import PaymentViewSet
 
 User = get_user_model()
 
@@ -92,6 +122,103 @@ class SubscriptionAPIViewTestCase(APITestCase):
         self.assertTrue(Subscription.objects.filter(user=self.other_user, course=self.course).exists())
 
 
+class SubscriptionAtomicTestCase(APITestCase):
+    """
+    Определяет тесты атомарного переключения подписки и явных операций подписки и отписки.
+    """
+
+    def setUp(self):
+        """
+        Создаёт тестовые данные.
+        :param self: Объект класса
+        """
+        self.user = User.objects.create_user(username="subscriber", email="subscriber@email", password="password123")
+        self.courses = [
+            Course.objects.create(name=f"Course {index}", description="Description", owner=self.user)
+            for index in range(3)
+        ]
+        self.course = self.courses[0]
+        self.subscription_url = "/users/subscription/"
+        self.bulk_url = "/users/subscription/bulk/"
+        self.client.force_authenticate(user=self.user)
+
+    def test_toggle_query_count(self):
+        """
+        Проверяет, что переключение подписки выполняется не больше чем двумя запросами.
+        :param self: Объект класса
+        """
+        with self.assertNumQueries(2):
+            response = self.client.post(self.subscription_url, {"course_id": self.course.id}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with self.assertNumQueries(1):
+            response = self.client.post(self.subscription_url, {"course_id": self.course.id}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_toggle_missing_course(self):
+        """
+        Проверяет ответ 404 при подписке на несуществующий курс.
+        :param self: Объект класса
+        """
+        response = self.client.post(self.subscription_url, {"course_id": 999999}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_toggle_invalid_course_id(self):
+        """
+        Проверяет ответ 400, если ID курса не передан.
+        :param self: Объект класса
+        """
+        response = self.client.post(self.subscription_url, {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_subscribe_is_idempotent(self):
+        """
+        Проверяет, что повторная подписка не создаёт дубликат.
+        :param self: Объект класса
+        """
+        first = self.client.put(self.subscription_url, {"course_id": self.course.id}, format="json")
+        second = self.client.put(self.subscription_url, {"course_id": self.course.id}, format="json")
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(Subscription.objects.filter(user=self.user, course=self.course).count(), 1)
+
+    def test_unsubscribe_is_idempotent(self):
+        """
+        Проверяет, что повторная отписка не возвращает ошибку.
+        :param self: Объект класса
+        """
+        Subscription.objects.create(user=self.user, course=self.course)
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                response = self.client.delete(self.subscription_url, {"course_id": self.course.id}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_bulk_subscribe(self):
+        """
+        Проверяет подписку на несколько курсов одним запросом к БД с пропуском уже существующих подписок.
+        :param self: Объект класса
+        """
+        Subscription.objects.create(user=self.user, course=self.courses[1])
+        course_ids = [course.id for course in self.courses] + [999999]
+        with self.assertNumQueries(1):
+            response = self.client.post(self.bulk_url, {"course_ids": course_ids}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertCountEqual(response.json()["subscribed"], [self.courses[0].id, self.courses[2].id])
+        self.assertEqual(Subscription.objects.filter(user=self.user).count(), 3)
+
+    def test_bulk_subscribe_not_list(self):
+        """
+        Проверяет, что строка вместо списка course_ids отклоняется, а не перебирается по цифрам.
+        :param self: Объект класса
+        """
+        response = self.client.post(self.bulk_url, {"course_ids": "123"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("course_ids", response.json())
+        self.assertFalse(Subscription.objects.exists())
+
+
 class UserViewSetTestCase(APITestCase):
     """
     Определяет тесты для UserViewSet.
@@ -144,6 +271,25 @@ class UserViewSetTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["username"], "testuser")
 
+    def test_retrieve_own_profile_queries(self):
+        """
+        Проверяет, что профиль загружается один раз, хотя нужен и для выбора сериализатора, и для ответа.
+        :param self: Объект класса
+        """
+        with self.assertNumQueries(2):  # Пользователь и его оплаты
+            response = self.client.get(self.user_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("payments", response.data)
+
+    def test_list_users_sparse_fields(self):
+        """
+        Проверяет получение выбранных полей нескольких пользователей по ID.
+        :param self: Объект класса
+        """
+        response = self.client.get(self.list_url, {"ids": f"{self.user.id},{self.admin_user.id}", "fields": "id"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{"id": self.user.id}, {"id": self.admin_user.id}])
+
     def test_create_user(self):
         """
         Проверяет регистрацию нового пользователя.
@@ -196,3 +342,953 @@ class UserViewSetTestCase(APITestCase):
         self.client.force_authenticate(user=self.admin_user)
         response = self.client.delete(self.user_url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@mock.patch("users.views.create_checkout_session", return_value=("cs_test", "https://checkout.stripe.com/cs_test"))
+@mock.patch("users.views.create_price", return_value=mock.Mock(id="price_test"))
+@mock.patch("users.views.convert_rub_to_usd", return_value=10.0)
+class PaymentIdempotencyTestCase(APITestCase):
+    """
+    Определяет тесты идемпотентного создания оплаты по заголовку Idempotency-Key.
+    """
+
+    def setUp(self):
+        """
+        Создаёт тестовые данные.
+        :param self: Объект класса
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username="payer", email="payer@example.com", password="password123")
+        self.client.force_authenticate(user=self.user)
+        self.payment_url = "/users/payment/"
+        self.data = {"user": self.user.id, "amount": "1000.00", "payment_method": "transfer"}
+
+    def test_replay_returns_original_response(self, convert_mock, price_mock, session_mock):
+        """
+        Проверяет, что повторный запрос с тем же ключом не создаёт оплату и не обращается к Stripe и ЦБ РФ.
+        :param self: Объект класса
+        """
+        headers = {"Idempotency-Key": "key-1"}
+        first = self.client.post(self.payment_url, self.data, format="json", headers=headers)
+        second = self.client.post(self.payment_url, self.data, format="json", headers=headers)
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second.headers["Idempotent-Replayed"], "true")
+        self.assertEqual(Payment.objects.count(), 1)
+        convert_mock.assert_called_once()
+        price_mock.assert_called_once()
+        session_mock.assert_called_once()
+
+    def test_replay_from_database_when_cache_is_empty(self, convert_mock, price_mock, session_mock):
+        """
+        Проверяет, что сохранённый ответ берётся из БД, если в Redis его нет.
+        :param self: Объект класса
+        """
+        headers = {"Idempotency-Key": "key-2"}
+        first = self.client.post(self.payment_url, self.data, format="json", headers=headers)
+        cache.clear()
+        second = self.client.post(self.payment_url, self.data, format="json", headers=headers)
+
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertTrue(IdempotencyKey.objects.filter(user=self.user, key="key-2").exists())
+
+    def test_same_key_with_other_data(self, convert_mock, price_mock, session_mock):
+        """
+        Проверяет, что ключ нельзя повторно использовать с другими данными запроса.
+        :param self: Объект класса
+        """
+        headers = {"Idempotency-Key": "key-3"}
+        self.client.post(self.payment_url, self.data, format="json", headers=headers)
+        response = self.client.post(
+            self.payment_url, {**self.data, "amount": "2000.00"}, format="json", headers=headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_key_in_progress(self, convert_mock, price_mock, session_mock):
+        """
+        Проверяет, что запрос с ключом, который ещё обрабатывается, получает 409.
+        :param self: Объект класса
+        """
+        cache.set(f"idempotency:{self.user.pk}:key-4:lock", 1)
+        with self.settings(IDEMPOTENCY_LOCK_WAIT=0.2):
+            response = self.client.post(
+                self.payment_url, self.data, format="json", headers={"Idempotency-Key": "key-4"}
+            )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Payment.objects.exists())
+
+    def test_lock_released_only_by_owner(self, convert_mock, price_mock, session_mock):
+        """
+        Проверяет, что запрос снимает только свою блокировку: если она истекла и ключ заблокировал другой запрос,
+        его блокировка остаётся.
+        :param self: Объект класса
+        """
+        lock_key = f"idempotency:{self.user.pk}:key-5:lock"
+
+        def expire_lock(price_id):
+            cache.set(lock_key, "other-request")  # Блокировка истекла, и её взял повторный запрос
+            return "cs_test", "https://checkout.stripe.com/cs_test"
+
+        session_mock.side_effect = expire_lock
+        response = self.client.post(self.payment_url, self.data, format="json", headers={"Idempotency-Key": "key-5"})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(cache.get(lock_key), "other-request")
+
+        session_mock.side_effect = None
+        self.client.post(self.payment_url, self.data, format="json", headers={"Idempotency-Key": "key-6"})
+        self.assertIsNone(cache.get(f"idempotency:{self.user.pk}:key-6:lock"))
+
+    def test_lock_outlives_external_calls(self, convert_mock, price_mock, session_mock):
+        """
+        Проверяет, что блокировка ключа не истекает раньше самого долгого создания оплаты.
+        :param self: Объект класса
+        """
+        retries = settings.STRIPE_MAX_NETWORK_RETRIES
+        stripe_call = (retries + 1) * settings.EXTERNAL_API_TIMEOUT + retries * settings.STRIPE_MAX_RETRY_DELAY
+        self.assertGreater(settings.IDEMPOTENCY_LOCK_TIMEOUT, settings.EXTERNAL_API_TIMEOUT + 2 * stripe_call)
+        self.assertEqual(stripe.default_http_client._timeout, settings.EXTERNAL_API_TIMEOUT)
+
+    def test_stripe_error(self, convert_mock, price_mock, session_mock):
+        """
+        Проверяет, что ошибка Stripe при создании цены записывается в журнал и возвращается ответом 502 без
+        созданной оплаты, а повтор с тем же ключом выполняется заново.
+        :param self: Объект класса
+        """
+        headers = {"Idempotency-Key": "key-stripe"}
+        error = stripe.error.APIConnectionError("Stripe недоступен")
+        with (
+            mock.patch("users.views.create_price", services.create_price),
+            mock.patch("stripe.Price.create", side_effect=error),
+            self.assertLogs("users.services", "ERROR") as logs,
+        ):
+            response = self.client.post(self.payment_url, self.data, format="json", headers=headers)
+
+        self.assertEqual(response.status_code, status.HTTP_502_BAD_GATEWAY)
+        self.assertEqual(response.json()["detail"], "Не удалось создать сессию оплаты в Stripe.")
+        self.assertIn("Не удалось создать цену в Stripe", logs.output[0])
+        self.assertFalse(Payment.objects.exists())
+        session_mock.assert_not_called()
+
+        retry = self.client.post(self.payment_url, self.data, format="json", headers=headers)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_without_key(self, convert_mock, price_mock, session_mock):
+        """
+        Проверяет, что без заголовка каждый запрос создаёт новую оплату.
+        :param self: Объект класса
+        """
+        self.client.post(self.payment_url, self.data, format="json")
+        self.client.post(self.payment_url, self.data, format="json")
+        self.assertEqual(Payment.objects.count(), 2)
+
+
+class PaymentCheckStatusTestCase(APITestCase):
+    """
+    Определяет тесты проверки статуса оплаты в Stripe.
+    """
+
+    def setUp(self):
+        """
+        Создаёт оплату с сессией Stripe.
+        :param self: Объект класса
+        """
+        self.user = User.objects.create_user(username="payer", email="payer@example.com", password="password123")
+        self.payment = Payment.objects.create(
+            user=self.user, amount=1000, payment_method="transfer", session_id="cs_test"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = f"/users/payment/{self.payment.pk}/check_status/"
+
+    @mock.patch("users.views.requests.get")
+    def test_check_status(self, get_mock):
+        """
+        Проверяет, что статус берётся из Stripe с ограничением времени ответа.
+        :param self: Объект класса
+        """
+        get_mock.return_value = mock.Mock(status_code=200, json=lambda: {"payment_status": "paid"})
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {"payment_status": "paid"})
+        self.assertEqual(get_mock.call_args.kwargs["timeout"], settings.EXTERNAL_API_TIMEOUT)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusChoices.PAID)
+
+    @mock.patch("users.views.requests.get", side_effect=requests.Timeout("Stripe не ответил"))
+    def test_timeout(self, get_mock):
+        """
+        Проверяет ответ 504, если Stripe не ответил за EXTERNAL_API_TIMEOUT.
+        :param self: Объект класса
+        """
+        with self.assertLogs("users.views", "WARNING") as logs:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_504_GATEWAY_TIMEOUT)
+        self.assertEqual(response.json()["detail"], "Stripe не ответил вовремя.")
+        self.assertIn("cs_test", logs.output[0])
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.StatusChoices.PENDING)
+
+
+@override_settings(ASYNC_VIEWS=True)
+@mock.patch("users.views.acreate_checkout_session", return_value=("cs_test", "https://checkout.stripe.com/cs_test"))
+@mock.patch("users.views.acreate_price", return_value=mock.Mock(id="price_test"))
+@mock.patch("users.views.aconvert_rub_to_usd", return_value=10.0)
+class AsyncPaymentViewTestCase(APITestCase):
+    """
+    Определяет тесты асинхронных представлений оплат (ASYNC_VIEWS=True).
+    Представления создаются внутри override_settings, а запросы выполняются через async_to_sync, как это делает
+    Django для асинхронных представлений под WSGI.
+    """
+
+    def setUp(self):
+        """
+        Создаёт тестовые данные.
+        :param self: Объект класса
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username="payer", email="payer@example.com", password="password123")
+        self.factory = APIRequestFactory()
+        self.data = {"user": self.user.id, "amount": "1000.00", "payment_method": "transfer"}
+
+    def call(self, actions, request, **kwargs):
+        """
+        Выполняет запрос через асинхронное представление вьюсета оплат.
+        :param actions: Действия вьюсета
+        :param request: Запрос
+        :param kwargs: Параметры URL
+        :return: Отрендеренный ответ
+        """
+        view = PaymentViewSet.as_view(actions)
+        self.assertTrue(iscoroutinefunction(view))
+        force_authenticate(request, user=self.user)
+        return async_to_sync(view)(request, **kwargs).render()
+
+    def test_create(self, convert_mock, price_mock, session_mock):
+        """
+        Проверяет, что оплата создаётся с асинхронными запросами к ЦБ РФ и Stripe, а повтор по ключу идемпотентности
+        возвращает сохранённый ответ.
+        :param self: Объект класса
+        """
+        headers = {"Idempotency-Key": "async-key"}
+        first = self.call(
+            {"post": "create"}, self.factory.post("/users/payment/", self.data, format="json", headers=headers)
+        )
+        second = self.call(
+            {"post": "create"}, self.factory.post("/users/payment/", self.data, format="json", headers=headers)
+        )
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(first.data["link"], "https://checkout.stripe.com/cs_test")
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.headers["Idempotent-Replayed"], "true")
+        payment = Payment.objects.get()
+        self.assertEqual(payment.session_id, "cs_test")
+        convert_mock.assert_awaited_once()
+        price_mock.assert_awaited_once_with(10.0)
+        session_mock.assert_awaited_once_with("price_test")
+
+    def test_create_stripe_error(self, convert_mock, price_mock, session_mock):
+        """
+        Проверяет, что ошибка Stripe при создании цены записывается в журнал и возвращается ответом 502 без
+        созданной оплаты.
+        :param self: Объект класса
+        """
+        error = stripe.error.APIConnectionError("Stripe недоступен")
+        with (
+            mock.patch("users.views.acreate_price", services.acreate_price),
+            mock.patch("stripe.Price.create_async", side_effect=error),
+            self.assertLogs("users.services", "ERROR") as logs,
+        ):
+            response = self.call({"post": "create"}, self.factory.post("/users/payment/", self.data, format="json"))
+
+        self.assertEqual(response.status_code, status.HTTP_502_BAD_GATEWAY)
+        self.assertEqual(response.data["detail"].code, "payment_provider_error")
+        self.assertIn("Не удалось создать цену в Stripe", logs.output[0])
+        self.assertFalse(Payment.objects.exists())
+        session_mock.assert_not_called()
+
+    def test_check_status(self, convert_mock, price_mock, session_mock):
+        """
+        Проверяет асинхронную проверку статуса оплаты.
+        :param self: Объект класса
+        """
+        payment = Payment.objects.create(user=self.user, amount=1000, payment_method="transfer", session_id="cs_test")
+        with mock.patch("users.views.aget_checkout_session_status", return_value=(200, "paid")) as status_mock:
+            response = self.call({"get": "check_status"}, self.factory.get("/"), pk=payment.pk)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"payment_status": "paid"})
+        status_mock.assert_awaited_once_with("cs_test")
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, Payment.StatusChoices.PAID)
+
+    def test_check_status_timeout(self, convert_mock, price_mock, session_mock):
+        """
+        Проверяет ответ 504, если Stripe не ответил за EXTERNAL_API_TIMEOUT.
+        :param self: Объект класса
+        """
+        payment = Payment.objects.create(user=self.user, amount=1000, payment_method="transfer", session_id="cs_test")
+        error = httpx.ReadTimeout("Stripe не ответил")
+        with (
+            mock.patch("users.views.aget_checkout_session_status", side_effect=error),
+            self.assertLogs("users.views", "WARNING"),
+        ):
+            response = self.call({"get": "check_status"}, self.factory.get("/"), pk=payment.pk)
+
+        self.assertEqual(response.status_code, status.HTTP_504_GATEWAY_TIMEOUT)
+        self.assertEqual(response.data["detail"].code, "payment_provider_timeout")
+
+    def test_check_status_without_session(self, convert_mock, price_mock, session_mock):
+        """
+        Проверяет ответ 400 для оплаты без сессии Stripe.
+        :param self: Объект класса
+        """
+        payment = Payment.objects.create(user=self.user, amount=1000, payment_method="transfer")
+        response = self.call({"get": "check_status"}, self.factory.get("/"), pk=payment.pk)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_streams_async(self, convert_mock, price_mock, session_mock):
+        """
+        Проверяет, что выгрузка отдаёт CSV асинхронным итератором порциями, не читая все строки в память.
+        :param self: Объект класса
+        """
+        for amount in (100, 200, 300):
+            Payment.objects.create(user=self.user, amount=amount, payment_method="transfer")
+        view = PaymentViewSet.as_view({"get": "export"})
+        request = self.factory.get("/users/payment/export.csv")
+        force_authenticate(request, user=self.user)
+
+        async def export():
+            response = await view(request)
+            return response, [chunk async for chunk in response.streaming_content]
+
+        with mock.patch.object(PaymentViewSet, "export_chunk_size", 2):
+            response, chunks = async_to_sync(export)()
+
+        self.assertTrue(response.is_async)
+        self.assertEqual(len(chunks), 2)
+        rows = list(csv.reader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+        self.assertEqual(rows[0][:2], ["id", "date"])
+        self.assertEqual([row[5] for row in rows[1:]], ["100.00", "200.00", "300.00"])
+
+    def test_sync_action(self, convert_mock, price_mock, session_mock):
+        """
+        Проверяет, что действие без асинхронного обработчика выполняется синхронным обработчиком в потоке.
+        :param self: Объект класса
+        """
+        Payment.objects.create(user=self.user, amount=1000, payment_method="transfer")
+        response = self.call({"get": "list"}, self.factory.get("/users/payment/"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+
+    def test_unauthenticated(self, convert_mock, price_mock, session_mock):
+        """
+        Проверяет, что ошибки аутентификации обрабатываются асинхронным представлением как обычно.
+        :param self: Объект класса
+        """
+        view = PaymentViewSet.as_view({"post": "create"})
+        response = async_to_sync(view)(self.factory.post("/users/payment/", self.data, format="json")).render()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        convert_mock.assert_not_called()
+
+
+class PaymentAnalyticsTestCase(APITestCase):
+    """
+    Определяет тесты сводной аналитики по оплатам: сводная таблица сверяется с агрегацией по исходной таблице.
+    """
+
+    def setUp(self):
+        """
+        Создаёт оплаты за несколько дней с разными курсами, уроками, способами и статусами оплаты.
+        :param self: Объект класса
+        """
+        cache.clear()
+        self.admin = User.objects.create_superuser(username="finance", email="finance@example.com", password="pass")
+        self.user = User.objects.create_user(username="buyer", email="buyer@example.com", password="pass")
+        self.course = Course.objects.create(name="Course", description="Description", owner=self.admin)
+        self.other_course = Course.objects.create(name="Other", description="Description", owner=self.admin)
+        self.lesson = Lesson.objects.create(name="Lesson", description="Description", course=self.course)
+
+        today = timezone.localdate()
+        self.days = [today - timedelta(days=2), today - timedelta(days=1), today]
+        for day in self.days:
+            ExchangeRate.objects.create(date=day, currency="USD", rate=Decimal("90.0000"))
+
+        variants = [
+            (self.course, None, "cash", Payment.StatusChoices.PAID, "1000.00"),
+            (self.course, self.lesson, "transfer", Payment.StatusChoices.PENDING, "250.50"),
+            (self.other_course, None, "transfer", Payment.StatusChoices.PAID, "3000.00"),
+            (None, self.lesson, "cash", Payment.StatusChoices.UNPAID, "99.99"),
+        ]
+        for index, day in enumerate(self.days):
+            for course, lesson, method, payment_status, amount in variants[: index + 2]:
+                payment = Payment.objects.create(
+                    user=self.user,
+                    course=course,
+                    lesson=lesson,
+                    payment_method=method,
+                    status=payment_status,
+                    amount=Decimal(amount),
+                )
+                date = timezone.make_aware(timezone.datetime.combine(day, timezone.datetime.min.time()))
+                Payment.objects.filter(pk=payment.pk).update(date=date + timedelta(hours=12))
+
+        self.client.force_authenticate(user=self.admin)
+        self.analytics_url = "/users/payment/analytics/"
+
+    def raw_aggregate(self, group_by):
+        """
+        Агрегирует выручку напрямую по таблице оплат.
+        :param group_by: Поля группировки
+        :return: Словарь {значения полей группировки: (количество, сумма)}
+        """
+        rows = (
+            Payment.objects.annotate(day=TruncDate("date"))
+            .values(*group_by)
+            .annotate(payments_count=Count("id"), total=Sum("amount"))
+        )
+        return {tuple(row[name] for name in group_by): (row["payments_count"], row["total"]) for row in rows}
+
+    def rollup_aggregate(self, group_by):
+        """
+        Получает выручку через API сводной аналитики.
+        :param group_by: Поля группировки
+        :return: Словарь {значения полей группировки: (количество, сумма)}
+        """
+        response = self.client.get(self.analytics_url, {"group_by": ",".join(group_by)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = {}
+        for row in response.json()["results"]:
+            key = tuple(row[name] for name in group_by)
+            if "day" in group_by:
+                index = group_by.index("day")
+                key = key[:index] + (timezone.datetime.fromisoformat(key[index]).date(),) + key[index + 1 :]
+            result[key] = (row["payments_count"], Decimal(row["amount"]))
+        return result
+
+    def test_rollup_matches_raw_aggregation(self):
+        """
+        Проверяет, что все варианты группировки совпадают с агрегацией по исходной таблице.
+        :param self: Объект класса
+        """
+        update_payment_rollup()
+        for group_by in (["day"], ["course"], ["lesson"], ["payment_method"], ["status"], ["day", "course", "status"]):
+            with self.subTest(group_by=group_by):
+                self.assertEqual(self.rollup_aggregate(group_by), self.raw_aggregate(group_by))
+
+    def test_incremental_update(self):
+        """
+        Проверяет, что повторный запуск учитывает новые оплаты и смену статуса.
+        :param self: Объект класса
+        """
+        update_payment_rollup()
+        payment = Payment.objects.filter(status=Payment.StatusChoices.PENDING).first()
+        payment.status = Payment.StatusChoices.PAID
+        payment.save()
+        Payment.objects.create(user=self.user, course=self.course, payment_method="cash", amount=Decimal("10.00"))
+
+        update_payment_rollup()
+        for group_by in (["day", "status"], ["course", "payment_method"]):
+            with self.subTest(group_by=group_by):
+                self.assertEqual(self.rollup_aggregate(group_by), self.raw_aggregate(group_by))
+
+    def test_deleted_payments(self):
+        """
+        Проверяет, что сводная таблица пересчитывается после удаления оплаты и после удаления пользователя вместе с
+        его оплатами.
+        :param self: Объект класса
+        """
+        update_payment_rollup()
+        # Оплаты изменены давно: следующий запуск найдёт изменения только по отметкам удаления
+        Payment.objects.update(updated_at=timezone.now() - settings.PAYMENT_ROLLUP_OVERLAP * 2)
+        RollupWatermark.objects.filter(name="payments").update(value=timezone.now())
+        payment = Payment.objects.filter(date__date=self.days[0]).first()
+        response = self.client.delete(f"/users/payment/{payment.pk}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(PaymentRollupDirtyDay.objects.values_list("day", flat=True)), [self.days[0]])
+
+        self.assertEqual(update_payment_rollup(), 1)
+        self.assertEqual(self.rollup_aggregate(["day", "status"]), self.raw_aggregate(["day", "status"]))
+        self.assertFalse(PaymentRollupDirtyDay.objects.exists())
+
+        self.user.delete()
+        self.assertEqual(update_payment_rollup(), len(self.days))
+        self.assertEqual(self.rollup_aggregate(["day"]), {})
+
+    def test_lock_released_only_by_owner(self):
+        """
+        Проверяет, что запуск, переживший срок блокировки, не снимает блокировку, которую взял другой воркер, и что
+        обычный запуск снимает свою блокировку.
+        :param self: Объект класса
+        """
+
+        def lock_taken_by_other_worker(day):
+            cache.set("payment_rollup:lock", "other-worker", settings.PAYMENT_ROLLUP_LOCK_TIMEOUT)
+
+        with mock.patch("users.tasks.rebuild_payment_rollup_day", side_effect=lock_taken_by_other_worker):
+            update_payment_rollup()
+        self.assertEqual(cache.get("payment_rollup:lock"), "other-worker")
+        self.assertEqual(update_payment_rollup(), 0)  # Блокировка другого воркера
+
+        cache.delete("payment_rollup:lock")
+        update_payment_rollup()
+        self.assertIsNone(cache.get("payment_rollup:lock"))
+
+    def test_usd_conversion(self):
+        """
+        Проверяет пересчёт выручки в доллары по сохранённому курсу.
+        :param self: Объект класса
+        """
+        update_payment_rollup()
+        day = self.days[0].isoformat()
+        response = self.client.get(
+            self.analytics_url, {"group_by": "status", "status": "paid", "date_from": day, "date_to": day}
+        )
+        self.assertEqual(
+            response.json()["results"],
+            [{"status": "paid", "payments_count": 1, "amount": "1000.00", "amount_usd": "11.11"}],
+        )
+
+    def test_usd_without_rate(self):
+        """
+        Проверяет, что сумма в долларах не возвращается для групп, в которых есть день без сохранённого курса.
+        :param self: Объект класса
+        """
+        ExchangeRate.objects.filter(date=self.days[0]).delete()
+        update_payment_rollup()
+
+        response = self.client.get(self.analytics_url, {"group_by": "day"})
+        amounts = {row["day"]: row["amount_usd"] for row in response.json()["results"]}
+        self.assertIsNone(amounts[self.days[0].isoformat()])
+        self.assertIsNotNone(amounts[self.days[1].isoformat()])
+
+        response = self.client.get(self.analytics_url, {"group_by": "status", "status": "paid"})
+        self.assertIsNone(response.json()["results"][0]["amount_usd"])
+
+        response = self.client.get(self.analytics_url, {"group_by": "status", "date_from": self.days[1].isoformat()})
+        self.assertTrue(all(row["amount_usd"] is not None for row in response.json()["results"]))
+
+    def test_invalid_group_by(self):
+        """
+        Проверяет ошибку при недопустимом поле группировки.
+        :param self: Объект класса
+        """
+        response = self.client.get(self.analytics_url, {"group_by": "user"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_analytics_forbidden_for_regular_user(self):
+        """
+        Проверяет, что аналитика недоступна обычному пользователю.
+        :param self: Объект класса
+        """
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.analytics_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class PaymentExportTestCase(APITestCase):
+    """
+    Определяет тесты потоковой выгрузки оплат в CSV.
+    """
+
+    def setUp(self):
+        """
+        Создаёт тестовые оплаты.
+        :param self: Объект класса
+        """
+        self.user = User.objects.create_user(username="accountant", email="accountant@example.com", password="pass")
+        self.other_user = User.objects.create_user(username="client", email="client@example.com", password="pass")
+        self.course = Course.objects.create(name="Python", description="Description", owner=self.user)
+        self.lesson = Lesson.objects.create(name="Intro", description="Description", course=self.course)
+        for amount, method, user in (
+            ("100.00", "cash", self.user),
+            ("300.00", "cash", self.other_user),
+            ("200.00", "transfer", self.other_user),
+        ):
+            Payment.objects.create(
+                user=user, course=self.course, lesson=self.lesson, payment_method=method, amount=Decimal(amount)
+            )
+        self.client.force_authenticate(user=self.user)
+        self.export_url = "/users/payment/export.csv"
+
+    def export(self, params=None):
+        """
+        Выполняет выгрузку и разбирает CSV.
+        :param params: Параметры запроса
+        :return: Ответ и список строк CSV
+        """
+        response = self.client.get(self.export_url, params or {})
+        content = b"".join(response.streaming_content).decode("utf-8")
+        return response, list(csv.reader(io.StringIO(content)))
+
+    def test_export_all(self):
+        """
+        Проверяет выгрузку всех оплат одним потоком с заголовком.
+        :param self: Объект класса
+        """
+        response, rows = self.export()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(
+            rows[0], ["id", "date", "user_email", "course", "lesson", "amount", "payment_method", "status"]
+        )
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][2:5], ["accountant@example.com", "Python", "Intro"])
+
+    def test_export_uses_list_filters(self):
+        """
+        Проверяет, что выгрузка учитывает фильтрацию, поиск и сортировку списка оплат.
+        :param self: Объект класса
+        """
+        _, rows = self.export({"payment_method": "cash", "search": "client@", "ordering": "-amount"})
+        self.assertEqual([row[5] for row in rows[1:]], ["300.00"])
+
+        _, rows = self.export({"ordering": "-amount"})
+        self.assertEqual([row[5] for row in rows[1:]], ["300.00", "200.00", "100.00"])
+
+    def test_export_query_count(self):
+        """
+        Проверяет, что связанные объекты загружаются одним запросом вместе с оплатами.
+        :param self: Объект класса
+        """
+        response = self.client.get(self.export_url)
+        with self.assertNumQueries(1):
+            b"".join(response.streaming_content)
+
+
+class PaymentPaginationTestCase(APITestCase):
+    """
+    Определяет тесты пагинации оплат с кешированием количества.
+    """
+
+    def setUp(self):
+        """
+        Создаёт тестовые оплаты.
+        :param self: Объект класса
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username="accountant", email="accountant@example.com", password="pass")
+        for method in ("cash", "cash", "transfer"):
+            Payment.objects.create(user=self.user, payment_method=method, amount=Decimal("100.00"))
+        self.client.force_authenticate(user=self.user)
+        self.list_url = "/users/payment/"
+
+    def test_list_without_page_size(self):
+        """
+        Проверяет, что без page_size список оплат не разбивается на страницы.
+        :param self: Объект класса
+        """
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 3)
+
+    @override_settings(PAGINATION_COUNT_ESTIMATE_THRESHOLD=2)
+    def test_filtered_count_cached(self):
+        """
+        Проверяет, что точное количество для запроса с фильтром берётся из кеша до истечения TTL.
+        :param self: Объект класса
+        """
+        params = {"payment_method": "cash", "page_size": 1}
+        response = self.client.get(self.list_url, params)
+        self.assertEqual(response.data["count"], 2)
+        self.assertFalse(response.data["count_is_estimated"])
+
+        Payment.objects.create(user=self.user, payment_method="cash", amount=Decimal("100.00"))
+        with self.assertNumQueries(1):  # Только страница, без COUNT(*)
+            response = self.client.get(self.list_url, params)
+        self.assertEqual(response.data["count"], 2)
+
+
+class PaymentAdminTestCase(APITestCase):
+    """
+    Определяет тесты списка оплат в админке.
+    """
+
+    def setUp(self):
+        """
+        Создаёт администратора и оплаты курсов и уроков.
+        :param self: Объект класса
+        """
+        cache.clear()
+        self.admin = User.objects.create_superuser(username="root", email="root@example.com", password="pass")
+        self.client.force_login(self.admin)
+        self.buyer = User.objects.create_user(username="buyer", email="buyer@example.com", password="pass")
+        self.course = Course.objects.create(name="Python", description="Описание", owner=self.admin)
+        self.lesson = Lesson.objects.create(name="Урок", description="Описание", course=self.course, owner=self.admin)
+        self.list_url = "/admin/users/payment/"
+
+    def create_payments(self, count):
+        """
+        Создаёт оплаты разных пользователей, курсов и уроков.
+        :param count: Количество оплат
+        :return: None
+        """
+        start = Payment.objects.count() // 2
+        for number in range(start, start + count):
+            user = User.objects.create_user(username=f"user{number}", email=f"user{number}@example.com")
+            course = Course.objects.create(name=f"Курс {number}", description="Описание", owner=user)
+            lesson = Lesson.objects.create(name=f"Урок {number}", description="Описание", course=course, owner=user)
+            Payment.objects.create(user=user, course=course, payment_method="cash", amount=Decimal("100.00"))
+            Payment.objects.create(user=user, lesson=lesson, payment_method="cash", amount=Decimal("100.00"))
+
+    def count_queries(self, url, params=None):
+        """
+        Открывает страницу админки и считает запросы к БД.
+        :param url: Адрес страницы
+        :param params: Параметры запроса
+        :return: Кортеж (ответ, количество запросов)
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(queries)
+
+    def test_changelist_queries(self):
+        """
+        Проверяет, что количество запросов списка не зависит от числа строк и связанных объектов.
+        :param self: Объект класса
+        """
+        self.create_payments(2)
+        _, small = self.count_queries(self.list_url)
+        self.create_payments(20)
+        response, large = self.count_queries(self.list_url)
+
+        self.assertEqual(large, small)
+        self.assertContains(response, "Курс 21")
+        self.assertContains(response, "Урок 21 - Курс 21")
+        self.assertNotContains(response, "user21@example.com</option>")  # Пользователи не выводятся в фильтре
+
+    def test_autocomplete_filter(self):
+        """
+        Проверяет фильтр с автодополнением: список фильтруется, выбранный пользователь выводится в поле фильтра.
+        :param self: Объект класса
+        """
+        self.create_payments(3)
+        Payment.objects.create(user=self.buyer, course=self.course, payment_method="cash", amount=Decimal("50.00"))
+
+        response, _ = self.count_queries(self.list_url, {"user__id__exact": self.buyer.pk})
+        self.assertEqual(list(response.context["cl"].result_list), list(Payment.objects.filter(user=self.buyer)))
+        self.assertContains(response, f'<option value="{self.buyer.pk}" selected>{self.buyer}</option>', html=True)
+        self.assertContains(response, "admin/js/autocomplete_filter.js")
+
+        response = self.client.get(self.list_url, {"user__id__exact": "abc"})
+        self.assertRedirects(response, f"{self.list_url}?e=1", fetch_redirect_response=False)
+
+    def test_lesson_autocomplete(self):
+        """
+        Проверяет, что автодополнение уроков не читает курс каждого урока отдельным запросом.
+        :param self: Объект класса
+        """
+        params = {"app_label": "users", "model_name": "payment", "field_name": "lesson", "term": "Урок"}
+        self.create_payments(2)
+        _, small = self.count_queries("/admin/autocomplete/", params)
+        self.create_payments(10)
+        response, large = self.count_queries("/admin/autocomplete/", params)
+
+        self.assertEqual(large, small)
+        self.assertIn("Урок 11 - Курс 11", [item["text"] for item in response.json()["results"]])
+
+
+class QueryPlanTestCase(APITestCase):
+    """
+    Проверяет по EXPLAIN, что частые запросы оплат, подписок и поиска используют индексы, а не полный перебор таблицы.
+    На PostgreSQL (TEST_DATABASE=postgresql) последовательное сканирование отключается (enable_seqscan = off), чтобы
+    планировщик выбирал его только при отсутствии подходящего индекса даже на маленьких тестовых таблицах.
+    """
+
+    def setUp(self):
+        """
+        Создаёт тестовые данные.
+        :param self: Объект класса
+        """
+        self.user = User.objects.create_user(username="planner", email="planner@example.com", password="pass")
+        self.course = Course.objects.create(name="Course", description="Description", owner=self.user)
+        self.lesson = Lesson.objects.create(name="Lesson", description="Description", course=self.course)
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertNoSeqScan(self, queryset, table):
+        """
+        Проверяет, что в плане запроса нет последовательного сканирования таблицы.
+        :param queryset: Проверяемый запрос
+        :param table: Имя таблицы
+        """
+        plan = queryset.explain()
+        if connection.vendor == "postgresql":
+            seq_scan = re.search(rf"Seq Scan on {table}\b", plan)
+        else:
+            seq_scan = re.search(rf"\bSCAN {table}\b(?! USING)", plan)
+        self.assertIsNone(seq_scan, f"Запрос выполняет полный перебор таблицы {table}:\n{plan}")
+
+    def test_payment_filters_and_ordering(self):
+        """
+        Проверяет фильтры и сортировки PaymentViewSet.
+        :param self: Объект класса
+        """
+        queries = [
+            Payment.objects.filter(user=self.user).order_by("-date"),
+            Payment.objects.filter(course=self.course).order_by("-date"),
+            Payment.objects.filter(lesson=self.lesson).order_by("date"),
+            Payment.objects.filter(payment_method="cash").order_by("-date"),
+            Payment.objects.order_by("-date")[:10],
+            Payment.objects.order_by("amount")[:10],
+        ]
+        for queryset in queries:
+            with self.subTest(query=str(queryset.query)):
+                self.assertNoSeqScan(queryset, "users_payment")
+
+    def test_subscription_lookup(self):
+        """
+        Проверяет поиск подписки пользователя на курс (SubscriptionAPIView и CourseSerializer.get_is_subscribed).
+        :param self: Объект класса
+        """
+        self.assertNoSeqScan(Subscription.objects.filter(user=self.user, course=self.course), "users_subscription")
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "Триграммные индексы есть только в PostgreSQL")
+    def test_icontains_search(self):
+        """
+        Проверяет поиск по частичному совпадению (search_fields PaymentViewSet) по триграммным индексам.
+        :param self: Объект класса
+        """
+        queries = [
+            (User.objects.filter(email__icontains="planner"), "users_user"),
+            (Course.objects.filter(name__icontains="cour"), "materials_course"),
+            (Lesson.objects.filter(name__icontains="less"), "materials_lesson"),
+        ]
+        for queryset, table in queries:
+            with self.subTest(table=table):
+                self.assertNoSeqScan(queryset, table)
+
+
+class SlowQueryReportTestCase(SimpleTestCase):
+    """
+    Определяет тесты команды slow_query_report.
+    """
+
+    def setUp(self):
+        """
+        Создаёт файлы лога с записями о медленных запросах.
+        :param self: Объект класса
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, "reports.log")
+        now = timezone.now()
+        records = [
+            {"time": now, "fingerprint": "fast", "duration_ms": 300, "origin": "CourseViewSet.list"},
+            {"time": now, "fingerprint": "fast", "duration_ms": 300, "origin": "CourseViewSet.list"},
+            {"time": now, "fingerprint": "slow", "duration_ms": 1000, "origin": "PaymentViewSet.list", "plan": "Seq"},
+            {"time": now - timedelta(days=2), "fingerprint": "old", "duration_ms": 5000, "origin": None},
+        ]
+        lines = [
+            json.dumps({**record, "time": record["time"].isoformat(), "event": "slow_query", "normalized_sql": "SQL"})
+            for record in records
+        ]
+        with open(self.filename, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines[:2] + ['{"event": "request_timing"}']) + "\n")
+        with gzip.open(f"{self.filename}.1.gz", "wt", encoding="utf-8") as file:
+            file.write("\n".join(lines[2:]) + "\n")
+
+    def report(self, *args):
+        """
+        Выполняет команду и возвращает её вывод.
+        :param args: Аргументы команды
+        :return: Вывод команды
+        """
+        out = io.StringIO()
+        call_command("slow_query_report", self.filename, f"{self.filename}.1.gz", *args, stdout=out)
+        return out.getvalue()
+
+    def test_ranked_by_total_time(self):
+        """
+        Проверяет, что отпечатки отсортированы по суммарному времени.
+        :param self: Объект класса
+        """
+        output = self.report("--plans")
+        self.assertLess(output.index("old"), output.index("slow"))
+        self.assertLess(output.index("slow"), output.index("fast"))
+        self.assertIn("fast: всего 600.0 мс, запросов 2", output)
+        self.assertIn("CourseViewSet.list (2)", output)
+        self.assertIn("Seq", output)
+
+    def test_hours(self):
+        """
+        Проверяет, что --hours отбрасывает старые записи.
+        :param self: Объект класса
+        """
+        output = self.report("--hours", "24")
+        self.assertNotIn("old", output)
+        self.assertTrue(output.startswith("1. slow"))
+
+
+class GenerateDatasetTestCase(APITestCase):
+    """
+    Определяет тесты команды generate_dataset.
+    """
+
+    options = {"users": 30, "courses": 6, "lessons": 20, "subscriptions": 60, "payments": 80, "chunk_size": 7}
+
+    def generate(self, prefix, seed=1):
+        """
+        Выполняет команду и возвращает созданные данные в виде, не зависящем от id.
+        :param prefix: Префикс имён
+        :param seed: Начальное значение генератора случайных чисел
+        :return: Кортеж (подписки, оплаты)
+        """
+        call_command("generate_dataset", prefix=prefix, seed=seed, stdout=io.StringIO(), **self.options)
+        subscriptions = Subscription.objects.filter(user__username__startswith=f"{prefix}_")
+        payments = Payment.objects.filter(user__username__startswith=f"{prefix}_").order_by("id")
+        return (
+            sorted(subscriptions.values_list("user__username", "course__name")),
+            list(payments.values_list("user__username", "course__name", "lesson__name", "amount", "status")),
+        )
+
+    def test_dataset(self):
+        """
+        Проверяет количество созданных объектов, общий хеш пароля и даты оплат.
+        :param self: Объект класса
+        """
+        subscriptions, payments = self.generate("gen")
+
+        self.assertEqual(User.objects.filter(username__startswith="gen_").count(), 30)
+        self.assertEqual(Course.objects.filter(name__startswith="gen ").count(), 6)
+        self.assertAlmostEqual(Lesson.objects.filter(name__startswith="gen ").count(), 20, delta=3)
+        self.assertTrue(40 <= len(subscriptions) <= 63)
+        self.assertEqual(len(payments), 80)
+        self.assertEqual(len(set(payments)), 80)
+
+        users = User.objects.filter(username__startswith="gen_")
+        self.assertEqual(users.values("password").distinct().count(), 1)
+        self.assertTrue(users.first().check_password("password123"))
+        dates = Payment.objects.filter(user__in=users).values_list("date", flat=True)
+        self.assertGreater(len(set(dates)), 1)  # Даты оплат не совпадают с моментом создания
+        self.assertLess(min(dates), timezone.now() - timedelta(days=1))
+        self.assertTrue(Payment._meta.get_field("date").auto_now_add)
+
+    def test_deterministic(self):
+        """
+        Проверяет, что при одинаковом seed данные одинаковы, а при разном - различаются.
+        :param self: Объект класса
+        """
+        first = self.generate("gen")
+        User.objects.filter(username__startswith="gen_").delete()
+        self.assertEqual(self.generate("gen"), first)
+        User.objects.filter(username__startswith="gen_").delete()
+        self.assertNotEqual(self.generate("gen", seed=2), first)
+
+    def test_existing_prefix(self):
+        """
+        Проверяет, что повторный запуск с тем же префиксом отклоняется.
+        :param self: Объект класса
+        """
+        self.generate("gen")
+        with self.assertRaises(CommandError):
+            self.generate("gen")
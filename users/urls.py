@@ -7,6 +7,7 @@ from .views import (
     UserViewSet,
     PaymentViewSet,
     SubscriptionAPIView,
+    SubscriptionBulkAPIView,
 )
 
 app_name = UsersConfig.name
@@ -19,4 +20,6 @@ urlpatterns = [
     path("token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("token/refresh/", TokenObtainPairView.as_view(), name="token_refresh"),
     path("subscription/", SubscriptionAPIView.as_view(), name="subscription"),
+    path("subscription/bulk/", SubscriptionBulkAPIView.as_view(), name="subscription-bulk"),
+    path("payment/export.csv", PaymentViewSet.as_view({"get": "export"}), name="payment-export"),
 ] + routers.urls
@@ -1,35 +1,92 @@
+import csv
+from itertools import chain
+
+import httpx
 import requests
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
-from rest_framework.generics import get_object_or_404
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.conf import settings
 
+from config.async_views import AsyncCreateModelMixin, AsyncViewMixin, aiterate_in_chunks
+from config.middleware import measure
+from config.mixins import CachedObjectMixin, FastListMixin, IdempotentCreateMixin, MultiGetMixin, SparseFieldsMixin
+from config.routers import ReplicaReadMixin
 from materials.models import Course
 from .models import User, Payment, Subscription
+from .paginators import PaymentPagination
 from .permissions import IsProfileOwner
 from .serializers import (
     UserSerializer,
     PaymentSerializer,
     UserDetailSerializer,
     RegisterSerializer,
+    PaymentAnalyticsQuerySerializer,
 )
 
 import logging
 
-from .services import convert_rub_to_usd, create_price, create_checkout_session
+from .services import (
+    aconvert_rub_to_usd,
+    acreate_checkout_session,
+    acreate_price,
+    aget_checkout_session_status,
+    convert_rub_to_usd,
+    create_checkout_session,
+    create_price,
+    get_payment_analytics,
+)
 
 logger = logging.getLogger(__name__)
 
 
+class PaymentProviderError(APIException):
+    """
+    Ошибка Stripe при создании оплаты: ответ 502, запрос можно повторить.
+    """
+
+    status_code = status.HTTP_502_BAD_GATEWAY
+    default_detail = "Не удалось создать сессию оплаты в Stripe."
+    default_code = "payment_provider_error"
+
+
+class PaymentProviderTimeout(APIException):
+    """
+    Stripe не ответил за EXTERNAL_API_TIMEOUT: ответ 504, запрос можно повторить.
+    """
+
+    status_code = status.HTTP_504_GATEWAY_TIMEOUT
+    default_detail = "Stripe не ответил вовремя."
+    default_code = "payment_provider_timeout"
+
+
+class Echo:
+    """
+    Псевдобуфер для csv.writer: возвращает записанную строку вместо её сохранения (нужен для потоковой выгрузки).
+    """
+
+    def write(self, value):
+        """
+        Возвращает переданную строку.
+        :param value: Строка CSV
+        :return: Та же строка
+        """
+        return value
+
+
 # -- User ViewSet --
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(CachedObjectMixin, SparseFieldsMixin, MultiGetMixin, FastListMixin, viewsets.ModelViewSet):
     """
     Определяет CRUD для пользователей (только авторизованные).
+    Список пользователей поддерживает параметры ?fields=, ?omit=, ?ids= и быстрый путь чтения (см. FastListMixin).
     Attributes:
         queryset (QuerySet): Список пользователей.
         serializer_class (Serializer): Сериализатор пользователей.
@@ -42,13 +99,17 @@ class UserViewSet(viewsets.ModelViewSet):
     # Аутентификация и разрешения
     authentication_classes = [JWTAuthentication]
 
+    # Бюджет запросов к БД по действиям: превышение записывается в лог (см. config.middleware)
+    query_budget = {"list": 2, "retrieve": 3, "create": 4, "update": 6, "partial_update": 4, "destroy": 23}
+
     def get_serializer_class(self):
         """
         Переопределяет сериализатор в зависимости от действия.
         :return: Сериализатор
         """
         if self.action in ["retrieve", "update", "partial_update"]:
-            if self.request.user == self.get_object():
+            # Сравниваем id из адреса, а не загруженный объект: так не нужен лишний запрос к БД
+            if str(self.request.user.pk) == str(self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)):
                 return UserDetailSerializer  # Полный доступ для владельца
         elif self.action == "create":
             return RegisterSerializer
@@ -82,7 +143,7 @@ class UserViewSet(viewsets.ModelViewSet):
         self.permission_classes = [AllowAny]
         response = super().create(request, *args, **kwargs)
         logger.info(
-            "Пользователь с именем %s и email %s успешно создан." % (request.data["username"], request.data["email"])
+            "Пользователь с именем %s и email %s успешно создан.", request.data["username"], request.data["email"]
         )
         return response
 
@@ -96,7 +157,7 @@ class UserViewSet(viewsets.ModelViewSet):
         """
         self.permission_classes = [IsAuthenticated]
         response = super().list(request, *args, **kwargs)
-        logger.info("Список пользователей успешно получен.")
+        logger.info("Список пользователей успешно получен.", extra={"event": "list_requested"})
         return response
 
     def retrieve(self, request, *args, **kwargs):
@@ -109,7 +170,7 @@ class UserViewSet(viewsets.ModelViewSet):
         """
         self.permission_classes = [IsAuthenticated]
         response = super().retrieve(request, *args, **kwargs)
-        logger.info("Информация о пользователе с id %s успешно получена." % kwargs["pk"])
+        logger.info("Информация о пользователе с id %s успешно получена.", kwargs["pk"])
         return response
 
     def update(self, request, *args, **kwargs):
@@ -122,7 +183,7 @@ class UserViewSet(viewsets.ModelViewSet):
         """
         self.permission_classes = [IsAuthenticated]
         response = super().update(request, *args, **kwargs)
-        logger.info("Информация о пользователе с id %s успешно обновлена." % kwargs["pk"])
+        logger.info("Информация о пользователе с id %s успешно обновлена.", kwargs["pk"])
         return response
 
     def destroy(self, request, *args, **kwargs):
@@ -135,14 +196,26 @@ class UserViewSet(viewsets.ModelViewSet):
         """
         self.permission_classes = [IsAuthenticated]
         response = super().destroy(request, *args, **kwargs)
-        logger.info("Пользователь с id %s успешно удален." % kwargs["pk"])
+        logger.info("Пользователь с id %s успешно удален.", kwargs["pk"])
         return response
 
 
 # -- Payment ViewSet --
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(
+    AsyncViewMixin,
+    ReplicaReadMixin,
+    CachedObjectMixin,
+    SparseFieldsMixin,
+    MultiGetMixin,
+    IdempotentCreateMixin,
+    AsyncCreateModelMixin,
+    viewsets.ModelViewSet,
+):
     """
     Определяет API endpoint для управления оплатами.
+    Создание оплаты идемпотентно по заголовку Idempotency-Key (см. IdempotentCreateMixin). При ASYNC_VIEWS=True
+    создание оплаты и проверка статуса выполняются асинхронно (см. config.async_views).
+    Список оплат поддерживает параметры ?fields=, ?omit= и ?ids=.
     Attributes:
         queryset (QuerySet): Список оплат.
         serializer_class (Serializer): Сериализатор оплаты.
@@ -150,6 +223,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
 
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
+    pagination_class = PaymentPagination
 
     # Фильтрация, поиск и сортировка
     filter_backends = [
@@ -166,6 +240,36 @@ class PaymentViewSet(viewsets.ModelViewSet):
 
     # Поля, по которым можно сортировать (`ordering=-date` для сортировки по убыванию)
     ordering_fields = ["date", "amount"]
+    ordering = ["id"]  # Сортировка по умолчанию - для стабильной пагинации
+
+    # Отчёты читают с реплики (см. ReplicaReadMixin)
+    replica_actions = ("analytics", "export")
+
+    # Бюджет запросов к БД по действиям: превышение записывается в лог (см. config.middleware)
+    query_budget = {
+        "list": 3,
+        "retrieve": 3,
+        "create": 8,
+        "update": 5,
+        "partial_update": 3,
+        "destroy": 4,  # С отметкой дня для пересчёта сводной выручки
+        "check_status": 3,
+        "analytics": 3,
+        "export": 2,
+    }
+
+    # Столбцы выгрузки в CSV
+    export_columns = [
+        "id",
+        "date",
+        "user_email",
+        "course",
+        "lesson",
+        "amount",
+        "payment_method",
+        "status",
+    ]
+    export_chunk_size = 2000  # Количество строк, которое читается из серверного курсора за раз
 
     # Создание оплаты
     def perform_create(self, serializer):
@@ -177,6 +281,9 @@ class PaymentViewSet(viewsets.ModelViewSet):
         payment = serializer.save(user=self.request.user)  # Сохраняем объект Payment
         amount_usd = convert_rub_to_usd(payment.amount)  # Доступ к полю amount
         price = create_price(amount_usd)
+        if price is None:  # Ошибка уже записана в журнал; оплата без сессии не нужна клиенту
+            payment.delete()
+            raise PaymentProviderError()
         session_id, session_url = create_checkout_session(price.id)
 
         # Обновляем созданный объект Payment
@@ -184,6 +291,24 @@ class PaymentViewSet(viewsets.ModelViewSet):
         payment.link = session_url
         payment.save()
 
+    async def aperform_create(self, serializer):
+        """
+        Асинхронный вариант perform_create(): запросы к ЦБ РФ и Stripe не занимают поток.
+        :param serializer: Сериализатор
+        :return: None
+        """
+        payment = await sync_to_async(serializer.save)(user=self.request.user)
+        amount_usd = await aconvert_rub_to_usd(payment.amount)
+        price = await acreate_price(amount_usd)
+        if price is None:  # Ошибка уже записана в журнал; оплата без сессии не нужна клиенту
+            await payment.adelete()
+            raise PaymentProviderError()
+        session_id, session_url = await acreate_checkout_session(price.id)
+
+        payment.session_id = session_id
+        payment.link = session_url
+        await payment.asave()
+
     # Проверка статуса оплаты
     @action(detail=True, methods=["get"])
     def check_status(self, request, pk=None, drf_status=None):
@@ -199,12 +324,17 @@ class PaymentViewSet(viewsets.ModelViewSet):
         if not payment.session_id:
             return Response(
                 {"error": "Нет session_id для проверки оплаты."},
-                status=drf_status.HTTP_400_BAD_REQUEST,
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-        url = f"https://api.stripe.com/v1/checkout/sessions/{payment.session_id}"
+        url = f"{settings.STRIPE_API_BASE}/v1/checkout/sessions/{payment.session_id}"
         headers = {"Authorization": f"Bearer {settings.STRIPE_SECRET_KEY}"}
-        response = requests.get(url, headers=headers)
+        try:
+            with measure("http"):
+                response = requests.get(url, headers=headers, timeout=settings.EXTERNAL_API_TIMEOUT)
+        except requests.Timeout:
+            logger.warning("Stripe не ответил на запрос статуса сессии %s", payment.session_id)
+            raise PaymentProviderTimeout()
 
         if response.status_code != 200:
             return Response({"error": "Ошибка запроса к Stripe."}, status=response.status_code)
@@ -212,7 +342,47 @@ class PaymentViewSet(viewsets.ModelViewSet):
         session_data = response.json()
         stripe_status = session_data.get("payment_status")
 
-        # Обновляем статус в модели Payment
+        self.set_payment_status(payment, stripe_status)
+        payment.save()
+
+        return Response({"payment_status": stripe_status})
+
+    async def acheck_status(self, request, pk=None):
+        """
+        Асинхронный вариант check_status().
+        :param request: Запрос
+        :param pk: id оплаты
+        :return: Ответ
+        """
+        payment = await sync_to_async(self.get_object)()
+
+        if not payment.session_id:
+            return Response(
+                {"error": "Нет session_id для проверки оплаты."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            response_status, stripe_status = await aget_checkout_session_status(payment.session_id)
+        except httpx.TimeoutException:
+            logger.warning("Stripe не ответил на запрос статуса сессии %s", payment.session_id)
+            raise PaymentProviderTimeout()
+        if response_status != 200:
+            return Response({"error": "Ошибка запроса к Stripe."}, status=response_status)
+
+        self.set_payment_status(payment, stripe_status)
+        await payment.asave()
+
+        return Response({"payment_status": stripe_status})
+
+    @staticmethod
+    def set_payment_status(payment, stripe_status):
+        """
+        Обновляет статус оплаты по статусу сессии Stripe.
+        :param payment: Объект оплаты
+        :param stripe_status: Статус оплаты в Stripe
+        :return: None
+        """
         if stripe_status == "paid":
             payment.status = Payment.StatusChoices.PAID  # Например, "paid"
         elif stripe_status == "unpaid":
@@ -220,21 +390,120 @@ class PaymentViewSet(viewsets.ModelViewSet):
         else:
             payment.status = Payment.StatusChoices.PENDING  # Например, "pending"
 
-        payment.save()
+    # Потоковая выгрузка оплат в CSV
+    def export(self, request):
+        """
+        Выгружает оплаты в CSV с теми же фильтрами, поиском и сортировкой, что и список оплат.
+        Строки читаются из серверного курсора порциями и сразу отдаются клиенту, поэтому расход памяти не зависит
+        от количества выгружаемых оплат.
+        :param request: Запрос
+        :return: Потоковый ответ с CSV
+        """
+        return self.get_export_response(request, self.get_export_lines())
 
-        return Response({"payment_status": stripe_status})
+    async def aexport(self, request):
+        """
+        Асинхронный вариант export(): порции строк читаются в потоке, а отдаются клиенту из цикла событий.
+        :param request: Запрос
+        :return: Потоковый ответ с CSV
+        """
+        lines = await sync_to_async(self.get_export_lines)()
+        return self.get_export_response(request, aiterate_in_chunks(lines, self.export_chunk_size))
+
+    def get_export_lines(self):
+        """
+        Возвращает ленивый итератор строк CSV: заголовок и строки оплат из серверного курсора.
+        :return: Итератор строк
+        """
+        queryset = self.filter_queryset(self.get_queryset()).select_related("user", "course", "lesson")
+        # Строки читаются уже после выхода из представления - фиксируем БД, выбранную маршрутизатором сейчас
+        queryset = queryset.using(queryset.db)
+        if not queryset.ordered:
+            queryset = queryset.order_by("id")
+
+        writer = csv.writer(Echo())
+        rows = (
+            writer.writerow(self.get_export_row(payment))
+            for payment in queryset.iterator(chunk_size=self.export_chunk_size)
+        )
+        return chain([writer.writerow(self.export_columns)], rows)
+
+    @staticmethod
+    def get_export_response(request, content):
+        """
+        Создаёт потоковый ответ с CSV.
+        :param request: Запрос
+        :param content: Итератор (синхронный или асинхронный) строк CSV
+        :return: Потоковый ответ
+        """
+        response = StreamingHttpResponse(content, content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = 'attachment; filename="payments.csv"'
+        logger.info("Выгрузка оплат в CSV запрошена пользователем %s", request.user)
+        return response
+
+    @staticmethod
+    def get_export_row(payment):
+        """
+        Формирует строку выгрузки для оплаты.
+        :param payment: Объект оплаты
+        :return: Список значений в порядке export_columns
+        """
+        return [
+            payment.id,
+            timezone.localtime(payment.date).isoformat(),
+            payment.user.email,
+            payment.course.name if payment.course else "",
+            payment.lesson.name if payment.lesson else "",
+            payment.amount,
+            payment.payment_method,
+            payment.status,
+        ]
+
+    # Сводная аналитика по выручке
+    @action(detail=False, methods=["get"], permission_classes=[IsAdminUser])
+    def analytics(self, request):
+        """
+        Возвращает выручку из сводной таблицы по дням (без сканирования таблицы оплат).
+        Параметры: group_by (day, course, lesson, payment_method, status через запятую), date_from, date_to,
+        course, lesson, payment_method, status. amount_usd - null, если за какой-то день группы нет курса доллара.
+        :param request: Запрос
+        :return: Ответ
+        """
+        query = PaymentAnalyticsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        group_by = query.validated_data["group_by"]
+        results = get_payment_analytics(group_by, query.get_filters())
+        logger.info("Сводная аналитика по оплатам (%s) запрошена пользователем %s", ",".join(group_by), request.user)
+        return Response({"group_by": group_by, "results": results})
 
 
 # -- Subscription ViewSet --
 class SubscriptionAPIView(APIView):
     """
     Определяет API для управления подписками пользователей на курсы.
+    POST переключает подписку, PUT подписывает, DELETE отписывает (PUT и DELETE идемпотентны).
     Attributes:
         permission_classes (list): Список классов разрешений
     """
 
     permission_classes = [IsAuthenticated]
 
+    # Бюджет запросов к БД по методам: превышение записывается в лог (см. config.middleware)
+    query_budget = {"post": 2, "put": 3, "delete": 2}
+
+    @staticmethod
+    def get_course_id(request):
+        """
+        Получает ID курса из тела или параметров запроса.
+        :param request: Запрос
+        :return: ID курса
+        """
+        course_id = request.data.get("course_id", request.query_params.get("course_id"))
+        try:
+            return int(course_id)
+        except (TypeError, ValueError):
+            raise ValidationError({"course_id": "Укажите ID курса."})
+
     def post(self, request, *args, **kwargs):
         """
         Переопределяет создание/удаление подписки и добавляет логгирование.
@@ -244,20 +513,89 @@ class SubscriptionAPIView(APIView):
         :return: Ответ
         """
         user = request.user
-        course_id = request.data.get("course_id")
+        course_id = self.get_course_id(request)
 
-        course_item = get_object_or_404(Course, id=course_id)
-        subs_item = Subscription.objects.filter(user=user, course=course_item)
+        subscribed = Subscription.objects.toggle(user, course_id)
+        if subscribed is None:
+            raise NotFound("Курс не найден.")
 
-        if subs_item.exists():
-            subs_item.delete()
-            message = "Подписка удалена"
-            logger.info("Подписка на курс %s удалена пользователем %s", course_item, user)
-            answer = status.HTTP_204_NO_CONTENT
-        else:
-            Subscription.objects.create(user=user, course=course_item)
+        if subscribed:
             message = "Подписка добавлена"
-            logger.info("Подписка на курс %s добавлена пользователем %s", course_item, user)
+            logger.info("Подписка на курс %s добавлена пользователем %s", course_id, user)
             answer = status.HTTP_201_CREATED
+        else:
+            message = "Подписка удалена"
+            logger.info("Подписка на курс %s удалена пользователем %s", course_id, user)
+            answer = status.HTTP_204_NO_CONTENT
 
         return Response({"message": message}, status=answer)
+
+    def put(self, request, *args, **kwargs):
+        """
+        Подписывает пользователя на курс. Повторный запрос не создаёт новую подписку.
+        :param request: Запрос
+        :param args: Список позиционных документов
+        :param kwargs: Список именованных аргументов
+        :return: Ответ
+        """
+        user = request.user
+        course_id = self.get_course_id(request)
+
+        if Subscription.objects.subscribe(user, course_id):
+            logger.info("Подписка на курс %s добавлена пользователем %s", course_id, user)
+            return Response({"message": "Подписка добавлена"}, status=status.HTTP_201_CREATED)
+        if not Course.objects.filter(id=course_id).exists():
+            raise NotFound("Курс не найден.")
+        return Response({"message": "Подписка уже существует"}, status=status.HTTP_200_OK)
+
+    def delete(self, request, *args, **kwargs):
+        """
+        Отписывает пользователя от курса. Повторный запрос ничего не меняет.
+        :param request: Запрос
+        :param args: Список позиционных документов
+        :param kwargs: Список именованных аргументов
+        :return: Ответ
+        """
+        user = request.user
+        course_id = self.get_course_id(request)
+
+        if Subscription.objects.unsubscribe(user, course_id):
+            logger.info("Подписка на курс %s удалена пользователем %s", course_id, user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class SubscriptionBulkAPIView(APIView):
+    """
+    Определяет API для подписки пользователя сразу на несколько курсов одним запросом к БД.
+    Attributes:
+        permission_classes (list): Список классов разрешений
+        max_courses (int): Максимальное количество курсов в одном запросе
+    """
+
+    permission_classes = [IsAuthenticated]
+    max_courses = 1000
+    query_budget = 2  # Бюджет запросов к БД (см. config.middleware)
+
+    def post(self, request, *args, **kwargs):
+        """
+        Подписывает пользователя на курсы из списка course_ids.
+        :param request: Запрос
+        :param args: Список позиционных документов
+        :param kwargs: Список именованных аргументов
+        :return: Ответ со списком курсов, на которые добавлена подписка
+        """
+        course_ids = request.data.get("course_ids")
+        if not isinstance(course_ids, list):  # Строка "123" тоже перебирается - по цифрам
+            raise ValidationError({"course_ids": "Укажите список ID курсов."})
+        try:
+            course_ids = [int(course_id) for course_id in course_ids]
+        except (TypeError, ValueError):
+            raise ValidationError({"course_ids": "Укажите список ID курсов."})
+        if len(course_ids) > self.max_courses:
+            raise ValidationError({"course_ids": "Можно передать не больше %s курсов." % self.max_courses})
+
+        subscribed = Subscription.objects.subscribe_many(request.user, course_ids)
+        logger.info("Подписки на курсы %s добавлены пользователем %s", subscribed, request.user)
+        return Response(
+            {"subscribed": subscribed}, status=status.HTTP_201_CREATED if subscribed else status.HTTP_200_OK
+        )